@@ -0,0 +1,198 @@
+"""Сквозной замер бота: обновления Telegram через Dispatcher.
+
+Нужна база, заполненная парсером (DB_HOST, DB_PORT, DB_NAME). Обычно
+запускается из benchmarks.bench_e2e парсера, который поднимает базу и
+заполняет её. Отдельный запуск из папки bot:
+    python -m benchmarks.bench_e2e [повторов на команду]
+
+Обновления проходят весь путь aiogram: фильтры, middleware, обработчик
+и отправку ответа в заглушку Telegram Bot API. Страницы задач отдаёт
+заглушка Codeforces. Ограничение частоты отправки отключено, оно
+замерено отдельно в bench_sender. Если задан SNAPSHOT_PATH, команды
+замеряются и по БД, и по снимку. Для каждой пары тема/сложность из
+/tags и /ratings проверяется, что /contests находит хотя бы один
+контест, иначе замер завершается с кодом 1. Последняя строка вывода -
+результаты в JSON после префикса E2E_RESULT.
+"""
+import asyncio
+import json
+import logging
+import resource
+import sys
+import time
+
+from benchmarks.fake_message import FakeChat
+
+import bot  # после fake_message, который задаёт токен
+import configs.config as cfg
+from aiogram import Bot, types
+from aiogram.bot.api import TelegramAPIServer
+from benchmarks.stub_servers import (make_pages_app, make_telegram_app,
+                                     start_app)
+
+PAGE_LATENCY: float = 0.05   # ответ страницы задачи Codeforces
+COLD_TASKS: int = 20   # задач для /task без кэша условий
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(round(len(values) * share)) - 1)]
+
+
+def message_update(update_id: int, text: str) -> types.Update:
+    command: str = text.split()[0]
+    return types.Update(**{
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': 0, 'text': text,
+            'from': {'id': FakeChat.id, 'is_bot': False,
+                     'first_name': FakeChat.full_name},
+            'chat': {'id': FakeChat.id, 'type': 'private'},
+            'entities': [{'type': 'bot_command', 'offset': 0,
+                          'length': len(command)}],
+        },
+    })
+
+
+def callback_update(update_id: int, data: str) -> types.Update:
+    return types.Update(**{
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'chat_instance': 'benchmark', 'data': data,
+            'from': {'id': FakeChat.id, 'is_bot': False,
+                     'first_name': FakeChat.full_name},
+            'message': {
+                'message_id': update_id, 'date': 0, 'text': '',
+                'chat': {'id': FakeChat.id, 'type': 'private'},
+            },
+        },
+    })
+
+
+async def get_workload() -> tuple:
+    """Команды по данным из базы: {имя: [обновления]} и задачи для /task."""
+    tag, rating = (await bot.get_data_from_db(
+        'SELECT tag, rating FROM contests GROUP BY tag, rating '
+        'ORDER BY count(*) DESC LIMIT 1'
+    ))[0]
+    contest_id, = (await bot.get_data_from_db(
+        'SELECT max(id) FROM contests WHERE tag = %s AND rating = %s',
+        (tag, rating)
+    ))[0]
+    task_ids: list = [row[0] for row in await bot.get_data_from_db(
+        'SELECT id FROM tasks ORDER BY id LIMIT %s', (COLD_TASKS + 1,))]
+
+    commands: dict = {
+        '/start': lambda i: message_update(i, '/start'),
+        '/tags': lambda i: message_update(i, '/tags'),
+        '/ratings': lambda i: message_update(i, f'/ratings {tag}'),
+        '/contests': lambda i: message_update(
+            i, f'/contests {tag} {rating}'),
+        '/contests next': lambda i: callback_update(
+            i, bot.contests_page.new(direction='next', cursor=contest_id)),
+        '/contest': lambda i: message_update(i, f'/contest {contest_id}'),
+        '/contest next': lambda i: callback_update(
+            i, bot.contest_page.new(
+                contest_id=contest_id, direction='next', cursor=1)),
+        '/task': lambda i: message_update(i, f'/task {task_ids[0]}'),
+    }
+    return commands, task_ids[1:]
+
+
+async def find_pairs_without_contests() -> list:
+    """Пары из /tags и /ratings, для которых /contests пуст."""
+    missing: list = []
+    for tag in await bot.get_unique_tags_or_ratings('tag'):
+        for rating in await bot.get_unique_tags_or_ratings('rating', tag):
+            if not await bot.get_cached_data_from_db(
+                    cfg.CONTESTS_PAGE_SQL_QUERY,
+                    (tag, rating, cfg.FIRST_PAGE_CURSOR, 1)):
+                missing.append((tag, rating))
+    return missing
+
+
+async def process(update: types.Update) -> float:
+    started: float = time.perf_counter()
+    await bot.dp.process_update(update)
+    return (time.perf_counter() - started) * 1000
+
+
+async def measure(commands: dict, repeats: int, prefix: str) -> dict:
+    results: dict = {}
+    update_id: int = 0
+    for name, make_update in commands.items():
+        latencies: list = []
+        for _ in range(repeats):
+            update_id += 1
+            latencies.append(await process(make_update(update_id)))
+        for share in (0.5, 0.95, 0.99):
+            results[f'{prefix}.{name}.p{int(share * 100)}_ms'] = \
+                percentile(latencies, share)
+
+    updates: list = [
+        make_update(update_id + i * len(commands) + j)
+        for i in range(repeats)
+        for j, make_update in enumerate(commands.values())
+    ]
+    started: float = time.perf_counter()
+    await asyncio.gather(*(bot.dp.process_update(item) for item in updates))
+    results[f'{prefix}.burst_updates_per_s'] = \
+        len(updates) / (time.perf_counter() - started)
+    return results
+
+
+async def measure_cold_tasks(task_ids: list) -> dict:
+    latencies: list = [
+        await process(message_update(task_id, f'/task {task_id}'))
+        for task_id in task_ids
+    ]
+    return {
+        f'bot.task_cold.p{int(share * 100)}_ms': percentile(latencies, share)
+        for share in (0.5, 0.95)
+    }
+
+
+async def main() -> None:
+    repeats: int = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    bot.log = logging.getLogger('benchmark')
+    bot.sender = bot.MessageSender(1e9, 1, 1e9, 1)
+
+    telegram_app = make_telegram_app()
+    pages_app = make_pages_app(PAGE_LATENCY)
+    telegram_runner, telegram_url = await start_app(telegram_app)
+    pages_runner, cfg.CODEFORCES_URL = await start_app(pages_app)
+    bot.dp.bot = Bot(
+        cfg.TELEGRAM_TOKEN, server=TelegramAPIServer.from_base(telegram_url))
+    Bot.set_current(bot.dp.bot)
+
+    await bot.on_startup(bot.dp)
+    snapshot: bot.Snapshot = bot.snapshot
+    try:
+        commands, task_ids = await get_workload()
+        results: dict = await measure_cold_tasks(task_ids)
+        bot.snapshot = None
+        missing: list = await find_pairs_without_contests()
+        results.update(await measure(commands, repeats, 'bot.db'))
+        if snapshot is not None:
+            bot.snapshot = snapshot
+            missing += await find_pairs_without_contests()
+            results.update(await measure(commands, repeats, 'bot.snapshot'))
+    finally:
+        await bot.on_shutdown(bot.dp)
+        await bot.dp.bot.close()
+        await telegram_runner.cleanup()
+        await pages_runner.cleanup()
+
+    if missing:
+        sys.exit(f'Пары тема/сложность без контестов: {missing}')
+    results['bot.peak_rss_mb'] = \
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results['bot.telegram_calls'] = sum(telegram_app['calls'].values())
+    results['bot.page_requests'] = pages_app['stats']['requests']
+    for name, value in results.items():
+        print(f'{name}: {value:.1f}')
+    print('E2E_RESULT ' + json.dumps(results))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
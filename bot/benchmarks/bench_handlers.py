@@ -0,0 +1,117 @@
+"""Задержка обработчиков команд на локальном PostgreSQL.
+
+Нужна база, заполненная парсером, с параметрами из configs/config.py.
+Запуск из папки bot:
+    python -m benchmarks.bench_handlers [повторов на команду]
+
+Сравниваются общий пул соединений, прежний вариант, в котором
+get_data_from_db создавал и закрывал пул на каждый запрос, и общий пул
+вместе с кэшем контестов.
+"""
+import asyncio
+import logging
+import statistics
+import sys
+import time
+
+from benchmarks.fake_message import FakeMessage
+
+import bot  # после fake_message, который задаёт токен
+import configs.config as cfg
+
+HANDLERS: dict = {
+    '/tags': bot.print_tags,
+    '/ratings': bot.print_ratings_for_tag,
+    '/contests': bot.print_contests_for_tag_and_rating,
+    '/contest': bot.print_tasks_from_define_contest,
+}
+
+
+async def legacy_get_data_from_db(
+        sql_query: str, params: tuple = None) -> list:
+    pool = await bot.aiopg.create_pool(cfg.DSN)
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(sql_query, params)
+            data = await cursor.fetchall()
+    pool.close()
+    await pool.wait_closed()
+    return data
+
+
+async def get_commands() -> list:
+    tag, rating = (await bot.get_data_from_db(
+        'SELECT tag, rating FROM contests GROUP BY tag, rating '
+        'ORDER BY count(*) DESC LIMIT 1'
+    ))[0]
+    contest_id: int = (await bot.get_data_from_db(
+        'SELECT id FROM contests WHERE tag = %s AND rating = %s LIMIT 1',
+        (tag, rating)
+    ))[0][0]
+    return [
+        '/tags', f'/ratings {tag}', f'/contests {tag} {rating}',
+        f'/contest {contest_id}',
+    ]
+
+
+async def measure(commands: list, repeats: int) -> dict:
+    latencies: dict = {}
+    for command in commands:
+        handler = HANDLERS[command.split()[0]]
+        for _ in range(repeats):
+            started: float = time.perf_counter()
+            await handler(FakeMessage(command))
+            latencies.setdefault(command.split()[0], []).append(
+                (time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        HANDLERS[command.split()[0]](FakeMessage(command))
+        for command in commands * repeats
+    ))
+    latencies['burst'] = [(time.perf_counter() - started) * 1000]
+    return latencies
+
+
+def report(title: str, latencies: dict) -> None:
+    print(title)
+    for command, values in latencies.items():
+        if command == 'burst':
+            print(f'  все команды параллельно: {values[0]:.1f} мс')
+            continue
+        values.sort()
+        print(
+            f'  {command}: p50 {statistics.median(values):.1f} мс, '
+            f'p99 {values[int(len(values) * 0.99) - 1]:.1f} мс'
+        )
+
+
+async def main() -> None:
+    repeats: int = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    bot.log = logging.getLogger('benchmark')
+    # Ограничение частоты отправки замерено отдельно в bench_sender
+    bot.sender = bot.MessageSender(1e9, 1, 1e9, 1)
+    await bot.create_db_pool(bot.dp)
+    try:
+        commands: list = await get_commands()
+        cached: dict = await measure(commands, repeats)
+
+        bot.contests_cache.max_size = 0
+        shared: dict = await measure(commands, repeats)
+
+        get_data_from_db = bot.get_data_from_db
+        bot.get_data_from_db = legacy_get_data_from_db
+        try:
+            legacy: dict = await measure(commands, repeats)
+        finally:
+            bot.get_data_from_db = get_data_from_db
+    finally:
+        await bot.close_db_pool(bot.dp)
+
+    report(f'Общий пул (до {cfg.DB_POOL_MAX_SIZE} соединений):', shared)
+    report('Пул на каждый запрос:', legacy)
+    report('Общий пул и кэш:', cached)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Пакетная загрузка условий на локальной заглушке страниц задач.
+
+Запуск из папки bot:
+    python -m benchmarks.bench_scrape [количество задач] [процессов]
+
+Заглушка отдаёт фикстуры, дополненные до размера настоящей страницы,
+с задержкой LATENCY. Условия пишутся в словарь вместо БД. Сравнивается
+разбор в цикле событий и в пуле процессов; условия обоих вариантов
+должны совпасть с разбором тех же страниц напрямую. Выигрыш пула
+зависит от числа ядер.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+import configs.config as cfg
+import scrape_statements
+from benchmarks.bench_statements import PAGE_CHROME
+from benchmarks.stub_servers import make_pages_app, start_app
+from statements import get_task_url
+
+LATENCY: float = 0.05
+CONCURRENCY: int = 16
+
+
+async def run(rows: list, workers: int) -> tuple:
+    saved: dict = {}
+
+    async def save(problem_key: str, locale: str, statement: str) -> bool:
+        saved[(problem_key, locale)] = statement
+        return True
+
+    stats: scrape_statements.ScrapeStats = scrape_statements.ScrapeStats()
+    executor: ProcessPoolExecutor = ProcessPoolExecutor(workers) \
+        if workers else None
+    try:
+        async with aiohttp.ClientSession() as session:
+            await scrape_statements.scrape_batch(
+                rows, 'ru', session, executor, save, stats, CONCURRENCY, 0)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    stats.finish()
+    return saved, stats
+
+
+async def main() -> None:
+    count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    workers: int = int(sys.argv[2]) if len(sys.argv) > 2 \
+        else os.cpu_count() or 1
+    scrape_statements.log = logging.getLogger('benchmark')
+    rows: list = [(i, f'{1000 + i}/A') for i in range(count)]
+
+    runner, cfg.CODEFORCES_URL = await start_app(
+        make_pages_app(LATENCY, PAGE_CHROME))
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                    get_task_url(rows[0][1], 'ru')) as response:
+                page_size: int = len((await response.text()).encode())
+        started: float = time.perf_counter()
+        in_loop, loop_stats = await run(rows, 0)
+        loop_time: float = time.perf_counter() - started
+        started = time.perf_counter()
+        in_pool, pool_stats = await run(rows, workers)
+        pool_time: float = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    print(f'Задач: {count}, страница {page_size // 1024} КБ, задержка '
+          f'{LATENCY * 1000:.0f} мс, загрузок одновременно {CONCURRENCY}')
+    print(f'Разбор в цикле событий: {count / loop_time:.1f} условий/с')
+    print(f'  {loop_stats.report()}')
+    print(f'Пул из {workers} процессов: {count / pool_time:.1f} условий/с')
+    print(f'  {pool_stats.report()}')
+    print(f'Условия совпадают: {in_loop == in_pool}')
+    if in_loop != in_pool or len(in_pool) != count:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""Отправка длинных ответов с ограничением частоты Telegram.
+
+Запуск из папки bot:
+    python -m benchmarks.bench_sender [чатов] [контестов в ответе]
+
+Все чаты одновременно запрашивают /contests с заданным числом
+контестов. Поддельный Telegram отвечает с задержкой LATENCY и, как
+настоящий, возвращает RetryAfter при превышении лимитов на чат и общего
+лимита бота. Прежний вариант отправляет сообщение на каждый контест и
+обрывает ответ на первом RetryAfter, новый склеивает контесты в
+сообщения до 4096 символов и ждёт своей очереди. Отдельно проверяется
+ответ без текстов: отправляется одно сообщение cfg.EMPTY_ANSWER_TEXT.
+"""
+import asyncio
+import logging
+import sys
+import time
+
+from benchmarks.fake_message import FakeChat, FakeMessage
+
+import bot  # после fake_message, который задаёт токен
+import configs.config as cfg
+from aiogram.utils.exceptions import RetryAfter
+
+LATENCY: float = 0.03
+TELEGRAM_CHAT_LIMIT: tuple = (1.0, 5)   # сообщений в секунду, запас
+TELEGRAM_GLOBAL_LIMIT: tuple = (30.0, 30)
+
+
+class FakeTelegram:
+    def __init__(self) -> None:
+        self.global_bucket: bot.TokenBucket = bot.TokenBucket(
+            *TELEGRAM_GLOBAL_LIMIT)
+        self.chat_buckets: dict = {}
+        self.calls: int = 0
+        self.floods: int = 0
+        self.delivered: int = 0
+
+    async def answer(self, chat_id: int, text: str) -> None:
+        self.calls += 1
+        await asyncio.sleep(LATENCY)
+        chat_bucket: bot.TokenBucket = self.chat_buckets.setdefault(
+            chat_id, bot.TokenBucket(*TELEGRAM_CHAT_LIMIT))
+        for bucket in (chat_bucket, self.global_bucket):
+            if bucket.reserve():
+                bucket.tokens += 1
+                self.floods += 1
+                raise RetryAfter(1)
+        self.delivered += text.count('Идентификатор')
+
+
+class TelegramMessage(FakeMessage):
+    def __init__(self, telegram: FakeTelegram, chat_id: int) -> None:
+        super().__init__('/contests')
+        self.chat = FakeChat()
+        self.chat.id = chat_id
+        self.telegram: FakeTelegram = telegram
+
+    async def answer(self, text: str, **kwargs) -> None:
+        await self.telegram.answer(self.chat.id, text)
+
+
+def make_items(count: int) -> list:
+    return ["""
+Идентификатор - {}
+Номер контеста - {}
+Тема - {}
+Сложность - {}
+""".format(i, i // 3, 'Динамическое-программирование', 1500)
+            for i in range(count)]
+
+
+async def legacy_answer(message: TelegramMessage, items: list) -> None:
+    try:
+        for text in items:
+            await message.answer(text)
+    except RetryAfter:
+        pass
+
+
+async def run(chats: int, items: list, answer) -> tuple:
+    telegram: FakeTelegram = FakeTelegram()
+    started: float = time.perf_counter()
+    await asyncio.gather(*(
+        answer(TelegramMessage(telegram, chat_id), items)
+        for chat_id in range(chats)
+    ))
+    return telegram, time.perf_counter() - started
+
+
+def report(title: str, telegram: FakeTelegram, elapsed: float,
+           expected: int) -> None:
+    print(title)
+    print(f'  вызовов API: {telegram.calls}, RetryAfter: {telegram.floods}')
+    print(f'  доставлено контестов: {telegram.delivered} из {expected}')
+    print(f'  время: {elapsed:.2f} с')
+
+
+async def check_empty_answer() -> bool:
+    message: FakeMessage = FakeMessage('/tags')
+    for items in ([], [''], ['', '']):
+        await bot.MessageSender().answer_many(message, items)
+    return message.answers == [cfg.EMPTY_ANSWER_TEXT] * 3
+
+
+async def main() -> None:
+    chats: int = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    count: int = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    items: list = make_items(count)
+    bot.log = logging.getLogger('benchmark')
+    print(
+        f'Чатов: {chats}, контестов в ответе: {count}, сообщений после '
+        f'склейки: {len(bot.pack_messages(items))}'
+    )
+
+    telegram, elapsed = await run(chats, items, legacy_answer)
+    report('Сообщение на контест:', telegram, elapsed, chats * count)
+
+    bot.sender = bot.MessageSender()
+    telegram, elapsed = await run(chats, items, bot.sender.answer_many)
+    report('Склейка и ограничение частоты:', telegram, elapsed, chats * count)
+
+    empty_answered: bool = await check_empty_answer()
+    print(f'Ответ без текстов отправлен: {empty_answered}')
+    if not empty_answered:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
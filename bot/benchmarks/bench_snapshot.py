@@ -0,0 +1,82 @@
+"""Ответы из снимка в памяти против запросов к PostgreSQL.
+
+Нужна база, заполненная парсером, и снимок, записанный им же
+(SNAPSHOT_PATH в .env). Запуск из папки bot:
+    python -m benchmarks.bench_snapshot [повторов на команду] [путь к снимку]
+
+Выводятся размер файла, время загрузки и память, занятая снимком
+(tracemalloc), затем задержки /tags, /ratings, /contests и /contest
+без кэша по БД и по снимку. Ответы обоих вариантов сравниваются.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmarks.bench_handlers import HANDLERS, get_commands, measure, report
+from benchmarks.fake_message import FakeMessage
+
+import bot  # после fake_message, который задаёт токен
+import configs.config as cfg
+
+
+def load_with_memory(path: str) -> tuple:
+    tracemalloc.start()
+    started: float = time.perf_counter()
+    snapshot: bot.Snapshot = bot.Snapshot.load(path)
+    elapsed: float = time.perf_counter() - started
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return snapshot, elapsed, memory, peak
+
+
+async def answers(commands: list) -> list:
+    results: list = []
+    for command in commands:
+        message: FakeMessage = FakeMessage(command)
+        await HANDLERS[command.split()[0]](message)
+        results.append(message.answers)
+    return results
+
+
+async def main() -> None:
+    repeats: int = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    path: str = sys.argv[2] if len(sys.argv) > 2 else cfg.SNAPSHOT_PATH
+    if not path or not os.path.exists(path):
+        sys.exit('Снимок не найден: задайте SNAPSHOT_PATH или путь')
+
+    bot.log = logging.getLogger('benchmark')
+    bot.sender = bot.MessageSender(1e9, 1, 1e9, 1)
+    snapshot, load_time, memory, peak = load_with_memory(path)
+    print(
+        f'Снимок версии {snapshot.version}: файл '
+        f'{os.path.getsize(path) / 2 ** 20:.1f} МБ, загрузка '
+        f'{load_time * 1000:.0f} мс, в памяти {memory / 2 ** 20:.1f} МБ '
+        f'(пик при разборе {peak / 2 ** 20:.1f} МБ)'
+    )
+
+    await bot.create_db_pool(bot.dp)
+    try:
+        commands: list = await get_commands()
+        bot.contests_cache.max_size = 0
+        bot.snapshot = None
+        expected: list = await answers(commands)
+        database: dict = await measure(commands, repeats)
+
+        bot.snapshot = snapshot
+        same: bool = await answers(commands) == expected
+        in_memory: dict = await measure(commands, repeats)
+    finally:
+        await bot.close_db_pool(bot.dp)
+
+    report('PostgreSQL без кэша:', database)
+    report('Снимок в памяти:', in_memory)
+    print(f'Ответы совпадают: {same}')
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
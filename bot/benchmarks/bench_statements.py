@@ -0,0 +1,153 @@
+"""Скорость извлечения условия задачи из страницы Codeforces.
+
+Запуск из папки bot:
+    python -m benchmarks.bench_statements [повторов]
+
+Страницы из benchmarks/fixtures дополняются меню и боковой панелью до
+размера настоящей страницы задачи. Прежний вариант - отдельные Chapter
+на полном дереве html.parser. Для задач ровно с двумя примерами вывод
+обязан совпадать, прежний вариант терял примеры при их другом количестве.
+"""
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+import configs.config as cfg
+import statements
+
+FIXTURES_DIR: str = os.path.join(os.path.dirname(__file__), 'fixtures')
+PAGE_CHROME: str = ''.join(
+    f'<div class="roundbox sidebox"><div class="caption titled">Блок {i}'
+    f'</div><table class="rtable"><tr><td class="left">'
+    f'<a href="/profile/user{i}">user{i}</a></td><td>{i * 7}</td></tr>'
+    f'</table></div><script>var x{i} = "{"-" * 200}";</script>'
+    for i in range(300)
+)
+
+
+class Chapter:
+    def __init__(self, task: BeautifulSoup, class_: str, section: str) -> None:
+        self.output: str = ''
+        self.class_: str = class_
+        self.task: BeautifulSoup = task
+        if section == 'header':
+            class_ = self.task.find('div', {'class': f'{self.class_}'})
+            title = class_.find(
+                'div', {'class': 'property-title'}).text.strip()
+            value = str(class_.find(
+                'div', {'class': 'property-title'}).next_sibling)
+            self.output = title + ': ' + value
+        elif section == 'i/o':
+            title = self.task.find('div', {'class': f'{self.class_}'})
+            value = title.next_sibling.text.strip()
+            title = title.text.strip()
+            self.output = title + f"\n{cfg.SEP}\n" + value
+        elif section == 'tests':
+            examples = self.task.find(
+                'div', {'class': 'section-title'}).text.strip()
+            inputs = self.task.findAll('div', {'class': 'input'})
+            outputs = self.task.findAll('div', {'class': 'output'})
+            self.output = (
+                examples + f'\n{cfg.SEP}' + self.parsed_data(inputs[0]) +
+                self.parsed_data(outputs[0]) +
+                (self.parsed_data(inputs[1]) + self.parsed_data(outputs[1]))
+                if len(inputs) == 2 else ''
+            )
+
+    @staticmethod
+    def parsed_data(data):
+        input_ = data.find('div', {'class': 'title'})
+        value_ = str(
+            input_.next_sibling).replace('<br/>', '\n')[5:-6].rstrip()
+        input_ = input_.text.strip()
+        return f"\n{input_}\n{cfg.SEP}\n{value_}\n{cfg.SEP}"
+
+
+def legacy_task_descriptions(page: str, task_url: str) -> str:
+    soup: BeautifulSoup = BeautifulSoup(page, 'html.parser')
+
+    header: BeautifulSoup = soup.find('div', {'class': 'header'})
+    title: str = header.find('div', {'class': 'title'}).text.strip()
+    time_limit: Chapter = Chapter(header, 'time-limit', 'header')
+    memory_limit: Chapter = Chapter(header, 'memory-limit', 'header')
+    file_input: Chapter = Chapter(header, 'input-file', 'header')
+    file_output: Chapter = Chapter(header, 'output-file', 'header')
+
+    task_description: str = soup.find(
+        'div', {'class': 'header'}).next_sibling.text.strip()
+
+    input_: BeautifulSoup = soup.find('div', {'class': 'input-specification'})
+    input_specification: Chapter = Chapter(input_, 'section-title', 'i/o')
+
+    output: BeautifulSoup = soup.find('div', {'class': 'output-specification'})
+    output_specification: Chapter = Chapter(output, 'section-title', 'i/o')
+
+    test_soup: BeautifulSoup = soup.find('div', {'class': 'sample-tests'})
+    tests: Chapter = Chapter(test_soup, 'input', 'tests')
+
+    return f"""
+{title}\n{'--'*len(title)}
+{time_limit.output}
+{memory_limit.output}
+{cfg.SEP}
+{file_input.output}
+{file_output.output}
+{cfg.SEP}
+{task_description}
+{cfg.SEP}
+{input_specification.output}
+{cfg.SEP}
+{output_specification.output}
+{cfg.SEP}
+{tests.output}
+{task_url}
+"""
+
+
+def load_pages() -> dict:
+    pages: dict = {}
+    for file_name in sorted(os.listdir(FIXTURES_DIR)):
+        path: str = os.path.join(FIXTURES_DIR, file_name)
+        with open(path, encoding='UTF-8') as file:
+            page: str = file.read()
+        pages[file_name] = page.replace(
+            '<div id="body">', f'<div id="body">{PAGE_CHROME}')
+    return pages
+
+
+def measure(function, pages: dict, repeats: int) -> float:
+    started: float = time.perf_counter()
+    for _ in range(repeats):
+        for page in pages.values():
+            function(page, 'url')
+    return (time.perf_counter() - started) / repeats / len(pages) * 1000
+
+
+def main() -> None:
+    repeats: int = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pages: dict = load_pages()
+
+    for file_name, page in pages.items():
+        statement: statements.Statement = statements.Statement(page)
+        if len(statement.samples) == 2:
+            same: bool = statements.get_task_descriptions(page, 'url') == \
+                legacy_task_descriptions(page, 'url')
+            result: str = f'вывод совпадает: {same}'
+        else:
+            result = 'прежний вариант выводил 0 примеров'
+        print(
+            f'{file_name}: {len(page) // 1024} КБ, '
+            f'примеров {len(statement.samples)}, {result}'
+        )
+
+    legacy: float = measure(legacy_task_descriptions, pages, repeats)
+    current: float = measure(statements.get_task_descriptions, pages, repeats)
+    print(f'Chapter + html.parser: {legacy:.1f} мс на страницу')
+    print(f'Statement + {cfg.HTML_PARSER}: {current:.1f} мс на страницу')
+    print(f'Ускорение: {legacy / current:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import os
+
+# Bot проверяет формат токена при импорте bot.py
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:benchmark-token')
+
+
+class FakeChat:
+    id: int = 1
+    full_name: str = 'benchmark'
+    mention: str = '@benchmark'
+
+
+class FakeMessage:
+    """Замена types.Message: ответы копятся в answers вместо Telegram."""
+
+    def __init__(self, text: str) -> None:
+        self.text: str = text
+        self.chat: FakeChat = FakeChat()
+        self.answers: list = []
+
+    async def answer(self, text: str, **kwargs) -> None:
+        self.answers.append(text)
@@ -0,0 +1,70 @@
+"""Локальные заглушки Telegram Bot API и страниц задач Codeforces.
+
+Telegram: POST /bot{token}/{method} отвечает как Bot API, sendMessage и
+editMessageText возвращают сообщение с переданным текстом, остальные
+методы - True. Вызовы считаются в app['calls'] по методам.
+
+Страницы задач: GET /problemset/problem/{contest}/{index} отдаёт одну из
+фикстур benchmarks/fixtures, выбранную по номеру контеста, с задержкой
+latency секунд. chrome вставляется в начало <div id="body">, чтобы
+довести страницу до размера настоящей.
+"""
+import asyncio
+import os
+
+from aiohttp import web
+
+FIXTURES_DIR: str = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def make_telegram_app() -> web.Application:
+    async def api_method(request: web.Request) -> web.Response:
+        method: str = request.match_info['method'].lower()
+        calls: dict = request.app['calls']
+        calls[method] = calls.get(method, 0) + 1
+        data = await request.post()
+
+        result = True
+        if method in ('sendmessage', 'editmessagetext'):
+            result = {
+                'message_id': sum(calls.values()), 'date': 0,
+                'chat': {'id': int(data.get('chat_id', 1)),
+                         'type': 'private'},
+                'text': data.get('text', ''),
+            }
+        return web.json_response({'ok': True, 'result': result})
+
+    app: web.Application = web.Application()
+    app['calls'] = {}
+    app.router.add_post('/bot{token}/{method}', api_method)
+    return app
+
+
+def make_pages_app(
+        latency: float = 0.0, chrome: str = '') -> web.Application:
+    pages: list = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        with open(os.path.join(FIXTURES_DIR, name), encoding='UTF-8') as file:
+            pages.append(file.read().replace(
+                '<div id="body">', f'<div id="body">{chrome}'))
+
+    async def problem_page(request: web.Request) -> web.Response:
+        request.app['stats']['requests'] += 1
+        await asyncio.sleep(latency)
+        contest: int = int(request.match_info['contest'])
+        return web.Response(
+            text=pages[contest % len(pages)], content_type='text/html')
+
+    app: web.Application = web.Application()
+    app['stats'] = {'requests': 0}
+    app.router.add_get('/problemset/problem/{contest}/{index}', problem_page)
+    return app
+
+
+async def start_app(app: web.Application) -> tuple:
+    """Запуск на свободном порту: (runner, базовый адрес)."""
+    runner: web.AppRunner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', 0).start()
+    port: int = runner.addresses[0][1]
+    return runner, f'http://localhost:{port}'
@@ -1,183 +1,624 @@
-import re
+import asyncio
+import json
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 
 import aiohttp
 import aiopg
 from aiogram import Bot, Dispatcher, executor, types
-from bs4 import BeautifulSoup
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.utils.callback_data import CallbackData
+from aiogram.utils.exceptions import (BotBlocked, ChatNotFound, RetryAfter,
+                                      UserDeactivated)
+from aiohttp import web
 
 import configs.config as cfg
+import database
+from database import (close_db_pool, create_db_pool, get_data_from_db,
+                      send_data_to_db)
+from metrics import metrics, start_metrics_server
+from statements import get_task_descriptions, get_task_url
 
 dp = Dispatcher(Bot(token=cfg.TELEGRAM_TOKEN))
+metrics_runner: web.AppRunner = None
+# Сообщения о каждом вызове, отключаются при VERBOSE=0
+calls_log: logging.Logger = logging.getLogger('bot.calls')
+events_listener: asyncio.Task = None
+contests_page: CallbackData = CallbackData('contests', 'direction', 'cursor')
+contest_page: CallbackData = CallbackData(
+    'contest', 'contest_id', 'direction', 'cursor')
 
 
-class Chapter:
-    def __init__(self, task: BeautifulSoup, class_: str, section: str) -> None:
-        self.__output: str = ''
-        self.__class_: str = class_
-        self.__task: BeautifulSoup = task
-        self.__activate_fields(section)
+class HandlerMetrics(BaseMiddleware):
+    """Время обработчиков команд и кнопок по имени обработчика."""
 
-    @property
-    def output(self):
-        return self.__output
+    @staticmethod
+    def __start(data: dict) -> None:
+        data['metrics_handler'] = current_handler.get().__name__
+        data['metrics_started'] = time.perf_counter()
 
-    @output.setter
-    def output(self, output):
-        self.__output = output
+    @staticmethod
+    def __finish(data: dict) -> None:
+        if 'metrics_started' in data:
+            metrics.observe(
+                'bot_handler_seconds',
+                time.perf_counter() - data['metrics_started'],
+                handler=data['metrics_handler']
+            )
+
+    async def on_process_message(self, message, data: dict) -> None:
+        self.__start(data)
+
+    async def on_post_process_message(
+            self, message, results: list, data: dict) -> None:
+        self.__finish(data)
+
+    async def on_process_callback_query(self, query, data: dict) -> None:
+        self.__start(data)
+
+    async def on_post_process_callback_query(
+            self, query, results: list, data: dict) -> None:
+        self.__finish(data)
+
+
+dp.middleware.setup(HandlerMetrics())
+
+
+class TTLCache:
+    """Кэш с вытеснением давно не использованных записей и сроком жизни."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.__data: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> tuple:
+        item: tuple = self.__data.get(key)
+        if item is None or item[0] < time.monotonic():
+            self.misses += 1
+            return False, None
+        self.__data.move_to_end(key)
+        self.hits += 1
+        return True, item[1]
+
+    def set(self, key: str, value) -> None:
+        self.__data[key] = (time.monotonic() + self.ttl, value)
+        self.__data.move_to_end(key)
+        while len(self.__data) > self.max_size:
+            self.__data.popitem(last=False)
+
+    def clear(self) -> None:
+        self.__data.clear()
+
+
+class Snapshot:
+    """Представления бота в памяти из снимка, записанного парсером.
+
+    select повторяет запросы к БД для /tags, /ratings, /contests и
+    /contest и возвращает те же строки в том же порядке.
+    """
+
+    def __init__(self, data: dict) -> None:
+        self.version: int = data['version']
+        self.ratings: dict = {}
+        for tag, rating in data['tag_stats']:
+            self.ratings.setdefault(tag, []).append((rating,))
+        self.tags: list = [(tag,) for tag in self.ratings]
+
+        # Контесты пары и задачи контеста по возрастанию id/позиции,
+        # рядом - список ключей для bisect
+        self.contests: dict = {}
+        self.contest_pairs: dict = {}
+        for contest_id, number, tag, rating in data['contests']:
+            rows, ids = self.contests.setdefault((tag, rating), ([], []))
+            rows.append((contest_id, number, tag, rating))
+            ids.append(contest_id)
+            self.contest_pairs[contest_id] = (tag, rating)
+        self.contest_tasks: dict = {}
+        for contest_id, *task in data['contest_tasks']:
+            rows, positions = self.contest_tasks.setdefault(
+                contest_id, ([], []))
+            rows.append(tuple(task))
+            positions.append(task[-1])
+
+        self.views: dict = {
+            cfg.TAGS_SQL_QUERY: lambda: self.tags,
+            cfg.RATINGS_FOR_TAG_SQL_QUERY:
+                lambda tag: self.ratings.get(tag, []),
+            cfg.CONTESTS_PAGE_SQL_QUERY:
+                lambda tag, rating, cursor, limit: self.__before(
+                    self.contests.get((tag, rating)), cursor, limit),
+            cfg.CONTESTS_NEXT_PAGE_SQL_QUERY:
+                lambda anchor, cursor, limit: self.__before(
+                    self.__pair_contests(anchor), cursor, limit),
+            cfg.CONTESTS_PREV_PAGE_SQL_QUERY:
+                lambda anchor, cursor, limit: self.__after(
+                    self.__pair_contests(anchor), cursor, limit),
+            cfg.CONTEST_TASKS_NEXT_PAGE_SQL_QUERY:
+                lambda contest_id, cursor, limit: self.__after(
+                    self.contest_tasks.get(contest_id), cursor, limit),
+            cfg.CONTEST_TASKS_PREV_PAGE_SQL_QUERY:
+                lambda contest_id, cursor, limit: self.__before(
+                    self.contest_tasks.get(contest_id), cursor, limit),
+        }
+
+    @classmethod
+    def load(cls, path: str) -> 'Snapshot':
+        with open(path, encoding='UTF-8') as file:
+            return cls(json.load(file))
+
+    def __pair_contests(self, contest_id: int) -> tuple:
+        return self.contests.get(self.contest_pairs.get(contest_id))
 
-    @output.deleter
-    def output(self):
-        del self.__output
+    @staticmethod
+    def __before(items: tuple, cursor: int, limit: int) -> list:
+        """Не больше limit строк с ключом меньше cursor, по убыванию."""
+        if items is None:
+            return []
+        rows, keys = items
+        end: int = bisect_left(keys, cursor)
+        return rows[max(0, end - limit):end][::-1]
 
     @staticmethod
-    def __parsed_data(data):
-        input_ = data.find('div', {'class': 'title'})
-        value_ = str(
-            input_.next_sibling).replace('<br/>', '\n')[5:-6].rstrip()
-        input_ = input_.text.strip()
-        return f"\n{input_}\n{cfg.SEP}\n{value_}\n{cfg.SEP}"
-
-    def __activate_fields(self, section) -> None:
-        if section == 'header':
-            self.__activate_header_fields()
-        elif section == 'i/o':
-            self.__activate_input_or_output_fields()
-        elif section == 'tests':
-            self.__activate_tests_fields()
-
-    def __activate_header_fields(self) -> None:
-        class_ = self.__task.find('div', {'class': f'{self.__class_}'})
-        title = class_.find(
-            'div', {'class': 'property-title'}).text.strip()
-        value = str(class_.find(
-            'div', {'class': 'property-title'}).next_sibling)
-        self.output = title + ': ' + value
-
-    def __activate_input_or_output_fields(self) -> None:
-        title = self.__task.find('div', {'class': f'{self.__class_}'})
-        value = title.next_sibling.text.strip()
-        title = title.text.strip()
-        self.output = title + f"\n{cfg.SEP}\n" + value
-
-    def __activate_tests_fields(self) -> None:
-        examples = self.__task.find(
-            'div', {'class': 'section-title'}).text.strip()
-        inputs = self.__task.findAll('div', {'class': 'input'})
-        outputs = self.__task.findAll('div', {'class': 'output'})
-        self.output = (
-            examples + f'\n{cfg.SEP}' + self.__parsed_data(inputs[0]) +
-            self.__parsed_data(outputs[0]) +
-            (self.__parsed_data(inputs[1]) + self.__parsed_data(outputs[1])) if
-            len(inputs) == 2 else ''
-        )
+    def __after(items: tuple, cursor: int, limit: int) -> list:
+        """Не больше limit строк с ключом больше cursor, по возрастанию."""
+        if items is None:
+            return []
+        rows, keys = items
+        start: int = bisect_right(keys, cursor)
+        return rows[start:start + limit]
+
+    def select(self, sql_query: str, params: tuple = None) -> list:
+        """Строки запроса или None, если запрос снимок не покрывает."""
+        view = self.views.get(sql_query)
+        if view is None:
+            return None
+        return view(*(params or ()))
+
+
+class TokenBucket:
+    """Не больше rate отправок в секунду после запаса из capacity.
+
+    Токен резервируется сразу, поэтому баланс может уйти в минус, и
+    каждый ожидающий спит ровно до своей очереди, без блокировок.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate: float = rate
+        self.capacity: int = capacity
+        self.tokens: float = capacity
+        self.updated: float = time.monotonic()
+
+    def reserve(self) -> float:
+        now: float = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self) -> None:
+        delay: float = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class MessageSender:
+    """Отправка ответов через общий и отдельный для чата TokenBucket.
+
+    Сообщения одного чата уходят по очереди, после RetryAfter отправка
+    повторяется через указанное Telegram время.
+    """
+
+    def __init__(
+            self, global_rate: float = cfg.SEND_GLOBAL_RATE,
+            global_burst: int = cfg.SEND_GLOBAL_BURST,
+            chat_rate: float = cfg.SEND_CHAT_RATE,
+            chat_burst: int = cfg.SEND_CHAT_BURST) -> None:
+        self.global_bucket: TokenBucket = TokenBucket(
+            global_rate, global_burst)
+        self.chat_rate: float = chat_rate
+        self.chat_burst: int = chat_burst
+        self.chat_buckets: OrderedDict = OrderedDict()
+        self.sent: int = 0
+        self.retries: int = 0
+
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket: TokenBucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+            while len(self.chat_buckets) > cfg.SEND_CHATS_MAX:
+                self.chat_buckets.popitem(last=False)
+        self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def send(self, chat_id: int, method, *args, **kwargs):
+        """Вызов метода Telegram (answer, edit_text) для чата chat_id."""
+        for attempt in range(cfg.SEND_RETRY_ATTEMPTS + 1):
+            await self.chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                result = await method(*args, **kwargs)
+                self.sent += 1
+                metrics.inc('bot_messages_sent_total')
+                return result
+            except RetryAfter as _error:
+                if attempt == cfg.SEND_RETRY_ATTEMPTS:
+                    raise
+                self.retries += 1
+                metrics.inc('bot_send_retries_total')
+                log.warning(
+                    f'Telegram ограничил отправку в чат {chat_id}, '
+                    f'повтор через {_error.timeout} с'
+                )
+                await asyncio.sleep(_error.timeout)
 
+    async def answer(self, message: types.Message, text: str, **kwargs):
+        return await self.send(
+            message.chat.id, message.answer, text, **kwargs)
 
-async def get_data_from_db(sql_query: str) -> list:
-    try:
-        pool = await aiopg.create_pool(cfg.DSN)
+    async def answer_many(
+            self, message: types.Message, items: list, **kwargs) -> None:
+        """Склеенные тексты, kwargs (клавиатура) - к последнему.
+
+        Если все тексты пустые (например, /tags до первого построения
+        контестов), отправляется cfg.EMPTY_ANSWER_TEXT.
+        """
+        messages: list = pack_messages(items) or [cfg.EMPTY_ANSWER_TEXT]
+        for text in messages[:-1]:
+            await self.answer(message, text)
+        await self.answer(message, messages[-1], **kwargs)
+
+
+def split_text(text: str, limit: int) -> list:
+    """Части текста не длиннее limit, по возможности по границам строк."""
+    if len(text) <= limit:
+        return [text]
+
+    parts: list = []
+    current: str = ''
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ''
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            parts.append(current)
+            current = ''
+        current += line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def pack_messages(
+        items: list, limit: int = cfg.MESSAGE_MAX_LENGTH) -> list:
+    """Склейка текстов в сообщения не длиннее limit.
+
+    Тексты идут подряд без разделителя и разрезаются, только если сами
+    не помещаются в одно сообщение.
+    """
+    messages: list = []
+    current: str = ''
+    for item in items:
+        for part in split_text(item, limit):
+            if current and len(current) + len(part) > limit:
+                messages.append(current)
+                current = ''
+            current += part
+    if current:
+        messages.append(current)
+    return messages
+
+
+contests_cache: TTLCache = TTLCache(cfg.CACHE_MAX_SIZE, cfg.CACHE_TTL)
+statements_cache: TTLCache = TTLCache(
+    cfg.STATEMENTS_CACHE_SIZE, cfg.STATEMENT_MAX_AGE)
+last_prefetched_task_id: int = 0
+# Последняя обработанная версия данных парсера и последняя задача,
+# о которой оповещены подписчики
+data_version: int = 0
+last_alerted_task_id: int = 0
+alerts_lock: asyncio.Lock = None
+# Не даёт подряд пришедшим событиям парсера загружать одни и те же условия
+prefetch_lock: asyncio.Lock = None
+# Снимок представлений, None - ответы из БД
+snapshot: Snapshot = None
+sender: MessageSender = MessageSender()
+
+
+async def listen_parser_events() -> None:
+    """Одно соединение с LISTEN на каналы событий парсера.
+
+    После (пере)подключения номер версии сверяется с data_version: если
+    он вырос, пока соединения не было, событие обрабатывается так, будто
+    уведомление пришло.
+    """
+    global data_version
+    while True:
+        try:
+            async with aiopg.connect(cfg.DSN) as connection:
+                async with connection.cursor() as cursor:
+                    for channel in (cfg.TASKS_CHANNEL, cfg.CONTESTS_CHANNEL,
+                                    cfg.SNAPSHOT_CHANNEL):
+                        await cursor.execute(f'LISTEN {channel}')
+                rows: list = await get_data_from_db(cfg.DATA_VERSION_SQL_QUERY)
+                if rows != [('False',)] and rows[0][0] > data_version:
+                    if data_version:
+                        log.info('Пропущены события парсера, сброс кэша')
+                        refresh_after_update(True, True)
+                        asyncio.ensure_future(load_snapshot())
+                    data_version = rows[0][0]
+                while True:
+                    notify = await connection.notifies.get()
+                    handle_parser_event(
+                        notify.channel, json.loads(notify.payload))
+        except asyncio.CancelledError:
+            raise
+        except Exception as _error:
+            log.error(f'Подписка на события парсера прервана: {_error}')
+            await asyncio.sleep(cfg.LISTEN_RECONNECT_DELAY)
+
+
+def handle_parser_event(channel: str, payload: dict) -> None:
+    global data_version
+    version: int = payload.get('version', 0)
+    if channel == cfg.SNAPSHOT_CHANNEL:
+        if snapshot is None or version > snapshot.version:
+            asyncio.ensure_future(load_snapshot())
+        return
+    if version <= data_version:
+        return
+    data_version = version
+    log.info(
+        f'Событие {channel}, версия данных - {version}: {payload}. '
+        f'Сброс кэша, попаданий - {contests_cache.hits}, промахов - '
+        f'{contests_cache.misses}. Время запросов к БД: '
+        f'{database.queries.format_timings()}'
+    )
+    refresh_after_update(
+        channel == cfg.TASKS_CHANNEL and payload.get('new_tasks', 0) > 0,
+        channel == cfg.CONTESTS_CHANNEL
+    )
+
+
+async def load_snapshot() -> None:
+    """Загрузка снимка и замена текущего одним присваиванием.
 
-        async with pool.acquire() as connection:
-            async with connection.cursor() as cursor:
-                await cursor.execute(sql_query)
-                data = await cursor.fetchall()
-            pool.close()
+    Разбор идёт в отдельном потоке, обработчики до замены отвечают по
+    старому снимку. Если снимок не прочитан, остаётся прежний.
+    """
+    global snapshot
+    if not cfg.SNAPSHOT_PATH:
+        return
+    try:
+        started: float = time.perf_counter()
+        loaded: Snapshot = await asyncio.get_event_loop().run_in_executor(
+            None, Snapshot.load, cfg.SNAPSHOT_PATH)
     except Exception as _error:
-        message: str = 'Не удалось получить данные из БД'
-        log.critical(message, _error, exc_info=True)
-        return [('False',)]
+        log.error(f'Снимок {cfg.SNAPSHOT_PATH} не загружен: {_error}')
+        return
+    if snapshot is not None and loaded.version < snapshot.version:
+        return
+    snapshot = loaded
+    log.info(
+        f'Загружен снимок версии {loaded.version} за '
+        f'{(time.perf_counter() - started) * 1000:.0f} мс'
+    )
 
+
+def from_snapshot(sql_query: str, params: tuple = None) -> list:
+    """Строки из снимка или None, если его нет или запрос не покрыт."""
+    if snapshot is None:
+        return None
+    return snapshot.select(sql_query, params)
+
+
+def refresh_after_update(new_tasks: bool, contests_updated: bool) -> None:
+    contests_cache.clear()
+    if new_tasks:
+        asyncio.ensure_future(alert_subscribers())
+    if contests_updated:
+        asyncio.ensure_future(prefetch_statements())
+
+
+def render_alerts(rows: list) -> dict:
+    """Тексты оповещений по чатам: {chat_id: [текст по каждой теме]}.
+
+    rows - (чат, тема, id, название, сложность), отсортированные по чату
+    и теме.
+    """
+    tasks_by_chat: dict = {}
+    for chat_id, tag, task_id, name, rating in rows:
+        tasks_by_chat.setdefault(chat_id, {}).setdefault(tag, []).append(
+            f'{task_id} - {name} ({rating})')
+
+    alerts: dict = {}
+    for chat_id, tags in tasks_by_chat.items():
+        alerts[chat_id] = []
+        for tag, tasks in tags.items():
+            text: str = f'Новые задачи по теме {tag}:\n' + '\n'.join(
+                tasks[:cfg.ALERT_TASKS_LIMIT])
+            if len(tasks) > cfg.ALERT_TASKS_LIMIT:
+                text += f'\nи ещё {len(tasks) - cfg.ALERT_TASKS_LIMIT}'
+            alerts[chat_id].append(text + '\n\n')
+    return alerts
+
+
+async def alert_subscribers() -> None:
+    """Оповещение подписчиков о задачах, появившихся с прошлого раза."""
+    global last_alerted_task_id
+    async with alerts_lock:
+        rows: list = await get_data_from_db(cfg.LAST_TASK_ID_SQL_QUERY)
+        if rows == [('False',)] or rows[0][0] <= last_alerted_task_id:
+            return
+        last_task_id: int = rows[0][0]
+        rows = await get_data_from_db(
+            cfg.SUBSCRIBED_NEW_TASKS_SQL_QUERY,
+            (last_alerted_task_id, last_task_id)
+        )
+        if rows == [('False',)]:
+            return
+        last_alerted_task_id = last_task_id
+
+        alerts: dict = render_alerts(rows)
+        log.info(f'Оповещение о новых задачах, чатов - {len(alerts)}')
+        for chat_id, items in alerts.items():
+            try:
+                for text in pack_messages(items):
+                    await sender.send(
+                        chat_id, dp.bot.send_message, chat_id, text)
+            except (BotBlocked, ChatNotFound, UserDeactivated):
+                log.info(f'Чат {chat_id} недоступен, подписки удалены')
+                await send_data_to_db(
+                    cfg.UNSUBSCRIBE_CHAT_SQL_QUERY, (chat_id,))
+            except Exception as _error:
+                log.error(f'Оповещение в чат {chat_id} не отправлено: '
+                          f'{_error}')
+
+
+async def on_startup(dispatcher: Dispatcher) -> None:
+    global events_listener, last_prefetched_task_id, last_alerted_task_id
+    global alerts_lock, prefetch_lock, metrics_runner
+    if cfg.METRICS_PORT:
+        metrics_runner = await start_metrics_server(
+            cfg.METRICS_HOST, cfg.METRICS_PORT)
+    await create_db_pool(dispatcher)
+    await send_data_to_db(cfg.STATEMENTS_TABLE_MAKE_SQL_QUERY)
+    await send_data_to_db(cfg.SUBSCRIPTIONS_TABLE_MAKE_SQL_QUERY)
+    rows: list = await get_data_from_db(cfg.LAST_TASK_ID_SQL_QUERY)
+    if rows != [('False',)]:
+        last_prefetched_task_id = last_alerted_task_id = rows[0][0]
+    alerts_lock = asyncio.Lock()
+    prefetch_lock = asyncio.Lock()
+    await load_snapshot()
+    events_listener = asyncio.ensure_future(listen_parser_events())
+
+
+async def on_shutdown(dispatcher: Dispatcher) -> None:
+    events_listener.cancel()
+    log.info(f'Время запросов к БД: {database.queries.format_timings()}')
+    await close_db_pool(dispatcher)
+    if metrics_runner:
+        await metrics_runner.cleanup()
+
+
+async def get_cached_data_from_db(
+        sql_query: str, params: tuple = None) -> list:
+    data: list = from_snapshot(sql_query, params)
+    if data is not None:
+        metrics.inc('bot_view_reads_total', source='snapshot')
+        return data
+
+    key: str = f'{sql_query}{params}' if params else sql_query
+    found, data = contests_cache.get(key)
+    if found:
+        metrics.inc('bot_view_reads_total', source='cache')
+        return data
+
+    metrics.inc('bot_view_reads_total', source='db')
+    data = await get_data_from_db(sql_query, params)
+    if data != [('False',)]:
+        contests_cache.set(key, data)
     return data
 
 
 async def get_unique_tags_or_ratings(column_name: str, tag=None) -> list:
-    piece: str = f"WHERE tag='{tag}'"
-    sql_query: str = f"""SELECT DISTINCT {column_name} FROM contests
-                {piece if tag else ''} ORDER BY {column_name}"""
+    if column_name == 'tag':
+        sql_query, params = cfg.TAGS_SQL_QUERY, None
+    else:
+        sql_query, params = cfg.RATINGS_FOR_TAG_SQL_QUERY, (tag,)
 
-    return await parse_db_response(await get_data_from_db(sql_query))
+    return await parse_db_response(
+        await get_cached_data_from_db(sql_query, params))
 
 
 async def parse_db_response(db_response: list) -> list:
     return [str_val[0] for str_val in [tup for tup in db_response]]
 
 
-async def parse_contest(source_contest: list) -> list:
-    parsed_tasks: list = []
-    for tuple_tasks in source_contest:
-        for tasks_list in tuple_tasks:
-            for source_task in tasks_list:
-                task: list = re.sub(cfg.REGEX, "", source_task).split(',')
-                idx, *tags, count_solved, name, number_idx, difficulty = task
-                parsed_tasks.append(
-                    [
-                        int(idx), ', '.join(tags),
-                        int(count_solved), name, number_idx, int(difficulty)
-                    ]
-                )
-    return parsed_tasks
-
-
-async def get_task_descriptions(task_url: str) -> str:
+async def fetch_task_page(task_url: str) -> str:
     try:
-        async with aiohttp.ClientSession() as session:
-            response = await session.get(task_url)
-        if response.status != 200:
-            raise Exception('Не успешный код ответа')
+        with metrics.timer('bot_page_fetch_seconds'):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(task_url) as response:
+                    if response.status != 200:
+                        raise Exception('Не успешный код ответа')
+                    return await response.text()
     except Exception as _error:
+        metrics.inc('bot_page_fetch_errors_total')
         message: str = 'Codeforces не отвечает'
-        log.critical(message, _error, exc_info=True)
-        return message
-
-    soup: BeautifulSoup = BeautifulSoup(await response.text(), 'html.parser')
+        log.critical(f'{message}: {_error}', exc_info=True)
+        return None
 
-    header: BeautifulSoup = soup.find('div', {'class': 'header'})
-    title: str = header.find('div', {'class': 'title'}).text.strip()
-    time_limit: Chapter = Chapter(header, 'time-limit', 'header')
-    memory_limit: Chapter = Chapter(header, 'memory-limit', 'header')
-    file_input: Chapter = Chapter(header, 'input-file', 'header')
-    file_output: Chapter = Chapter(header, 'output-file', 'header')
 
-    task_description: str = soup.find(
-        'div', {'class': 'header'}).next_sibling.text.strip()
+async def get_task_statement(problem_key: str, locale: str = 'ru') -> str:
+    """Условие задачи из кэша в памяти, таблицы statements или Codeforces.
 
-    input_: BeautifulSoup = soup.find('div', {'class': 'input-specification'})
-    input_specification: Chapter = Chapter(input_, 'section-title', 'i/o')
+    Записи старше cfg.STATEMENT_MAX_AGE перезапрашиваются, а если
+    Codeforces не отвечает, отдаётся сохранённая версия.
+    """
+    found, statement = statements_cache.get(f'{problem_key}?{locale}')
+    if found:
+        return statement
 
-    output: BeautifulSoup = soup.find('div', {'class': 'output-specification'})
-    output_specification: Chapter = Chapter(output, 'section-title', 'i/o')
-
-    test_soup: BeautifulSoup = soup.find('div', {'class': 'sample-tests'})
-    tests: Chapter = Chapter(test_soup, 'input', 'tests')
-
-    result = f"""
-{title}\n{'--'*len(title)}
-{time_limit.output}
-{memory_limit.output}
-{cfg.SEP}
-{file_input.output}
-{file_output.output}
-{cfg.SEP}
-{task_description}
-{cfg.SEP}
-{input_specification.output}
-{cfg.SEP}
-{output_specification.output}
-{cfg.SEP}
-{tests.output}
-{task_url}
-"""
+    rows: list = await get_data_from_db(
+        cfg.GET_STATEMENT_SQL_QUERY,
+        (cfg.STATEMENT_MAX_AGE, problem_key, locale)
+    )
+    stored: tuple = rows[0] if rows and rows != [('False',)] else None
+    if stored and stored[1]:
+        statements_cache.set(f'{problem_key}?{locale}', stored[0])
+        return stored[0]
+
+    task_url: str = get_task_url(problem_key, locale)
+    page: str = await fetch_task_page(task_url)
+    if page is None:
+        return stored[0] if stored else 'Codeforces не отвечает'
+
+    statement = get_task_descriptions(page, task_url)
+    statements_cache.set(f'{problem_key}?{locale}', statement)
+    await send_data_to_db(
+        cfg.SAVE_STATEMENT_SQL_QUERY, (problem_key, locale, statement))
+    return statement
+
+
+async def prefetch_statements() -> None:
+    """Загрузка условий задач, появившихся с прошлой загрузки."""
+    global last_prefetched_task_id
+    async with prefetch_lock:
+        rows: list = await get_data_from_db(
+            cfg.NEW_TASKS_WITHOUT_STATEMENT_SQL_QUERY,
+            (last_prefetched_task_id, cfg.PREFETCH_LOCALE, cfg.PREFETCH_LIMIT)
+        )
+        if not rows or rows == [('False',)]:
+            return
 
-    return result
+        log.info(f'Предзагрузка условий {len(rows)} задач')
+        semaphore: asyncio.Semaphore = asyncio.Semaphore(
+            cfg.PREFETCH_CONCURRENCY)
 
+        async def prefetch(problem_key: str) -> None:
+            async with semaphore:
+                await get_task_statement(problem_key, cfg.PREFETCH_LOCALE)
+                await asyncio.sleep(cfg.PREFETCH_DELAY)
 
-async def check_exists(sql_query: str) -> bool:
-    result: list = await get_data_from_db(f"SELECT EXISTS({sql_query})")
-    return True if bool(result[0][0]) else False
+        await asyncio.gather(
+            *(prefetch(problem_key) for _, problem_key in rows))
+        last_prefetched_task_id = max(task_id for task_id, _ in rows)
 
 
 @dp.message_handler(commands=['help'])
 async def get_some_help(message: types.Message):
-    await message.answer("""
+    await sender.answer(message, """
 Уточнения:\n
 1)"0" среди рейтингов означает что у этой задачи рейтинг не задан.
 2)Телеграм автора @Imwisagist
@@ -186,111 +627,267 @@ async def get_some_help(message: types.Message):
 
 @dp.message_handler(commands=['tags'])
 async def print_tags(message: types.Message):
-    await message.answer(', '.join(await get_unique_tags_or_ratings('tag')))
+    await sender.answer_many(
+        message, [', '.join(await get_unique_tags_or_ratings('tag'))])
 
 
 @dp.message_handler(commands=['ratings'])
 async def print_ratings_for_tag(message: types.Message):
     data: list = message.text.split()
     if len(data) != 2:
-        return await message.answer('Неверное количество аргументов')
+        return await sender.answer(message, 'Неверное количество аргументов')
 
     tag: str = data[-1]
     if tag not in await get_unique_tags_or_ratings('tag'):
-        return await message.answer('Неизвестная тема')
+        return await sender.answer(message, 'Неизвестная тема')
+
+    await sender.answer_many(message, [', '.join(map(
+        str, await get_unique_tags_or_ratings('rating', tag)))])
+
+
+def page_keyboard(
+        callback_data: CallbackData, prev_cursor: int, next_cursor: int,
+        **fields) -> types.InlineKeyboardMarkup:
+    """Кнопки соседних страниц, None вместо курсора - кнопки нет."""
+    buttons: list = []
+    if prev_cursor is not None:
+        buttons.append(types.InlineKeyboardButton(
+            '« Назад', callback_data=callback_data.new(
+                direction='prev', cursor=prev_cursor, **fields)))
+    if next_cursor is not None:
+        buttons.append(types.InlineKeyboardButton(
+            'Далее »', callback_data=callback_data.new(
+                direction='next', cursor=next_cursor, **fields)))
+    return types.InlineKeyboardMarkup().row(*buttons) if buttons else None
+
+
+def split_page(rows: list, page_size: int, direction: str) -> tuple:
+    """Страница в порядке показа и признаки соседних страниц.
+
+    Строки выбраны с запасом в одну; при движении назад они идут от
+    курсора в обратную сторону и разворачиваются.
+    """
+    page: list = rows[:page_size]
+    has_more: bool = len(rows) > page_size
+    if direction == 'prev':
+        return page[::-1], has_more, True
+    return page, direction == 'next', has_more
+
+
+def render_contest_tasks(rows: list) -> list:
+    return ["""
+Идентификатор задачи- {}
+Темы - ({})
+Решено раз - {}
+Название - "{}"
+Номер и индекс - {}
+Сложность - {}
+""".format(*task[:6]) for task in rows]
+
+
+def render_contests(rows: list) -> list:
+    return ["""
+Идентификатор - {}
+Номер контеста - {}
+Тема - {}
+Сложность - {}
+""".format(*contest) for contest in rows]
+
+
+async def get_contest_tasks_page(
+        contest_id: int, direction: str, cursor: int) -> tuple:
+    sql_query: str = cfg.CONTEST_TASKS_PREV_PAGE_SQL_QUERY \
+        if direction == 'prev' else cfg.CONTEST_TASKS_NEXT_PAGE_SQL_QUERY
+    params: tuple = (contest_id, cursor, cfg.CONTEST_TASKS_PAGE_SIZE + 1)
+    rows: list = from_snapshot(sql_query, params)
+    if rows is None:
+        metrics.inc('bot_view_reads_total', source='db')
+        rows = await get_data_from_db(sql_query, params)
+    else:
+        metrics.inc('bot_view_reads_total', source='snapshot')
+    if not rows or rows == [('False',)]:
+        return [], None
+    page, has_prev, has_next = split_page(
+        rows, cfg.CONTEST_TASKS_PAGE_SIZE, direction)
+    return render_contest_tasks(page), page_keyboard(
+        contest_page,
+        page[0][-1] if has_prev else None,
+        page[-1][-1] if has_next else None,
+        contest_id=contest_id,
+    )
+
 
-    source: list = await get_data_from_db(
-        f"SELECT DISTINCT rating FROM contests WHERE tag='{tag}'"
+async def get_contests_page(rows: list, direction: str) -> tuple:
+    if not rows or rows == [('False',)]:
+        return [], None
+    page, has_prev, has_next = split_page(
+        rows, cfg.CONTESTS_PAGE_SIZE, direction)
+    # Контесты идут по убыванию id, «назад» - к большим id
+    return render_contests(page), page_keyboard(
+        contests_page,
+        page[0][0] if has_prev else None,
+        page[-1][0] if has_next else None,
     )
-    await message.answer(', '.join(map(
-        str, sorted(await parse_db_response(source)))))
 
 
 @dp.message_handler(commands=['contest'])
 async def print_tasks_from_define_contest(message: types.Message):
     if len(message.text.split()) != 2:
-        return await message.answer('Напишите один идентификатор контеста')
+        return await sender.answer(
+            message, 'Напишите один идентификатор контеста')
     try:
         contest_id = int(message.text.split()[-1])
     except Exception:
-        return await message.answer('Идентификатор должен быть целым числом')
+        return await sender.answer(
+            message, 'Идентификатор должен быть целым числом')
 
-    sql_query: str = f"SELECT tasks from contests Where id={contest_id}"
-    if not await check_exists(sql_query):
-        return await message.answer('Контест не найден')
+    items, keyboard = await get_contest_tasks_page(contest_id, 'first', 0)
+    if not items:
+        return await sender.answer(message, 'Контест не найден')
 
-    contest = await get_data_from_db(sql_query)
-    [await message.answer("""
-Идентификатор задачи- {}
-Темы - ({})
-Решено раз - {}
-Название - "{}"
-Номер и индекс - {}
-Сложность - {}
-""".format(*task)) for task in await parse_contest(contest)]
+    await sender.answer_many(message, items, reply_markup=keyboard)
+
+
+@dp.callback_query_handler(contest_page.filter())
+async def turn_contest_page(query: types.CallbackQuery, callback_data: dict):
+    items, keyboard = await get_contest_tasks_page(
+        int(callback_data['contest_id']), callback_data['direction'],
+        int(callback_data['cursor'])
+    )
+    await turn_page(query, items, keyboard)
 
 
 @dp.message_handler(commands=['contests'])
 async def print_contests_for_tag_and_rating(message: types.Message):
     data: list = message.text.split()
     if len(data) != 3:
-        return await message.answer('Неверное количество аргументов')
+        return await sender.answer(message, 'Неверное количество аргументов')
     tag, rating = data[1:]
 
     try:
         rating = int(rating)
     except Exception:
-        return await message.answer('Сложность должна быть целым числом')
+        return await sender.answer(
+            message, 'Сложность должна быть целым числом')
 
     if not isinstance(tag, str):
-        return await message.answer('Тема должна быть строкой')
+        return await sender.answer(message, 'Тема должна быть строкой')
 
     tags: list = await get_unique_tags_or_ratings('tag')
     ratings: list = await get_unique_tags_or_ratings('rating', tag)
     if (tag not in tags) or (rating not in ratings):
-        return await message.answer('Неизвестная пара тема/сложность')
+        return await sender.answer(message, 'Неизвестная пара тема/сложность')
 
-    response: list = await get_data_from_db(
-        f"""
-        SELECT id, number, tag, rating from contests
-        WHERE tag='{tag}' and rating='{rating}'
-        """
+    items, keyboard = await get_contests_page(
+        await get_cached_data_from_db(
+            cfg.CONTESTS_PAGE_SQL_QUERY,
+            (tag, rating, cfg.FIRST_PAGE_CURSOR, cfg.CONTESTS_PAGE_SIZE + 1)
+        ), 'first'
+    )
+    if not items:
+        return await sender.answer(message, 'Контесты не найдены')
+
+    await sender.answer_many(message, items, reply_markup=keyboard)
+
+
+@dp.callback_query_handler(contests_page.filter())
+async def turn_contests_page(query: types.CallbackQuery, callback_data: dict):
+    direction: str = callback_data['direction']
+    cursor: int = int(callback_data['cursor'])
+    sql_query: str = cfg.CONTESTS_PREV_PAGE_SQL_QUERY \
+        if direction == 'prev' else cfg.CONTESTS_NEXT_PAGE_SQL_QUERY
+    items, keyboard = await get_contests_page(
+        await get_cached_data_from_db(
+            sql_query, (cursor, cursor, cfg.CONTESTS_PAGE_SIZE + 1)),
+        direction
+    )
+    await turn_page(query, items, keyboard)
+
+
+async def turn_page(
+        query: types.CallbackQuery, items: list,
+        keyboard: types.InlineKeyboardMarkup) -> None:
+    if not items:
+        return await query.answer('Страница больше недоступна')
+
+    await query.answer()
+    await sender.send(
+        query.message.chat.id, query.message.edit_text,
+        pack_messages(items)[0], reply_markup=keyboard
     )
-    for contest in response[::-1]:
-        await message.answer("""
-Идентификатор - {}
-Номер контеста - {}
-Тема - {}
-Сложность - {}""".format(*contest))
 
 
 @dp.message_handler(commands=['task'])
 async def print_task_description(message: types.Message):
     data = message.text.split()
     if len(data) != 2:
-        return await message.answer('Неверное количество аргументов')
+        return await sender.answer(message, 'Неверное количество аргументов')
     try:
         task_id = int(message.text.split()[1])
     except Exception:
-        return await message.answer('Неверный тип данных')
+        return await sender.answer(message, 'Неверный тип данных')
 
-    sql_query: str = f"SELECT name_and_number FROM tasks WHERE id={task_id}"
-    if not await check_exists(sql_query):
-        return await message.answer('Задача с таким ID не найдена')
+    rows: list = await get_data_from_db(
+        cfg.TASK_PROBLEM_KEY_SQL_QUERY, (task_id,))
+    if not rows or rows == [('False',)]:
+        return await sender.answer(message, 'Задача с таким ID не найдена')
 
-    name_number_index: list = await get_data_from_db(sql_query)
+    await sender.answer_many(message, [await get_task_statement(rows[0][0])])
 
-    num, idx = name_number_index[-1][-1][-1].split('/')
-    await message.answer(
-        await get_task_descriptions(
-            f"https://codeforces.com/problemset/problem/{num}/{idx}?locale=ru")
-    )
+
+async def get_subscription_tag(message: types.Message) -> str:
+    """Тема из команды или None, если ответ об ошибке уже отправлен."""
+    data: list = message.text.split()
+    if len(data) != 2:
+        await sender.answer(message, 'Неверное количество аргументов')
+        return None
+
+    tag: str = data[-1]
+    if tag not in await get_unique_tags_or_ratings('tag'):
+        await sender.answer(message, 'Неизвестная тема')
+        return None
+    return tag
+
+
+@dp.message_handler(commands=['subscribe'])
+async def subscribe_to_tag(message: types.Message):
+    tag: str = await get_subscription_tag(message)
+    if tag is None:
+        return
+    if not await send_data_to_db(
+            cfg.SUBSCRIBE_SQL_QUERY, (message.chat.id, tag)):
+        return await sender.answer(message, 'Не удалось оформить подписку')
+    await sender.answer(
+        message, f'Вы будете получать новые задачи по теме {tag}')
+
+
+@dp.message_handler(commands=['unsubscribe'])
+async def unsubscribe_from_tag(message: types.Message):
+    tag: str = await get_subscription_tag(message)
+    if tag is None:
+        return
+    if not await send_data_to_db(
+            cfg.UNSUBSCRIBE_SQL_QUERY, (message.chat.id, tag)):
+        return await sender.answer(message, 'Не удалось отменить подписку')
+    await sender.answer(message, f'Подписка на тему {tag} отменена')
+
+
+@dp.message_handler(commands=['subscriptions'])
+async def print_subscriptions(message: types.Message):
+    rows: list = await get_data_from_db(
+        cfg.CHAT_SUBSCRIPTIONS_SQL_QUERY, (message.chat.id,))
+    if rows == [('False',)]:
+        return await sender.answer(message, 'Не удалось получить подписки')
+    if not rows:
+        return await sender.answer(message, 'Подписок нет')
+    await sender.answer_many(
+        message, [', '.join(await parse_db_response(rows))])
 
 
 @dp.message_handler(commands=['start'])
 async def begin_info(message: types.Message):
-    log.info(f'{message.chat.full_name} - {message.chat.mention}')
-    await message.answer("""
+    calls_log.info(f'{message.chat.full_name} - {message.chat.mention}')
+    await sender.answer(message, """
 Список доступных команд:\n
 Уточнения некоторых моментов: /help
 Получить все доступные темы контестов: /tags
@@ -298,16 +895,23 @@ async def begin_info(message: types.Message):
 Получить контесты по теме и сложности: /contests tag rating
 Получить задачи из контеста: /contest id_contest
 Получить описание задачи: /task task_id
+Подписаться на новые задачи темы: /subscribe tag
+Отменить подписку: /unsubscribe tag
+Список подписок: /subscriptions
 """)
 
 
 @dp.message_handler()
 async def unknown_command(message: types.Message):
-    await message.answer(
+    await sender.answer(
+        message,
         'Привет, отправь команду /start чтобы узнать доступные команды!=)'
     )
 
 
 if __name__ == '__main__':
     log = cfg.get_logger('bot', 'bot_log')
-    executor.start_polling(dp, skip_updates=True)
+    executor.start_polling(
+        dp, skip_updates=True,
+        on_startup=on_startup, on_shutdown=on_shutdown,
+    )
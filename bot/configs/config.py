@@ -8,15 +8,206 @@ from dotenv import load_dotenv
 
 load_dotenv()
 TELEGRAM_TOKEN: str = os.getenv('TELEGRAM_TOKEN')
-USER = DB_NAME = PASSWORD = 'postgres'
-HOST: str = 'db'   # localhost для локального запуска db для докера
-PORT: int = 5432
+# VERBOSE=0 для рабочего запуска: без сообщений о каждом вызове.
+# Метрики отдаются на http://METRICS_HOST:METRICS_PORT/metrics,
+# METRICS_PORT=0 - сервер метрик не запускается
+VERBOSE: bool = os.getenv('VERBOSE', '1') != '0'
+METRICS_HOST: str = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT: int = int(os.getenv('METRICS_PORT', 9102))
+USER = PASSWORD = 'postgres'
+DB_NAME: str = os.getenv('DB_NAME', 'postgres')
+# localhost для локального запуска db для докера
+HOST: str = os.getenv('DB_HOST', 'db')
+PORT: int = int(os.getenv('DB_PORT', 5432))
 
 # For Windows
 # asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-DSN: str = f'dbname={DB_NAME} user={USER} password={PASSWORD} host={HOST}'
-REGEX: str = r"[^a-zA-Zа-яА-Я0-9, ]+"
+DSN: str = (
+    f'dbname={DB_NAME} user={USER} password={PASSWORD} host={HOST} '
+    f'port={PORT}'
+)
+DB_POOL_MIN_SIZE: int = 1
+DB_POOL_MAX_SIZE: int = 10
+DB_TIMEOUT: float = 60.0   # секунд на выполнение запроса
+DB_ACQUIRE_TIMEOUT: float = 5.0   # секунд ожидания свободного соединения
+CACHE_MAX_SIZE: int = 1024
+CACHE_TTL: float = 3600.0
+# Каналы NOTIFY парсера: новые или изменённые задачи и обновление
+# контестов. Данные - JSON с номером версии из последовательности
+# data_version
+TASKS_CHANNEL: str = 'tasks_updated'
+CONTESTS_CHANNEL: str = 'contests_rebuilt'
+# Парсер записал снимок представлений; данные - {"version": ...}
+SNAPSHOT_CHANNEL: str = 'snapshot_written'
+LISTEN_RECONNECT_DELAY: int = 5
+# Снимок, который пишет парсер. Если путь задан, /tags, /ratings,
+# /contests и /contest отвечают из памяти без запросов к БД
+SNAPSHOT_PATH: str = os.getenv('SNAPSHOT_PATH', '')
+DATA_VERSION_SQL_QUERY: str = """
+SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM data_version;
+"""
+
+# Ограничения Telegram на отправку: около 30 сообщений в секунду всего и
+# одно сообщение в секунду в один чат с небольшим запасом
+MESSAGE_MAX_LENGTH: int = 4096
+EMPTY_ANSWER_TEXT: str = 'Ничего не найдено'   # ответ без единого текста
+SEND_GLOBAL_RATE: float = 30.0
+SEND_GLOBAL_BURST: int = 30
+SEND_CHAT_RATE: float = 1.0
+SEND_CHAT_BURST: int = 3
+SEND_CHATS_MAX: int = 10000   # чатов, для которых хранится состояние
+SEND_RETRY_ATTEMPTS: int = 3   # повторов после RetryAfter
+
+STATEMENTS_CACHE_SIZE: int = 256
+STATEMENT_MAX_AGE: int = 7 * 24 * 3600   # секунд до перезапроса условия
+PREFETCH_LIMIT: int = 200   # условий за одно обновление контестов
+PREFETCH_CONCURRENCY: int = 2
+PREFETCH_DELAY: float = 1.0   # пауза между запросами к Codeforces
+PREFETCH_LOCALE: str = 'ru'   # язык условий, которые /task отдаёт сразу
+STATEMENTS_TABLE_MAKE_SQL_QUERY: str = """
+CREATE TABLE IF NOT EXISTS statements(problem_key varchar(32) NOT NULL,
+locale varchar(8) NOT NULL, statement text NOT NULL,
+fetched_at timestamptz NOT NULL DEFAULT now(),
+PRIMARY KEY (problem_key, locale));
+"""
+GET_STATEMENT_SQL_QUERY: str = """
+SELECT statement, fetched_at > now() - make_interval(secs => %s)
+FROM statements WHERE problem_key = %s AND locale = %s;
+"""
+SAVE_STATEMENT_SQL_QUERY: str = """
+INSERT INTO statements (problem_key, locale, statement) VALUES (%s, %s, %s)
+ON CONFLICT (problem_key, locale)
+DO UPDATE SET statement = EXCLUDED.statement, fetched_at = now();
+"""
+NEW_TASKS_WITHOUT_STATEMENT_SQL_QUERY: str = """
+SELECT id, name_and_number[2] FROM tasks
+WHERE id > %s AND NOT EXISTS (
+    SELECT 1 FROM statements
+    WHERE problem_key = tasks.name_and_number[2] AND locale = %s
+)
+ORDER BY id LIMIT %s;
+"""
+# Пакетная загрузка условий (scrape_statements.py): страницы качаются
+# параллельно, разбираются в пуле процессов. Номер последней
+# обработанной пачки хранится в SCRAPE_PROGRESS_PATH, и прерванный
+# запуск продолжается с неё
+SCRAPE_CONCURRENCY: int = 4
+SCRAPE_DELAY: float = 0.5   # пауза после запроса к Codeforces
+SCRAPE_WORKERS: int = os.cpu_count() or 1
+SCRAPE_BATCH_SIZE: int = 500
+SCRAPE_TIMEOUT: float = 30.0   # секунд на загрузку страницы
+SCRAPE_PROGRESS_PATH: str = ''.join(
+    (os.path.dirname(os.getcwd()), '/cache/scrape_progress.json'))
+SCRAPE_TASKS_SQL_QUERY: str = """
+SELECT id, name_and_number[2] FROM tasks WHERE id > %s ORDER BY id LIMIT %s;
+"""
+SCRAPE_MISSING_TASKS_SQL_QUERY: str = """
+SELECT id, name_and_number[2] FROM tasks
+WHERE id > %s AND NOT EXISTS (
+    SELECT 1 FROM statements
+    WHERE problem_key = tasks.name_and_number[2] AND locale = %s
+)
+ORDER BY id LIMIT %s;
+"""
+# Страницы выбираются по курсору (id контеста или позиции задачи) с
+# запасом в одну строку, чтобы узнать, есть ли следующая страница.
+# Текст страницы должен помещаться в одно сообщение
+CONTESTS_PAGE_SIZE: int = 20
+CONTEST_TASKS_PAGE_SIZE: int = 10
+FIRST_PAGE_CURSOR: int = 2 ** 31 - 1
+CONTESTS_PAGE_SQL_QUERY: str = """
+SELECT id, number, tag, rating FROM contests
+WHERE tag = %s AND rating = %s AND id < %s ORDER BY id DESC LIMIT %s;
+"""
+# Тема и сложность берутся из контеста-курсора, поэтому в кнопке
+# хватает его id
+CONTESTS_NEXT_PAGE_SQL_QUERY: str = """
+SELECT id, number, tag, rating FROM contests
+WHERE (tag, rating) = (SELECT tag, rating FROM contests WHERE id = %s)
+AND id < %s ORDER BY id DESC LIMIT %s;
+"""
+CONTESTS_PREV_PAGE_SQL_QUERY: str = """
+SELECT id, number, tag, rating FROM contests
+WHERE (tag, rating) = (SELECT tag, rating FROM contests WHERE id = %s)
+AND id > %s ORDER BY id LIMIT %s;
+"""
+CONTEST_TASKS_NEXT_PAGE_SQL_QUERY: str = """
+SELECT tasks.id, array_to_string(tasks.tags, ', '), tasks.count_solved,
+tasks.name_and_number[1], tasks.name_and_number[2], tasks.rating,
+contest_tasks.position
+FROM contest_tasks JOIN tasks ON tasks.id = contest_tasks.task_id
+WHERE contest_tasks.contest_id = %s AND contest_tasks.position > %s
+ORDER BY contest_tasks.position LIMIT %s;
+"""
+CONTEST_TASKS_PREV_PAGE_SQL_QUERY: str = """
+SELECT tasks.id, array_to_string(tasks.tags, ', '), tasks.count_solved,
+tasks.name_and_number[1], tasks.name_and_number[2], tasks.rating,
+contest_tasks.position
+FROM contest_tasks JOIN tasks ON tasks.id = contest_tasks.task_id
+WHERE contest_tasks.contest_id = %s AND contest_tasks.position < %s
+ORDER BY contest_tasks.position DESC LIMIT %s;
+"""
+# Только пары тема/сложность, для которых есть контесты: по tag_stats
+# бот предлагал бы пары, задачи которых разобраны контестами других тем.
+# Запросы обслуживает индекс contests (tag, rating, id)
+TAGS_SQL_QUERY: str = 'SELECT DISTINCT tag FROM contests ORDER BY tag;'
+RATINGS_FOR_TAG_SQL_QUERY: str = """
+SELECT DISTINCT rating FROM contests WHERE tag = %s ORDER BY rating;
+"""
+TASK_PROBLEM_KEY_SQL_QUERY: str = """
+SELECT name_and_number[2] FROM tasks WHERE id = %s;
+"""
+LAST_TASK_ID_SQL_QUERY: str = 'SELECT COALESCE(max(id), 0) FROM tasks;'
+# Подписки чатов на новые задачи по темам
+ALERT_TASKS_LIMIT: int = 5   # задач темы в одном оповещении
+SUBSCRIPTIONS_TABLE_MAKE_SQL_QUERY: str = """
+CREATE TABLE IF NOT EXISTS subscriptions(chat_id bigint NOT NULL,
+tag varchar(255) NOT NULL, PRIMARY KEY (chat_id, tag));
+"""
+SUBSCRIBE_SQL_QUERY: str = """
+INSERT INTO subscriptions (chat_id, tag) VALUES (%s, %s)
+ON CONFLICT DO NOTHING;
+"""
+UNSUBSCRIBE_SQL_QUERY: str = """
+DELETE FROM subscriptions WHERE chat_id = %s AND tag = %s;
+"""
+UNSUBSCRIBE_CHAT_SQL_QUERY: str = """
+DELETE FROM subscriptions WHERE chat_id = %s;
+"""
+CHAT_SUBSCRIPTIONS_SQL_QUERY: str = """
+SELECT tag FROM subscriptions WHERE chat_id = %s ORDER BY tag;
+"""
+# Новые задачи в темах подписок, id в (%s, %s]
+SUBSCRIBED_NEW_TASKS_SQL_QUERY: str = """
+SELECT subscriptions.chat_id, subscriptions.tag, tasks.id,
+tasks.name_and_number[1], tasks.rating
+FROM subscriptions JOIN tasks
+ON tasks.tags @> ARRAY[subscriptions.tag]::varchar(255)[]
+WHERE tasks.id > %s AND tasks.id <= %s
+ORDER BY subscriptions.chat_id, subscriptions.tag, tasks.id;
+"""
+# Запросы, которые выполняются как подготовленные (PREPARE/EXECUTE)
+PREPARED_QUERIES: dict = {
+    'tags': TAGS_SQL_QUERY,
+    'ratings_for_tag': RATINGS_FOR_TAG_SQL_QUERY,
+    'contests_page': CONTESTS_PAGE_SQL_QUERY,
+    'contests_next_page': CONTESTS_NEXT_PAGE_SQL_QUERY,
+    'contests_prev_page': CONTESTS_PREV_PAGE_SQL_QUERY,
+    'contest_tasks_next_page': CONTEST_TASKS_NEXT_PAGE_SQL_QUERY,
+    'contest_tasks_prev_page': CONTEST_TASKS_PREV_PAGE_SQL_QUERY,
+    'task_problem_key': TASK_PROBLEM_KEY_SQL_QUERY,
+    'get_statement': GET_STATEMENT_SQL_QUERY,
+    'save_statement': SAVE_STATEMENT_SQL_QUERY,
+    'new_tasks_without_statement': NEW_TASKS_WITHOUT_STATEMENT_SQL_QUERY,
+    'last_task_id': LAST_TASK_ID_SQL_QUERY,
+    'subscribe': SUBSCRIBE_SQL_QUERY,
+    'unsubscribe': UNSUBSCRIBE_SQL_QUERY,
+    'chat_subscriptions': CHAT_SUBSCRIPTIONS_SQL_QUERY,
+    'subscribed_new_tasks': SUBSCRIBED_NEW_TASKS_SQL_QUERY,
+}
+CODEFORCES_URL: str = os.getenv('CODEFORCES_URL', 'https://codeforces.com')
 SEP: str = '--'*25
+HTML_PARSER: str = 'lxml'
 
 
 def get_logger(logger_name: str, logfile_name: str) -> Logger:
@@ -24,6 +215,10 @@ def get_logger(logger_name: str, logfile_name: str) -> Logger:
     logger: Logger = logging.getLogger(logger_name)
 
     logger.setLevel(logging.INFO)
+    # Сообщения о каждом вызове на частых путях идут в дочерний логгер
+    # {logger_name}.calls и при VERBOSE=0 отключаются
+    logging.getLogger(f'{logger_name}.calls').setLevel(
+        logging.INFO if VERBOSE else logging.WARNING)
 
     stream_handler = logging.StreamHandler(sys.stdout)
     stream_formatter = logging.Formatter(
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+
+import aiopg
+
+import configs.config as cfg
+from metrics import metrics
+from prepared_queries import PreparedQueries
+
+pool: aiopg.Pool = None
+queries: PreparedQueries = PreparedQueries(cfg.PREPARED_QUERIES)
+# Дочерний логгер бота; скрипты без бота подставляют свой
+log: logging.Logger = logging.getLogger('bot.db')
+
+
+async def create_db_pool(dispatcher=None) -> None:
+    global pool
+    log.info('Создание пула соединений с PostgreSQL')
+    pool = await aiopg.create_pool(
+        cfg.DSN, minsize=cfg.DB_POOL_MIN_SIZE, maxsize=cfg.DB_POOL_MAX_SIZE,
+        timeout=cfg.DB_TIMEOUT,
+    )
+
+
+async def close_db_pool(dispatcher=None) -> None:
+    log.info('Закрытие пула соединений с PostgreSQL')
+    pool.close()
+    await pool.wait_closed()
+
+
+async def execute_query(
+        cursor: aiopg.Cursor, sql_query: str, params: tuple,
+        fetch: bool) -> list:
+    """Запрос из cfg.PREPARED_QUERIES выполняется как подготовленный."""
+    name: str = queries.find(sql_query)
+    with metrics.timer('bot_db_query_seconds', query=name or 'other'):
+        if name:
+            return await queries.execute(cursor, name, params, fetch)
+        await cursor.execute(sql_query, params)
+        return await cursor.fetchall() if fetch else None
+
+
+async def get_data_from_db(sql_query: str, params: tuple = None) -> list:
+    try:
+        connection: aiopg.Connection = await asyncio.wait_for(
+            pool.acquire(), cfg.DB_ACQUIRE_TIMEOUT)
+        try:
+            async with connection.cursor() as cursor:
+                data = await execute_query(cursor, sql_query, params, True)
+        finally:
+            await pool.release(connection)
+    except Exception as _error:
+        message: str = 'Не удалось получить данные из БД'
+        log.critical(f'{message}: {_error}', exc_info=True)
+        return [('False',)]
+
+    return data
+
+
+async def send_data_to_db(sql_query: str, params: tuple = None) -> bool:
+    try:
+        connection: aiopg.Connection = await asyncio.wait_for(
+            pool.acquire(), cfg.DB_ACQUIRE_TIMEOUT)
+        try:
+            async with connection.cursor() as cursor:
+                await execute_query(cursor, sql_query, params, False)
+        finally:
+            await pool.release(connection)
+    except Exception as _error:
+        message: str = 'Не удалось записать данные в БД'
+        log.critical(f'{message}: {_error}', exc_info=True)
+        return False
+
+    return True
@@ -0,0 +1,210 @@
+"""Пакетная загрузка условий задач в таблицу statements.
+
+Запуск из папки bot:
+    python scrape_statements.py [--rescrape] [--locale ru]
+        [--concurrency N] [--workers N] [--delay S] [--batch N]
+
+Без --rescrape загружаются условия задач, которых нет в таблице на
+этом языке (прогрев), с --rescrape - всех задач, например после
+изменения вёрстки Codeforces. Страницы качаются параллельно, не больше
+concurrency одновременно, а разбираются в пуле из workers процессов, не
+занимая цикл событий; workers 0 - разбор в цикле событий. Каждое условие
+записывается сразу после разбора. После каждой пачки номер её последней
+задачи сохраняется в cfg.SCRAPE_PROGRESS_PATH, и прерванный запуск с
+теми же режимом и языком продолжается со следующей пачки. В конце и
+после каждой пачки выводится скорость загрузки.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import aiohttp
+
+import configs.config as cfg
+import database
+from statements import get_task_descriptions, get_task_url
+
+log: logging.Logger = logging.getLogger('scraper')
+
+
+class ScrapeStats:
+    """Счётчики запуска и время загрузки и разбора страниц."""
+
+    def __init__(self) -> None:
+        self.started: float = time.perf_counter()
+        self.finished: float = None
+        self.saved: int = 0
+        self.failed: int = 0
+        self.downloaded: int = 0
+        self.fetch_seconds: float = 0.0
+        self.parse_seconds: float = 0.0
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    def report(self) -> str:
+        elapsed: float = (self.finished or time.perf_counter()) - self.started
+        done: int = self.saved + self.failed
+        return (
+            f'Сохранено {self.saved}, ошибок {self.failed} за {elapsed:.1f} с'
+            f' ({self.saved / elapsed:.1f} условий/с), загружено '
+            f'{self.downloaded / 2 ** 20:.1f} МБ; на страницу: загрузка '
+            f'{self.fetch_seconds / max(done, 1) * 1000:.0f} мс, разбор '
+            f'{self.parse_seconds / max(self.saved, 1) * 1000:.0f} мс'
+        )
+
+
+def parse_page(page: str, task_url: str) -> tuple:
+    """Условие и время разбора. Выполняется в процессе пула."""
+    started: float = time.perf_counter()
+    statement: str = get_task_descriptions(page, task_url)
+    return statement, time.perf_counter() - started
+
+
+def load_progress(path: str, mode: str, locale: str) -> int:
+    """id последней обработанной задачи прерванного запуска или 0."""
+    try:
+        with open(path, encoding='UTF-8') as file:
+            progress: dict = json.load(file)
+    except (OSError, ValueError):
+        return 0
+    if (progress.get('mode'), progress.get('locale')) != (mode, locale):
+        return 0
+    return progress.get('last_task_id', 0)
+
+
+def save_progress(path: str, mode: str, locale: str, task_id: int) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f'{path}.tmp', 'w', encoding='UTF-8') as file:
+        json.dump(
+            {'mode': mode, 'locale': locale, 'last_task_id': task_id}, file)
+    os.replace(f'{path}.tmp', path)
+
+
+async def scrape_batch(
+        rows: list, locale: str, session: aiohttp.ClientSession,
+        executor: Executor, save, stats: ScrapeStats,
+        concurrency: int, delay: float) -> None:
+    """Загрузка, разбор и запись условий задач rows (id, ключ задачи).
+
+    save - корутина (ключ задачи, язык, условие), возвращающая признак
+    успешной записи.
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+
+    async def scrape(problem_key: str) -> None:
+        task_url: str = get_task_url(problem_key, locale)
+        async with semaphore:
+            started: float = time.perf_counter()
+            try:
+                async with session.get(task_url) as response:
+                    response.raise_for_status()
+                    page: str = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as _error:
+                stats.failed += 1
+                log.warning(f'{task_url} не загружена: {_error!r}')
+                return
+            finally:
+                stats.fetch_seconds += time.perf_counter() - started
+                await asyncio.sleep(delay)
+        stats.downloaded += len(page.encode())
+
+        try:
+            if executor is None:
+                statement, seconds = parse_page(page, task_url)
+            else:
+                statement, seconds = await loop.run_in_executor(
+                    executor, parse_page, page, task_url)
+        except Exception as _error:
+            stats.failed += 1
+            log.warning(f'{task_url} не разобрана: {_error!r}')
+            return
+        stats.parse_seconds += seconds
+
+        if await save(problem_key, locale, statement):
+            stats.saved += 1
+        else:
+            stats.failed += 1
+
+    await asyncio.gather(*(scrape(problem_key) for _, problem_key in rows))
+
+
+async def save_statement(
+        problem_key: str, locale: str, statement: str) -> bool:
+    return await database.send_data_to_db(
+        cfg.SAVE_STATEMENT_SQL_QUERY, (problem_key, locale, statement))
+
+
+async def get_batch(rescrape: bool, locale: str, last_task_id: int,
+                    batch_size: int) -> list:
+    if rescrape:
+        rows: list = await database.get_data_from_db(
+            cfg.SCRAPE_TASKS_SQL_QUERY, (last_task_id, batch_size))
+    else:
+        rows = await database.get_data_from_db(
+            cfg.SCRAPE_MISSING_TASKS_SQL_QUERY,
+            (last_task_id, locale, batch_size)
+        )
+    if rows == [('False',)]:
+        raise RuntimeError('Не удалось получить задачи из БД')
+    return rows
+
+
+async def main(args: argparse.Namespace) -> None:
+    mode: str = 'rescrape' if args.rescrape else 'missing'
+    last_task_id: int = load_progress(
+        cfg.SCRAPE_PROGRESS_PATH, mode, args.locale)
+    if last_task_id:
+        log.info(f'Продолжение с задачи после id {last_task_id}')
+
+    await database.create_db_pool()
+    await database.send_data_to_db(cfg.STATEMENTS_TABLE_MAKE_SQL_QUERY)
+    executor: Executor = ProcessPoolExecutor(args.workers) \
+        if args.workers else None
+    stats: ScrapeStats = ScrapeStats()
+    try:
+        async with aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=args.concurrency),
+                timeout=aiohttp.ClientTimeout(total=cfg.SCRAPE_TIMEOUT)
+        ) as session:
+            while True:
+                rows: list = await get_batch(
+                    args.rescrape, args.locale, last_task_id, args.batch)
+                if not rows:
+                    break
+                await scrape_batch(
+                    rows, args.locale, session, executor, save_statement,
+                    stats, args.concurrency, args.delay
+                )
+                last_task_id = rows[-1][0]
+                save_progress(
+                    cfg.SCRAPE_PROGRESS_PATH, mode, args.locale, last_task_id)
+                log.info(f'До задачи {last_task_id}: {stats.report()}')
+        if os.path.exists(cfg.SCRAPE_PROGRESS_PATH):
+            os.remove(cfg.SCRAPE_PROGRESS_PATH)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        await database.close_db_pool()
+    stats.finish()
+    log.info(f'Загрузка завершена. {stats.report()}')
+
+
+if __name__ == '__main__':
+    arg_parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description='Пакетная загрузка условий задач')
+    arg_parser.add_argument('--rescrape', action='store_true')
+    arg_parser.add_argument('--locale', default='ru')
+    arg_parser.add_argument(
+        '--concurrency', type=int, default=cfg.SCRAPE_CONCURRENCY)
+    arg_parser.add_argument('--workers', type=int, default=cfg.SCRAPE_WORKERS)
+    arg_parser.add_argument('--delay', type=float, default=cfg.SCRAPE_DELAY)
+    arg_parser.add_argument(
+        '--batch', type=int, default=cfg.SCRAPE_BATCH_SIZE)
+    log = database.log = cfg.get_logger('scraper', 'scraper_log')
+    asyncio.run(main(arg_parser.parse_args()))
@@ -0,0 +1,116 @@
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+import configs.config as cfg
+
+
+class Statement:
+    """Условие задачи, разобранное за один проход по .problem-statement.
+
+    Разбирается только блок условия (SoupStrainer), остальная страница
+    в дерево не попадает. Примечание (note) сохраняется, но, как и раньше,
+    не выводится.
+    """
+    HEADER_FIELDS: tuple = (
+        'time-limit', 'memory-limit', 'input-file', 'output-file')
+
+    def __init__(self, page: str) -> None:
+        self.title: str = ''
+        self.header: dict = {}
+        self.legend: str = ''
+        self.input_specification: str = ''
+        self.output_specification: str = ''
+        self.samples_title: str = ''
+        self.samples: list = []
+        self.note: str = ''
+        self.__parse(page)
+
+    @staticmethod
+    def __section(section: Tag) -> str:
+        title = section.find('div', {'class': 'section-title'})
+        return title.text.strip() + f"\n{cfg.SEP}\n" + \
+            title.next_sibling.text.strip()
+
+    @staticmethod
+    def __sample(data: Tag) -> tuple:
+        title = data.find('div', {'class': 'title'})
+        value = str(title.next_sibling).replace('<br/>', '\n')[5:-6].rstrip()
+        return title.text.strip(), value
+
+    def __parse(self, page: str) -> None:
+        soup: BeautifulSoup = BeautifulSoup(
+            page, cfg.HTML_PARSER,
+            parse_only=SoupStrainer('div', {'class': 'problem-statement'})
+        )
+        statement = soup.find('div', {'class': 'problem-statement'})
+        previous = None
+        for child in statement.children:
+            if previous is not None and 'header' in previous.get('class', ()):
+                self.legend = child.text.strip()
+            previous = child if isinstance(child, Tag) else None
+            if previous is None:
+                continue
+
+            classes: list = child.get('class', [])
+            if 'header' in classes:
+                self.__parse_header(child)
+            elif 'input-specification' in classes:
+                self.input_specification = self.__section(child)
+            elif 'output-specification' in classes:
+                self.output_specification = self.__section(child)
+            elif 'sample-tests' in classes:
+                self.__parse_samples(child)
+            elif 'note' in classes:
+                self.note = self.__section(child)
+
+    def __parse_header(self, header: Tag) -> None:
+        self.title = header.find('div', {'class': 'title'}).text.strip()
+        for field in header.find_all('div', {'class': self.HEADER_FIELDS}):
+            title = field.find('div', {'class': 'property-title'})
+            self.header[field['class'][0]] = \
+                title.text.strip() + ': ' + str(title.next_sibling)
+
+    def __parse_samples(self, sample_tests: Tag) -> None:
+        self.samples_title = sample_tests.find(
+            'div', {'class': 'section-title'}).text.strip()
+        inputs: list = sample_tests.find_all('div', {'class': 'input'})
+        outputs: list = sample_tests.find_all('div', {'class': 'output'})
+        self.samples = [
+            (self.__sample(input_), self.__sample(output))
+            for input_, output in zip(inputs, outputs)
+        ]
+
+    def render(self, task_url: str) -> str:
+        tests: str = ''
+        if self.samples:
+            tests = self.samples_title + f'\n{cfg.SEP}' + ''.join(
+                f"\n{title}\n{cfg.SEP}\n{value}\n{cfg.SEP}"
+                for sample in self.samples for title, value in sample
+            )
+
+        return f"""
+{self.title}\n{'--'*len(self.title)}
+{self.header.get('time-limit', '')}
+{self.header.get('memory-limit', '')}
+{cfg.SEP}
+{self.header.get('input-file', '')}
+{self.header.get('output-file', '')}
+{cfg.SEP}
+{self.legend}
+{cfg.SEP}
+{self.input_specification}
+{cfg.SEP}
+{self.output_specification}
+{cfg.SEP}
+{tests}
+{task_url}
+"""
+
+
+def get_task_url(problem_key: str, locale: str) -> str:
+    num, idx = problem_key.split('/')
+    return f"{cfg.CODEFORCES_URL}/problemset/problem/{num}/{idx}" \
+           f"?locale={locale}"
+
+
+def get_task_descriptions(page: str, task_url: str) -> str:
+    return Statement(page).render(task_url)
@@ -0,0 +1,98 @@
+"""Сравнение времени построения контестов на фикстуре из 10k задач.
+
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.bench_contests [количество задач]
+
+Прежний алгоритм эмулируется в памяти: на каждую пару тема/сложность
+выполняется полный проход по задачам с фильтром по уже выданным id,
+как это делал запрос SELECT ... AND id not in (...) LIMIT 10.
+Эмуляция не учитывает сетевые задержки и планирование запросов,
+поэтому реальный выигрыш на PostgreSQL больше.
+"""
+import logging
+import sys
+import time
+
+import codeforces_task_parser as parser
+import configs.config as cfg
+from benchmarks.fixtures import make_task_rows
+
+
+def legacy_unique_tags_and_rating(tasks: list) -> tuple:
+    unique_tags: list = []
+    unique_rating: list = []
+
+    for task in tasks:
+        for tag in task[1]:
+            if tag not in unique_tags:
+                unique_tags.append(tag)
+        if task[4] not in unique_rating:
+            unique_rating.append(task[4])
+
+    return sorted(unique_tags), sorted(unique_rating)
+
+
+def legacy_contests(
+        tasks: list, unique_tags: list, unique_rating: list) -> list:
+    tag_meet_frequency: dict = {}
+    for utag in unique_tags:
+        for task in tasks:
+            if utag in task[1]:
+                tag_meet_frequency[utag] = tag_meet_frequency.get(utag, 0) + 1
+    asc_sorted_tags: dict = {k: v for k, v in sorted(
+        tag_meet_frequency.items(), key=lambda item: item[1]
+    )}
+
+    contests: list = []
+    given_tasks_ids: set = set()
+    contest_num: int = 0
+    sorted_unique_tags_copy: list = list(asc_sorted_tags.keys())
+
+    while sorted_unique_tags_copy:
+        for utag in sorted_unique_tags_copy:
+            empty: bool = True
+            for urating in unique_rating:
+                data: list = []
+                for task in tasks:
+                    if (utag in task[1] and task[4] == urating
+                            and task[0] not in given_tasks_ids):
+                        data.append(task)
+                        if len(data) == cfg.CONTEST_SIZE:
+                            break
+                if data:
+                    empty = False
+                    for task in data:
+                        given_tasks_ids.add(task[0])
+                    contests.append((contest_num, utag, urating, data))
+            if empty:
+                sorted_unique_tags_copy.remove(utag)
+        contest_num += 1
+
+    return contests
+
+
+def main() -> None:
+    count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    parser.log = logging.getLogger('benchmark')
+    cfg.VERBOSE = False
+    tasks: list = make_task_rows(count)
+
+    started: float = time.perf_counter()
+    contests: list = parser.build_contests(
+        tasks, parser.get_tag_stats((task[1], task[4]) for task in tasks))
+    in_memory: float = time.perf_counter() - started
+
+    started = time.perf_counter()
+    expected: list = legacy_contests(
+        tasks, *legacy_unique_tags_and_rating(tasks))
+    legacy: float = time.perf_counter() - started
+
+    print(f'Задач: {len(tasks)}, контестов: {len(contests)}')
+    print(f'Прежний алгоритм: {legacy:.3f} с')
+    print(f'Индекс в памяти: {in_memory:.3f} с')
+    print(f'Ускорение: {legacy / in_memory:.1f}x')
+    print(f'Результаты совпадают: {contests == expected}')
+
+
+if __name__ == '__main__':
+    main()
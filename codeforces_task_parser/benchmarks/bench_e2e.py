@@ -0,0 +1,235 @@
+"""Сквозной замер парсера и бота без сети и рабочей базы.
+
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.bench_e2e [--tasks N] [--new-tasks N] [--repeats N]
+        [--recorded ответ.json] [--db-host хост --db-port порт]
+        [--save-baseline]
+
+Поднимаются временный PostgreSQL (benchmarks.local_postgres) или пустая
+база на внешнем сервере и заглушка API Codeforces на синтетической
+фикстуре либо записанном ответе problemset.problems. Замеряются:
+    - первое заполнение пустой базы задачами и контестами;
+    - подготовка заполненной базы (проверка таблиц, миграции, отпечатки
+      задач) и запись снимка;
+    - цикл без изменений ответа (p50, p95, p99);
+    - повторный разбор того же ответа без кэша;
+    - цикл с новыми задачами и полное перестроение контестов;
+    - команды бота через Dispatcher (benchmarks.bench_e2e бота).
+Результаты сравниваются с benchmarks/e2e_baseline.json: рост времени
+или памяти больше чем на TOLERANCE (падение для метрик *_per_s)
+считается регрессией, и программа завершается с кодом 1. Разница
+меньше ABSOLUTE_SLACK считается шумом, p99 не сравнивается: при 20
+повторах это одиночный выброс. Базовые значения лежат в репозитории
+и перезаписываются флагом --save-baseline на той же машине.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+import codeforces_task_parser as parser
+import configs.config as cfg
+from benchmarks.local_postgres import throwaway_database
+from benchmarks.stub_server import load_recorded, make_app
+from fetcher import CodeforcesFetcher
+
+BASELINE_PATH: str = os.path.join(
+    os.path.dirname(__file__), 'e2e_baseline.json')
+BOT_DIR: str = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '..', 'bot')
+TOLERANCE: float = 0.2
+# Метрики без единиц не сравниваются: это счётчики вызовов
+COMPARED_SUFFIXES: tuple = ('_ms', '_s', '_mb', '_per_s')
+# p99 при 20 повторах - это максимум, то есть одиночный выброс
+SKIPPED_SUFFIXES: tuple = ('.p99_ms',)
+# Разница меньше этих значений считается шумом машины, а не регрессией
+ABSOLUTE_SLACK: dict = {'_ms': 5.0, '_s': 0.05, '_mb': 5.0}
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(round(len(values) * share)) - 1)]
+
+
+async def start_api_stub(count: int, recorded: dict) -> tuple:
+    runner: web.AppRunner = web.AppRunner(
+        make_app(count, recorded=recorded), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', 0).start()
+    port: int = runner.addresses[0][1]
+    return runner, f'http://localhost:{port}/api'
+
+
+async def use_api_stub(count: int, recorded: dict) -> web.AppRunner:
+    """Заглушка с count задачами и клиент API, направленный на неё."""
+    runner, api_url = await start_api_stub(count, recorded)
+    if parser.fetcher:
+        await parser.fetcher.close()
+    parser.fetcher = CodeforcesFetcher(api_url, min_interval=0)
+    return runner
+
+
+async def timed(coroutine) -> tuple:
+    started: float = time.perf_counter()
+    result = await coroutine
+    return result, time.perf_counter() - started
+
+
+async def run_parser(args: argparse.Namespace, recorded: dict) -> dict:
+    results: dict = {}
+    total: int = len(recorded['problems']) if recorded else args.tasks
+    # Записанный ответ не делится на старые и новые задачи
+    initial: int = total if recorded else total - args.new_tasks
+    parser.pool = await parser.create_db_pool()
+    runner: web.AppRunner = await use_api_stub(initial, recorded)
+    try:
+        # Первое заполнение: таблицы создаются по ответу с initial задачами
+        _, elapsed = await timed(
+            parser.check_or_create_table(cfg.TABLES_MAKE_SQL_QUERIES))
+        results['parser.initial_fill_s'] = elapsed
+        results['parser.initial_fill_tasks_per_s'] = initial / elapsed
+        # Таблицы уже заполнены: остаются проверка таблиц, миграции и
+        # загрузка отпечатков
+        _, elapsed = await timed(parser.prepare_database())
+        results['parser.prepare_s'] = elapsed
+        _, elapsed = await timed(parser.write_snapshot())
+        results['parser.snapshot_s'] = elapsed
+
+        cache_meta: dict = parser.load_response_cache()
+        latencies: list = []
+        for _ in range(args.repeats):
+            (cache_meta, _), elapsed = await timed(
+                parser.run_cycle(cache_meta))
+            latencies.append(elapsed * 1000)
+        for share in (0.5, 0.95, 0.99):
+            results[f'parser.unchanged_cycle.p{int(share * 100)}_ms'] = \
+                percentile(latencies, share)
+
+        # Без метаданных ответ разбирается заново, но задачи не меняются
+        (cache_meta, _), elapsed = await timed(parser.run_cycle({}))
+        results['parser.reparse_cycle_s'] = elapsed
+
+        if args.new_tasks and not recorded:
+            await runner.cleanup()
+            runner = await use_api_stub(total, recorded)
+            (cache_meta, _), elapsed = await timed(
+                parser.run_cycle(cache_meta))
+            results['parser.new_tasks_cycle_s'] = elapsed
+
+        _, elapsed = await timed(parser.rebuild_contests())
+        results['parser.rebuild_contests_s'] = elapsed
+        await parser.write_snapshot()
+        results['parser.tasks'] = \
+            await parser.get_count_of_records_in_table('tasks')
+        results['parser.contests'] = \
+            await parser.get_count_of_records_in_table('contests')
+    finally:
+        await parser.fetcher.close()
+        await runner.cleanup()
+        parser.pool.close()
+        await parser.pool.wait_closed()
+    results['parser.peak_rss_mb'] = \
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def run_bot(args: argparse.Namespace) -> dict:
+    env: dict = dict(
+        os.environ, DB_HOST=cfg.HOST, DB_PORT=str(cfg.PORT),
+        DB_NAME=cfg.DB_NAME, SNAPSHOT_PATH=cfg.SNAPSHOT_PATH,
+        METRICS_PORT='0', VERBOSE='0',
+    )
+    completed: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_e2e', str(args.repeats)],
+        cwd=BOT_DIR, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        sys.exit(f'Замер бота завершился с ошибкой:\n{completed.stderr}')
+    return json.loads(
+        completed.stdout.strip().splitlines()[-1][len('E2E_RESULT '):])
+
+
+def find_regressions(results: dict, baseline: dict) -> list:
+    regressions: list = []
+    for name, expected in baseline.items():
+        if name not in results or not name.endswith(COMPARED_SUFFIXES) \
+                or name.endswith(SKIPPED_SUFFIXES):
+            continue
+        value: float = results[name]
+        if name.endswith('_per_s'):
+            regressed: bool = value < expected * (1 - TOLERANCE)
+        else:
+            slack: float = next(
+                amount for suffix, amount in ABSOLUTE_SLACK.items()
+                if name.endswith(suffix))
+            regressed = value > max(
+                expected * (1 + TOLERANCE), expected + slack)
+        if regressed:
+            regressions.append(
+                f'{name}: {value:.1f} при базовом {expected:.1f}')
+    return regressions
+
+
+def main() -> None:
+    arg_parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description='Сквозной замер парсера и бота')
+    arg_parser.add_argument('--tasks', type=int, default=10000)
+    arg_parser.add_argument('--new-tasks', type=int, default=100)
+    arg_parser.add_argument('--repeats', type=int, default=20)
+    arg_parser.add_argument(
+        '--recorded', help='записанный ответ problemset.problems')
+    arg_parser.add_argument('--db-host', help='внешний PostgreSQL')
+    arg_parser.add_argument('--db-port', type=int, default=5432)
+    arg_parser.add_argument('--save-baseline', action='store_true')
+    args: argparse.Namespace = arg_parser.parse_args()
+
+    recorded: dict = load_recorded(args.recorded) if args.recorded else None
+    parser.log = logging.getLogger('benchmark')
+    cfg.VERBOSE = False
+    cfg.METRICS_PORT = 0
+
+    with tempfile.TemporaryDirectory() as work_dir, throwaway_database(
+            args.db_host, args.db_port if args.db_host else None) as (
+            host, port, db_name):
+        cfg.HOST, cfg.PORT, cfg.DB_NAME = host, port, db_name
+        cfg.RESPONSE_CACHE_BODY_PATH = os.path.join(work_dir, 'body.json')
+        cfg.RESPONSE_CACHE_META_PATH = os.path.join(work_dir, 'meta.json')
+        cfg.EN_PROBLEMSET_PATH = os.path.join(work_dir, 'en', 'body.json')
+        cfg.SNAPSHOT_PATH = os.path.join(work_dir, 'snapshot.json')
+
+        results: dict = asyncio.run(run_parser(args, recorded))
+        results.update(run_bot(args))
+
+    for name, value in results.items():
+        print(f'{name}: {value:.1f}')
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w', encoding='UTF-8') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f'Базовые значения записаны в {BASELINE_PATH}')
+        return
+    if not os.path.exists(BASELINE_PATH):
+        sys.exit(
+            f'Базовых значений {BASELINE_PATH} нет: сравнивать не с чем, '
+            f'запишите их флагом --save-baseline'
+        )
+
+    with open(BASELINE_PATH, encoding='UTF-8') as file:
+        regressions: list = find_regressions(results, json.load(file))
+    if regressions:
+        print('Регрессии больше чем на {:.0%}:'.format(TOLERANCE))
+        print('\n'.join(f'  {line}' for line in regressions))
+        sys.exit(1)
+    print('Регрессий нет')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Проверка клиента API Codeforces на локальной заглушке.
+
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.bench_fetcher [количество задач]
+
+Заглушка поднимается в том же процессе на свободном порту и отвечает
+с задержкой LATENCY, как удалённый сервер. Сравниваются прежний вариант -
+новая сессия aiohttp на каждый запрос, запросы по очереди - и общая
+сессия с параллельным fetch_all без ограничения интервала. Затем проверяются
+повторы после ответов 503 и превышения лимита вызовов и интервал между
+запросами.
+"""
+import asyncio
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+import configs.custom_exceptions as custom_exceptions
+from benchmarks.stub_server import make_app
+from fetcher import CodeforcesFetcher
+
+LATENCY: float = 0.1
+CALLS: dict = {
+    'problems_ru': ('problemset.problems', {'lang': 'ru'}),
+    'problems_en': ('problemset.problems', {'lang': 'en'}),
+    'contests_ru': ('contest.list', {'lang': 'ru'}),
+    'contests_en': ('contest.list', {'lang': 'en'}),
+}
+
+
+async def start_stub(
+        count: int, failures: list = None, latency: float = 0.0) -> tuple:
+    app: web.Application = make_app(count, failures, latency)
+    runner: web.AppRunner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', 0).start()
+    port: int = runner.addresses[0][1]
+    return app, runner, f'http://localhost:{port}/api'
+
+
+async def legacy_fetch_all(api_url: str) -> dict:
+    results: dict = {}
+    for name, (method, params) in CALLS.items():
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                    f'{api_url}/{method}', params=params) as response:
+                results[name] = (await response.json())['result']
+    return results
+
+
+async def measure_fetching(count: int, repeats: int = 5) -> None:
+    app, runner, api_url = await start_stub(count, latency=LATENCY)
+    try:
+        started: float = time.perf_counter()
+        for _ in range(repeats):
+            expected: dict = await legacy_fetch_all(api_url)
+        legacy: float = (time.perf_counter() - started) / repeats
+
+        async with CodeforcesFetcher(api_url, min_interval=0) as fetcher:
+            started = time.perf_counter()
+            for _ in range(repeats):
+                results: dict = await fetcher.fetch_all(CALLS)
+            shared: float = (time.perf_counter() - started) / repeats
+    finally:
+        await runner.cleanup()
+
+    print(
+        f'Методов за цикл: {len(CALLS)}, задач: {count}, '
+        f'задержка ответа: {LATENCY * 1000:.0f} мс'
+    )
+    print(f'  сессия на запрос, по очереди: {legacy * 1000:.1f} мс')
+    print(f'  общая сессия, fetch_all: {shared * 1000:.1f} мс')
+    print(f'  ответы совпадают: {results == expected}')
+
+
+async def check_retries() -> bool:
+    app, runner, api_url = await start_stub(60, [503, 'limit', 502])
+    try:
+        async with CodeforcesFetcher(
+                api_url, min_interval=0, retry_delay=0.01) as fetcher:
+            contests: list = await fetcher.get_json(
+                'contest.list', {'lang': 'ru'})
+            retries: int = fetcher.retries_count
+
+        app['stats']['requests'] = 0
+        async with CodeforcesFetcher(
+                api_url, min_interval=0, attempts=2,
+                retry_delay=0.01) as fetcher:
+            try:
+                await fetcher.get_json('unknown.method')
+                not_retried: bool = False
+            except custom_exceptions.BadCodeStatus:
+                not_retried = app['stats']['requests'] == 1
+    finally:
+        await runner.cleanup()
+
+    ok: bool = retries == 3 and bool(contests) and not_retried
+    print(
+        f'Повторы: {retries} после 503, лимита и 502, '
+        f'ошибка метода без повтора: {not_retried}'
+    )
+    return ok
+
+
+async def check_rate_limit(min_interval: float = 0.2) -> bool:
+    app, runner, api_url = await start_stub(60)
+    try:
+        async with CodeforcesFetcher(
+                api_url, min_interval=min_interval) as fetcher:
+            started: float = time.perf_counter()
+            await fetcher.fetch_all(CALLS)
+            elapsed: float = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    ok: bool = elapsed >= min_interval * (len(CALLS) - 1)
+    print(
+        f'Интервал {min_interval} с: {len(CALLS)} запросов за '
+        f'{elapsed:.2f} с, ограничение соблюдено: {ok}'
+    )
+    return ok
+
+
+async def main() -> None:
+    count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    await measure_fetching(count)
+    ok: bool = await check_retries()
+    ok = await check_rate_limit() and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
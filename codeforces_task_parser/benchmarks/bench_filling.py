@@ -0,0 +1,79 @@
+"""Сравнение построчной и пакетной записи в таблицы tasks, contests и
+contest_tasks.
+
+Нужен доступный PostgreSQL с параметрами из configs/config.py.
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.bench_filling [количество задач]
+
+Запись идёт во временные таблицы и последовательность внутри одной
+транзакции, рабочая схема не меняется.
+"""
+import asyncio
+import logging
+import sys
+import time
+
+import codeforces_task_parser as parser
+import configs.config as cfg
+from benchmarks.fixtures import make_task_rows
+
+
+async def fill(table_name: str, sql_query: str, method: str, content: list):
+    await parser.send_request_to_db(
+        f'TRUNCATE {table_name} RESTART IDENTITY CASCADE', 'POST')
+    started: float = time.perf_counter()
+    await parser.send_request_to_db(sql_query, method, content)
+    return time.perf_counter() - started
+
+
+async def run(tasks: list, contests: list, contest_tasks: list) -> None:
+    # Последовательность версий данных тоже временная: иначе она
+    # появилась бы в рабочей схеме
+    for sql_query in (
+            cfg.TASK_TABLE_MAKE_SQL_QUERY,
+            cfg.CONTEST_TABLE_MAKE_SQL_QUERY):
+        await parser.send_request_to_db(
+            sql_query.replace('CREATE TABLE', 'CREATE TEMP TABLE').replace(
+                ');', ') ON COMMIT DROP;').replace(
+                'CREATE SEQUENCE', 'CREATE TEMP SEQUENCE'), 'POST')
+
+    for table_name, content, per_row_query, bulk_query in (
+            ('tasks', tasks, cfg.FILLING_TASKS_TABLE_SQL_QUERY,
+             cfg.FILLING_TASKS_TABLE_BULK_SQL_QUERY),
+            ('contests', contests, cfg.FILLING_CONTESTS_TABLE_SQL_QUERY,
+             cfg.FILLING_CONTESTS_TABLE_BULK_SQL_QUERY),
+            ('contest_tasks', contest_tasks,
+             cfg.FILLING_CONTEST_TASKS_TABLE_SQL_QUERY,
+             cfg.FILLING_CONTEST_TASKS_TABLE_BULK_SQL_QUERY)):
+        per_row: float = await fill(
+            table_name, per_row_query, 'POST', content)
+        bulk: float = await fill(table_name, bulk_query, 'BULK', content)
+        print(f'{table_name}: {len(content)} строк')
+        print(f'  построчно: {per_row:.3f} с')
+        print(f'  пакетами по {cfg.BULK_BATCH_SIZE}: {bulk:.3f} с')
+        print(f'  ускорение: {per_row / bulk:.1f}x')
+
+
+async def main() -> None:
+    count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    parser.log = logging.getLogger('benchmark')
+    cfg.VERBOSE = False
+    parser.pool = await parser.create_db_pool()
+
+    rows: list = make_task_rows(count)
+    tasks: list = [row[1:] for row in reversed(rows)]
+    contests: list = parser.build_contests(
+        rows, parser.get_tag_stats((row[1], row[4]) for row in rows))
+    contest_rows, contest_task_rows = parser.split_contests(
+        contests, list(range(1, len(contests) + 1)))
+
+    try:
+        async with parser.transaction():
+            await run(tasks, contest_rows, contest_task_rows)
+    finally:
+        parser.pool.close()
+        await parser.pool.wait_closed()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""Пиковая память и время разбора ответа problemset.problems.
+
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.bench_parsing [количество задач ...]
+
+Прежний путь: json.loads всего тела и список parsed_data по индексам.
+Потоковый путь: пары (задача, статистика) из файла через ijson. Для
+потокового пути отдельно показана память при обходе без накопления
+(так работает ежечасное добавление новых задач) и при сборе всех задач
+в список. Для первичного заполнения, где нужен обратный порядок
+вставки, сравниваются строки для записи всех задач сразу и пачки
+get_row_batches поверх списка TaskRecord (без запросов к БД).
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import codeforces_task_parser as parser
+import configs.config as cfg
+from benchmarks.fixtures import make_problemset
+
+
+def legacy_parse(body_path: str) -> list:
+    with open(body_path, 'rb') as file:
+        response: dict = json.loads(file.read()).get('result')
+    problems: dict = response.get('problems')
+    problems_statistic: dict = response.get('problemStatistics')
+    parsed_data: list = []
+
+    for i in range(len(problems)):
+        tags: list = problems[i].get('tags')
+        if not tags:
+            rus_tags: list = [cfg.rus_tags['task without tags']]
+        else:
+            rus_tags: list = [cfg.rus_tags.get(tag, 'Unknown') for tag in tags]
+        parsed_data.append(
+            [
+                rus_tags,
+                problems_statistic[i].get('solvedCount'),
+                [
+                    problems[i].get('name'),
+                    str(problems[i].get('contestId')) + '/'
+                    + problems[i].get('index'),
+                ],
+                problems[i].get('rating', 0),
+            ]
+        )
+    return parsed_data
+
+
+def stream_walk(body_path: str) -> int:
+    count: int = 0
+    for _ in parser.get_parse_response(
+            parser.get_problems_from_response(body_path)):
+        count += 1
+    return count
+
+
+def stream_collect(body_path: str) -> list:
+    return list(parser.get_parse_response(
+        parser.get_problems_from_response(body_path)))
+
+
+def fill_all_rows(body_path: str) -> int:
+    rows: list = [task.to_row() for task in parser.unique_tasks(
+        parser.get_parse_response(
+            parser.get_problems_from_response(body_path)))]
+    return len(rows)
+
+
+def fill_row_batches(body_path: str) -> int:
+    tasks: list = list(parser.unique_tasks(parser.get_parse_response(
+        parser.get_problems_from_response(body_path))))
+    return sum(len(rows) for rows in parser.get_row_batches(tasks))
+
+
+def measure(function, body_path: str) -> tuple:
+    tracemalloc.start()
+    started: float = time.perf_counter()
+    result = function(body_path)
+    elapsed: float = time.perf_counter() - started
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main() -> None:
+    counts: list = [int(arg) for arg in sys.argv[1:]] or [10000, 40000]
+    parser.log = logging.getLogger('benchmark')
+    cfg.VERBOSE = False
+
+    for count in counts:
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as file:
+            file.write(json.dumps(
+                {'status': 'OK', 'result': make_problemset(count)},
+                ensure_ascii=False
+            ).encode())
+        try:
+            size: int = os.path.getsize(file.name)
+            expected, *legacy = measure(legacy_parse, file.name)
+            _, *walk = measure(stream_walk, file.name)
+            result, *collect = measure(stream_collect, file.name)
+            _, *fill_all = measure(fill_all_rows, file.name)
+            _, *fill_batches = measure(fill_row_batches, file.name)
+        finally:
+            os.remove(file.name)
+
+        print(f'Задач: {count}, размер ответа: {size // 1024} КБ')
+        for title, (elapsed, peak) in (
+                ('json.loads + список', legacy),
+                ('потоково, обход', walk),
+                ('потоково, в список', collect),
+                ('первое заполнение, все строки', fill_all),
+                ('первое заполнение, пачки строк', fill_batches)):
+            print(f'  {title}: {elapsed:.3f} с, пик {peak / 2 ** 20:.1f} МБ')
+        rows: list = [list(task.to_row()) for task in result]
+        print(f'  Результаты совпадают: {rows == expected}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Построение контестов на массивах NumPy против build_contests.
+
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.bench_planner [количество задач]
+
+Сначала при настройках по умолчанию сравниваются время и результат
+build_contests и ContestPlanner, затем замеряются прогоны с другим
+размером контеста, порядком задач по числу решивших и диапазонами
+сложностей.
+"""
+import logging
+import sys
+import time
+
+import codeforces_task_parser as parser
+import configs.config as cfg
+from benchmarks.fixtures import make_task_rows
+from contest_planner import ContestPlanner
+
+VARIANTS: tuple = (
+    {'size': 5},
+    {'size': 20},
+    {'order': 'solved'},
+    {'rating_band': 300},
+    {'size': 6, 'order': 'solved', 'rating_band': 500},
+)
+
+
+def main() -> None:
+    count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    parser.log = logging.getLogger('benchmark')
+    cfg.VERBOSE = False
+    tasks: list = make_task_rows(count)
+
+    started: float = time.perf_counter()
+    expected: list = parser.build_contests(
+        tasks, parser.get_tag_stats((task[1], task[4]) for task in tasks))
+    in_memory: float = time.perf_counter() - started
+
+    started = time.perf_counter()
+    planner: ContestPlanner = ContestPlanner(tasks)
+    columns: float = time.perf_counter() - started
+    started = time.perf_counter()
+    contests: list = planner.plan()
+    vectorized: float = time.perf_counter() - started
+
+    print(f'Задач: {len(tasks)}, контестов: {len(contests)}')
+    print(f'build_contests: {in_memory:.3f} с')
+    print(f'ContestPlanner: столбцы {columns:.3f} с, '
+          f'построение {vectorized:.3f} с')
+    print(f'Ускорение построения: {in_memory / vectorized:.1f}x')
+    same: bool = contests == expected
+    print(f'Результаты совпадают: {same}')
+
+    for variant in VARIANTS:
+        started = time.perf_counter()
+        contests = planner.plan(**variant)
+        elapsed: float = time.perf_counter() - started
+        print(f'{variant}: контестов {len(contests)}, {elapsed:.3f} с')
+
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Экономия на разборе и планировании при подготовленных запросах.
+
+Нужна база, заполненная парсером, с параметрами из configs/config.py.
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.bench_prepared [проходов]
+
+Повторяется прежний цикл построения контестов на SQL: для каждой пары
+тема/сложность из tag_stats запрос десяти ещё не выданных задач. Один
+и тот же текст запроса выполняется с параметрами, подставленными на
+клиенте, и как подготовленный. Для одного запроса выводится время
+планирования из EXPLAIN ANALYZE в обоих вариантах.
+"""
+import asyncio
+import logging
+import re
+import sys
+import time
+
+import codeforces_task_parser as parser
+from prepared_queries import PreparedQueries
+
+CONTEST_TASKS_SQL_QUERY: str = """
+SELECT id FROM tasks WHERE %s = ANY(tags) AND rating = %s
+AND NOT (id = ANY(%s::int[])) ORDER BY id LIMIT 10;
+"""
+PLANNING_TIME_PATTERN: str = r'Planning Time: ([0-9.]+) ms'
+
+
+async def contests_loop(cursor, pairs: list, execute) -> float:
+    given_tasks_ids: list = []
+    started: float = time.perf_counter()
+    for tag, rating in pairs:
+        rows: list = await execute(cursor, (tag, rating, given_tasks_ids))
+        given_tasks_ids.extend(row[0] for row in rows)
+    return time.perf_counter() - started
+
+
+async def planning_time(cursor, sql_query: str, params: tuple) -> float:
+    await cursor.execute(f'EXPLAIN ANALYZE {sql_query}', params)
+    plan: str = '\n'.join(row[0] for row in await cursor.fetchall())
+    return float(re.search(PLANNING_TIME_PATTERN, plan).group(1))
+
+
+async def main() -> None:
+    passes: int = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    parser.log = logging.getLogger('benchmark')
+    parser.pool = await parser.create_db_pool()
+    queries: PreparedQueries = PreparedQueries(
+        {'bench_contest_tasks': CONTEST_TASKS_SQL_QUERY})
+
+    async def plain(cursor, params: tuple) -> list:
+        await cursor.execute(CONTEST_TASKS_SQL_QUERY, params)
+        return await cursor.fetchall()
+
+    async def prepared(cursor, params: tuple) -> list:
+        return await queries.execute(cursor, 'bench_contest_tasks', params)
+
+    try:
+        async with parser.pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    'SELECT tag, rating FROM tag_stats ORDER BY tag, rating')
+                pairs: list = await cursor.fetchall()
+
+                results: dict = {'plain': [], 'prepared': []}
+                for _ in range(passes):
+                    results['plain'].append(
+                        await contests_loop(cursor, pairs, plain))
+                    results['prepared'].append(
+                        await contests_loop(cursor, pairs, prepared))
+
+                params: tuple = (*pairs[0], [])
+                plain_planning: float = await planning_time(
+                    cursor, CONTEST_TASKS_SQL_QUERY, params)
+                prepared_planning: float = await planning_time(
+                    cursor, 'EXECUTE bench_contest_tasks (%s, %s, %s)',
+                    params)
+                await cursor.execute('DEALLOCATE bench_contest_tasks')
+    finally:
+        parser.pool.close()
+        await parser.pool.wait_closed()
+
+    plain_time: float = min(results['plain'])
+    prepared_time: float = min(results['prepared'])
+    print(f'Пар тема/сложность: {len(pairs)}, проходов: {passes}')
+    print(f'  параметры на клиенте: {plain_time:.3f} с')
+    print(f'  подготовленный запрос: {prepared_time:.3f} с')
+    print(f'  ускорение: {plain_time / prepared_time:.1f}x')
+    print(
+        f'Планирование одного запроса: {plain_planning:.3f} мс, '
+        f'подготовленного: {prepared_planning:.3f} мс'
+    )
+    print(queries.format_timings())
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
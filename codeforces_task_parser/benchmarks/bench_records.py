@@ -0,0 +1,156 @@
+"""Память и время конвейера задач: вложенные списки против TaskRecord.
+
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.bench_records [количество задач]
+
+Прежний вариант: задача - список [темы, решивших, [название,
+'contestId/index'], сложность], отпечатки по строковому ключу из строк
+таблицы. Новый: TaskRecord с общими кортежами тем и целым ключом
+(contestId, index). Пары (задача, статистика) заранее читаются из
+ответа в список, чтобы время ijson не входило в замер. Замеряются
+разбор и сравнение неизменившегося ответа с отпечатками (как в цикле
+опроса), загрузка отпечатков из строк таблицы и память списка задач и
+словаря отпечатков (tracemalloc).
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import codeforces_task_parser as parser
+import configs.config as cfg
+from benchmarks.fixtures import make_problemset
+
+REPEATS: int = 5
+
+
+def legacy_parse_response(problems: list) -> list:
+    parsed_data: list = []
+    for problem, statistic in problems:
+        tags: list = problem.get('tags')
+        if not tags:
+            rus_tags: list = [cfg.rus_tags['task without tags']]
+        else:
+            rus_tags: list = [cfg.rus_tags.get(tag, 'Unknown') for tag in tags]
+        parsed_data.append([
+            rus_tags,
+            statistic.get('solvedCount'),
+            [
+                problem.get('name'),
+                str(problem.get('contestId')) + '/' + problem.get('index'),
+            ],
+            problem.get('rating', 0),
+        ])
+    return parsed_data
+
+
+def legacy_fingerprint(task: list) -> tuple:
+    tags, count_solved, name_and_number, rating = task
+    return (
+        hash((tuple(tags), count_solved, tuple(name_and_number), rating)),
+        hash((frozenset(tags), rating)),
+    )
+
+
+def legacy_load_fingerprints(rows: list) -> dict:
+    return {row[2][1]: legacy_fingerprint(row) for row in rows}
+
+
+def legacy_diff(tasks: list, fingerprints: dict) -> tuple:
+    new_tasks: list = []
+    changed_tasks: list = []
+    seen: set = set()
+    for task in tasks:
+        if task[2][1] in seen:
+            continue
+        seen.add(task[2][1])
+        known: tuple = fingerprints.get(task[2][1])
+        if known is None:
+            new_tasks.append(task)
+        elif legacy_fingerprint(task) != known:
+            changed_tasks.append(task)
+    return new_tasks, changed_tasks
+
+
+def parse_response(problems: list) -> list:
+    return list(parser.get_parse_response(problems))
+
+
+def measure_time(function, *args) -> tuple:
+    started: float = time.perf_counter()
+    for _ in range(REPEATS):
+        result = function(*args)
+    return result, (time.perf_counter() - started) / REPEATS
+
+
+def measure_memory(function, *args) -> int:
+    tracemalloc.start()
+    result = function(*args)
+    memory: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return memory
+
+
+def main() -> None:
+    count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    parser.log = logging.getLogger('benchmark')
+    cfg.VERBOSE = False
+
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as file:
+        file.write(json.dumps(
+            {'status': 'OK', 'result': make_problemset(count)},
+            ensure_ascii=False
+        ).encode())
+    try:
+        problems: list = list(parser.get_problems_from_response(file.name))
+    finally:
+        os.remove(file.name)
+    # Строки таблицы tasks, как их вернёт psycopg2: свои объекты строк в
+    # каждой строке таблицы. Для замера памяти строки создаются заново и
+    # освобождаются после загрузки, остаётся только словарь отпечатков
+    db_json: str = json.dumps(legacy_parse_response(problems))
+    db_rows: list = json.loads(db_json)
+
+    results: list = []
+    for parse, load, diff in (
+            (legacy_parse_response, legacy_load_fingerprints, legacy_diff),
+            (parse_response, parser.get_task_fingerprints, parser.diff_tasks)):
+        fingerprints, load_time = measure_time(load, db_rows)
+        tasks, parse_time = measure_time(parse, problems)
+        changes, cycle_time = measure_time(
+            lambda: diff(parse(problems), fingerprints))
+        results.append({
+            'tasks': tasks,
+            'changes': changes[:2],
+            'Разбор ответа, с': parse_time,
+            'Разбор и сравнение с отпечатками, с': cycle_time,
+            'Загрузка отпечатков, с': load_time,
+            'Память списка задач, МБ':
+                measure_memory(parse, problems) / 2 ** 20,
+            'Память отпечатков, МБ': measure_memory(
+                lambda: load(json.loads(db_json))) / 2 ** 20,
+        })
+
+    legacy, current = results
+    print(f'Задач: {count}')
+    for title, value in current.items():
+        if title in ('tasks', 'changes'):
+            continue
+        print(f'  {title}: списки {legacy[title]:.3f}, '
+              f'TaskRecord {value:.3f} ({legacy[title] / value:.1f}x)')
+
+    same: bool = [
+        list(task.to_row()) for task in current['tasks']
+    ] == legacy['tasks'] and current['changes'] == legacy['changes'] \
+        == ([], [])
+    print(f'Строки для записи совпадают, изменений нет: {same}')
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Проверка, что частые запросы парсера и бота используют индексы.
+
+Нужна база, заполненная парсером (миграции применены), с параметрами
+из configs/config.py. Запуск из папки codeforces_task_parser:
+    python -m benchmarks.explain_indexes
+
+Для каждого запроса выводится план EXPLAIN. Последовательное чтение
+запрещается на время проверки (enable_seqscan = off), иначе на
+небольших таблицах планировщик выбирает его даже при наличии индекса.
+Код выхода 1, если хотя бы один запрос не использует ожидаемый индекс.
+"""
+import asyncio
+import logging
+import sys
+
+import codeforces_task_parser as parser
+
+CHECKS: tuple = (
+    (
+        'tasks_tags_idx',
+        "SELECT id FROM tasks WHERE tags @> ARRAY['Графы']::varchar(255)[];",
+    ),
+    (
+        'tasks_problem_key_idx',
+        "SELECT id FROM tasks WHERE problem_key = '1/A';",
+    ),
+    (
+        'contests_tag_rating_idx',
+        "SELECT id, number, tag, rating FROM contests "
+        "WHERE tag = 'Графы' AND rating = 1500 ORDER BY id DESC;",
+    ),
+)
+
+
+async def main() -> None:
+    parser.log = logging.getLogger('benchmark')
+    parser.pool = await parser.create_db_pool()
+
+    failed: bool = False
+    try:
+        async with parser.transaction():
+            await parser.send_request_to_db(
+                'SET LOCAL enable_seqscan = off;', 'POST')
+            for index_name, sql_query in CHECKS:
+                plan: str = '\n'.join(
+                    row[0] for row in await parser.send_request_to_db(
+                        f'EXPLAIN {sql_query}', 'GET')
+                )
+                used: bool = index_name in plan
+                failed = failed or not used
+                print(f'{sql_query}\n{plan}\nИндекс {index_name}: '
+                      f'{"используется" if used else "НЕ используется"}\n')
+    finally:
+        parser.pool.close()
+        await parser.pool.wait_closed()
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import random
+
+import configs.config as cfg
+
+RATINGS: list = [0] + list(range(800, 3600, 100))
+
+
+def make_problemset(
+        count: int = 10000, seed: int = 0, lang: str = 'ru') -> dict:
+    """Синтетический ответ problemset.problems в формате API Codeforces."""
+    rnd: random.Random = random.Random(seed)
+    tags: list = list(cfg.rus_tags)
+    tags.remove('task without tags')
+    problems: list = []
+    statistics: list = []
+
+    for i in range(count):
+        contest_id: int = 2000 - i // 6
+        index: str = 'ABCDEF'[5 - i % 6]
+        problem: dict = {
+            'contestId': contest_id, 'index': index,
+            'name': f'Задача {contest_id}{index}' if lang == 'ru'
+            else f'Problem {contest_id}{index}',
+            'type': 'PROGRAMMING',
+            'tags': rnd.sample(tags, rnd.choice((0, 1, 1, 2, 2, 3, 4))),
+        }
+        if rnd.random() > 0.1:
+            problem['rating'] = rnd.choice(RATINGS[1:])
+        problems.append(problem)
+        statistics.append(
+            {
+                'contestId': contest_id, 'index': index,
+                'solvedCount': rnd.randint(0, 50000),
+            }
+        )
+
+    return {'problems': problems, 'problemStatistics': statistics}
+
+
+def make_contest_list(
+        count: int = 10000, lang: str = 'ru', contest_ids: list = None
+) -> list:
+    """Синтетический ответ contest.list для контестов из make_problemset
+    или для заданных contest_ids.
+    """
+    if contest_ids is None:
+        contest_ids = range(2000, 2000 - (count + 5) // 6, -1)
+    return [
+        {
+            'id': contest_id, 'type': 'CF', 'phase': 'FINISHED',
+            'durationSeconds': 7200,
+            'startTimeSeconds': 1500000000 + contest_id * 86400,
+            'name': f'Раунд {contest_id}' if lang == 'ru'
+            else f'Round {contest_id}',
+        }
+        for contest_id in contest_ids
+    ]
+
+
+def make_task_rows(count: int = 10000, seed: int = 0) -> list:
+    """Строки таблицы tasks так, как их вернёт SELECT * ... ORDER BY id.
+
+    Ответ API вставляется в обратном порядке, поэтому id 1 получает
+    последняя задача ответа.
+    """
+    problemset: dict = make_problemset(count, seed)
+    rows: list = []
+
+    for problem, statistic in zip(
+            reversed(problemset['problems']),
+            reversed(problemset['problemStatistics'])):
+        tags: list = problem['tags'] or ['task without tags']
+        rows.append(
+            (
+                len(rows) + 1,
+                [cfg.rus_tags.get(tag, 'Unknown') for tag in tags],
+                statistic['solvedCount'],
+                [
+                    problem['name'],
+                    f"{problem['contestId']}/{problem['index']}",
+                ],
+                problem.get('rating', 0),
+            )
+        )
+
+    return rows
@@ -0,0 +1,125 @@
+"""Временный PostgreSQL для сквозного замера.
+
+Кластер создаётся initdb во временной папке и запускается pg_ctl на
+свободном порту с отключённым fsync: данные не переживают замер, а
+задержки диска не мешают сравнивать прогоны. Программы ищутся в PATH,
+в `pg_config --bindir` и в /usr/lib/postgresql/*/bin. PostgreSQL не
+запускается от root, в этом случае нужен внешний сервер.
+
+Для внешнего сервера (host и port) создаётся и после замера удаляется
+отдельная база, рабочие таблицы не затрагиваются.
+"""
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+import psycopg2
+
+import configs.config as cfg
+
+
+def find_bindir() -> str:
+    if shutil.which('pg_ctl') and shutil.which('initdb'):
+        return os.path.dirname(shutil.which('pg_ctl'))
+    try:
+        bindir: str = subprocess.run(
+            ['pg_config', '--bindir'], capture_output=True, text=True,
+            check=True
+        ).stdout.strip()
+        if os.path.exists(os.path.join(bindir, 'initdb')):
+            return bindir
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    for bindir in sorted(glob.glob('/usr/lib/postgresql/*/bin'),
+                         reverse=True):
+        if os.path.exists(os.path.join(bindir, 'initdb')):
+            return bindir
+    return None
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_cluster():
+    """Запущенный временный кластер: (host, port)."""
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        raise RuntimeError(
+            'PostgreSQL не запускается от root: запустите замер от другого '
+            'пользователя или укажите внешний сервер через --db-host'
+        )
+    bindir: str = find_bindir()
+    if bindir is None:
+        raise RuntimeError(
+            'initdb и pg_ctl не найдены: установите PostgreSQL или укажите '
+            'внешний сервер через --db-host'
+        )
+
+    data_dir: str = tempfile.mkdtemp(prefix='bench_pg_')
+    port: int = get_free_port()
+    try:
+        subprocess.run(
+            [os.path.join(bindir, 'initdb'), '-D', data_dir, '-U', cfg.USER,
+             '-A', 'trust', '-E', 'UTF8', '--no-locale'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        subprocess.run(
+            [os.path.join(bindir, 'pg_ctl'), '-D', data_dir, '-w',
+             '-l', os.path.join(data_dir, 'server.log'),
+             '-o', f'-p {port} -c listen_addresses=localhost -k {data_dir} '
+                   f'-c fsync=off -c synchronous_commit=off '
+                   f'-c full_page_writes=off',
+             'start'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        try:
+            yield 'localhost', port
+        finally:
+            subprocess.run(
+                [os.path.join(bindir, 'pg_ctl'), '-D', data_dir, '-w',
+                 '-m', 'fast', 'stop'],
+                stdout=subprocess.DEVNULL
+            )
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def run_admin_query(host: str, port: int, sql_query: str) -> None:
+    connection = psycopg2.connect(
+        host=host, port=port, user=cfg.USER, password=cfg.PASSWORD,
+        dbname='postgres'
+    )
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(sql_query)
+    finally:
+        connection.close()
+
+
+@contextmanager
+def throwaway_database(host: str = None, port: int = None):
+    """Пустая база на время замера: (host, port, имя базы).
+
+    Без host поднимается временный кластер.
+    """
+    if host is None:
+        with local_cluster() as (host, port):
+            with throwaway_database(host, port) as database:
+                yield database
+        return
+
+    db_name: str = f'bench_e2e_{os.getpid()}'
+    run_admin_query(host, port, f'DROP DATABASE IF EXISTS {db_name}')
+    run_admin_query(host, port, f'CREATE DATABASE {db_name}')
+    try:
+        yield host, port, db_name
+    finally:
+        run_admin_query(host, port, f'DROP DATABASE IF EXISTS {db_name}')
@@ -0,0 +1,91 @@
+"""Локальная заглушка API Codeforces на синтетической фикстуре.
+
+Запуск из папки codeforces_task_parser:
+    python -m benchmarks.stub_server [порт] [количество задач] [ответ API]
+
+После этого парсер можно направить на заглушку:
+    CODEFORCES_API_URL=http://localhost:8080/api
+Поддерживаются методы problemset.problems и contest.list с параметром
+lang, ETag и ответ 304 на If-None-Match. Через failures в make_app
+можно задать ответы, которые заглушка отдаст первыми: код ответа или
+'limit' для превышения лимита вызовов, а через latency - задержку
+каждого ответа в секундах.
+
+Вместо синтетической фикстуры можно отдавать записанный ответ
+problemset.problems (файл с полями status и result): он же отдаётся на
+обоих языках, а contest.list строится по его контестам.
+"""
+import asyncio
+import hashlib
+import json
+import sys
+
+from aiohttp import web
+
+from benchmarks.fixtures import make_contest_list, make_problemset
+
+
+def make_body(result) -> tuple:
+    body: bytes = json.dumps(
+        {'status': 'OK', 'result': result}, ensure_ascii=False).encode()
+    return body, f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+def load_recorded(path: str) -> dict:
+    with open(path, encoding='UTF-8') as file:
+        return json.load(file)['result']
+
+
+def make_app(
+        count: int = 10000, failures: list = None, latency: float = 0.0,
+        recorded: dict = None) -> web.Application:
+    bodies: dict = {}
+    for lang in ('ru', 'en'):
+        problemset: dict = recorded or make_problemset(count, lang=lang)
+        bodies[('problemset.problems', lang)] = make_body(problemset)
+        bodies[('contest.list', lang)] = make_body(make_contest_list(
+            count, lang=lang,
+            contest_ids=recorded and sorted({
+                problem['contestId'] for problem in recorded['problems']
+            }, reverse=True)
+        ))
+    failures = list(failures or [])
+
+    async def api_method(request: web.Request) -> web.Response:
+        request.app['stats']['requests'] += 1
+        await asyncio.sleep(latency)
+        if failures:
+            failure = failures.pop(0)
+            if failure == 'limit':
+                return web.json_response(
+                    {'status': 'FAILED', 'comment': 'Call limit exceeded'},
+                    status=400
+                )
+            return web.Response(status=failure)
+
+        key: tuple = (
+            request.match_info['method'], request.query.get('lang', 'en'))
+        if key not in bodies:
+            return web.json_response(
+                {'status': 'FAILED', 'comment': 'method: Method not found'},
+                status=400
+            )
+        body, etag = bodies[key]
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(
+            body=body, content_type='application/json',
+            headers={'ETag': etag}
+        )
+
+    app: web.Application = web.Application()
+    app['stats'] = {'requests': 0}
+    app.router.add_get('/api/{method}', api_method)
+    return app
+
+
+if __name__ == '__main__':
+    port: int = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    count: int = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    recorded: dict = load_recorded(sys.argv[3]) if len(sys.argv) > 3 else None
+    web.run_app(make_app(count, recorded=recorded), port=port)
@@ -1,136 +1,601 @@
 import asyncio
+import json
+import logging
+import os
 import sys
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
 
 import aiohttp
+import aiopg
+import ijson
 import psycopg2
-from aiohttp import ClientResponse
+from aiohttp import ClientResponse, web
 from tqdm import tqdm
 
 import configs.config as cfg
 import configs.custom_exceptions as custom_exceptions
+from fetcher import CodeforcesFetcher
+from metrics import metrics, start_metrics_server
+from prepared_queries import PreparedQueries
+from task_record import (TaskRecord, get_fingerprint, intern_tags,
+                         make_task_key, parse_task_key)
 
 
-def connect_to_db():
+pool: aiopg.Pool = None
+metrics_runner: web.AppRunner = None
+# Сообщения о каждом вызове, отключаются при VERBOSE=0
+calls_log: logging.Logger = logging.getLogger('task_parser.calls')
+fetcher: CodeforcesFetcher = None
+queries: PreparedQueries = PreparedQueries(cfg.PREPARED_QUERIES)
+# Отпечатки сохранённых задач по целому ключу (contestId, index)
+task_fingerprints: dict = {}
+# ETag последних ответов дополнительных запросов к API по пути файла
+api_etags: dict = {}
+# Курсор открытой транзакции, запросы внутри transaction() идут через него
+current_cursor: ContextVar = ContextVar('current_cursor', default=None)
+
+
+async def create_db_pool() -> aiopg.Pool:
     log.info('-------------------Запуск программы-------------------------')
     log.info('Соединение с PostgreSQL')
 
+    for attempt in range(1, cfg.DB_RECONNECT_ATTEMPTS + 1):
+        try:
+            return await aiopg.create_pool(
+                host=cfg.HOST, user=cfg.USER, port=cfg.PORT,
+                password=cfg.PASSWORD, database=cfg.DB_NAME,
+                minsize=cfg.DB_POOL_MIN_SIZE, maxsize=cfg.DB_POOL_MAX_SIZE,
+                timeout=cfg.DB_TIMEOUT,
+            )
+        except Exception as _error:
+            if attempt == cfg.DB_RECONNECT_ATTEMPTS:
+                raise custom_exceptions.ConnectionToDbFailed(_error)
+            log.warning(f'PostgreSQL недоступен ({_error}), повтор')
+            await asyncio.sleep(cfg.DB_RECONNECT_DELAY)
+
+
+@asynccontextmanager
+async def transaction():
+    """Запросы внутри блока выполняются на одном соединении и коммитятся
+    вместе. Вложенный блок присоединяется к внешней транзакции.
+    """
+    if current_cursor.get() is not None:
+        yield
+        return
+
     try:
-        connect = psycopg2.connect(
-            host=cfg.HOST, user=cfg.USER, port=cfg.PORT,
-            password=cfg.PASSWORD, database=cfg.DB_NAME,
-        )
-    except Exception as _error:
-        raise custom_exceptions.ConnectionToDbFailed(_error)
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                async with cursor.begin():
+                    token = current_cursor.set(cursor)
+                    try:
+                        yield
+                    finally:
+                        current_cursor.reset(token)
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as _error:
+        raise custom_exceptions.DbUnavailable(_error)
 
-    return connect
 
+async def execute_request(
+        cursor: aiopg.Cursor, request: str, method: str, data: list = None):
+    name: str = queries.find(request)
+    with metrics.timer('parser_db_query_seconds', query=name or method):
+        return await execute_query(cursor, request, name, method, data)
 
-async def send_request_to_db(
-        request: str, method: str, data: list = None):
+
+async def execute_query(
+        cursor: aiopg.Cursor, request: str, name: str, method: str,
+        data: list = None):
     try:
-        with connection.cursor() as cursor:
-            if method == 'GET':
-                cursor.execute(request)
-                return cursor.fetchall()
-            elif method == 'POST':
-                if data:
-                    for i in data[::-1]:
-                        cursor.execute(request, i)
-                else:
-                    cursor.execute(request)
+        if name and method == 'GET':
+            return await queries.execute(cursor, name, data)
+        elif name and method == 'POST':
+            for i in (data or [None])[::-1]:
+                await queries.execute(cursor, name, i, fetch=False)
+        elif method == 'GET':
+            await cursor.execute(request, data)
+            return await cursor.fetchall()
+        elif method == 'POST':
+            if data:
+                for i in data[::-1]:
+                    await cursor.execute(request, i)
+            else:
+                await cursor.execute(request)
+        elif method == 'BULK':
+            prefix, suffix = request.split('%s', 1)
+            template: str = f"({', '.join(['%s'] * len(data[0]))})"
+            rows: list = data[::-1]
+            returned: list = []
+            for i in range(0, len(rows), cfg.BULK_BATCH_SIZE):
+                values: str = ','.join(
+                    cursor.mogrify(template, row).decode()
+                    for row in rows[i:i + cfg.BULK_BATCH_SIZE]
+                )
+                await cursor.execute(prefix + values + suffix)
+                if cursor.description:
+                    returned.extend(await cursor.fetchall())
+            return returned
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as _error:
+        raise custom_exceptions.DbUnavailable(_error)
     except Exception as _error:
         raise custom_exceptions.SendRequestToDbFailed(_error)
 
 
-async def get_json_response() -> dict:
-    log.info("Запрос к API Codeforces и преобразование в формат json")
+async def send_request_to_db(
+        request: str, method: str, data: list = None):
+    cursor: aiopg.Cursor = current_cursor.get()
+    if cursor is not None:
+        return await execute_request(cursor, request, method, data)
+
+    for attempt in range(1, cfg.DB_RECONNECT_ATTEMPTS + 1):
+        try:
+            async with pool.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    return await execute_request(
+                        cursor, request, method, data)
+        except (custom_exceptions.DbUnavailable, psycopg2.OperationalError,
+                psycopg2.InterfaceError) as _error:
+            if attempt == cfg.DB_RECONNECT_ATTEMPTS:
+                raise custom_exceptions.DbUnavailable(_error)
+            log.warning(f'Соединение с PostgreSQL потеряно ({_error}), повтор')
+            await asyncio.sleep(cfg.DB_RECONNECT_DELAY)
+
+
+def load_response_cache() -> dict:
     try:
-        async with aiohttp.ClientSession() as session:
-            response: ClientResponse = await session.get(cfg.ENDPOINT)
-            json_response: dict = await response.json()
+        with open(cfg.RESPONSE_CACHE_META_PATH, encoding='UTF-8') as file:
+            cache_meta: dict = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if not os.path.exists(cfg.RESPONSE_CACHE_BODY_PATH):
+        return {}
+    return cache_meta
+
+
+def save_response_cache(body_path: str, cache_meta: dict) -> None:
+    calls_log.info('Сохранение ответа API в кэш')
+    if body_path != cfg.RESPONSE_CACHE_BODY_PATH:
+        os.replace(body_path, cfg.RESPONSE_CACHE_BODY_PATH)
+
+    with open(f'{cfg.RESPONSE_CACHE_META_PATH}.tmp', 'w',
+              encoding='UTF-8') as file:
+        json.dump(cache_meta, file)
+    os.replace(f'{cfg.RESPONSE_CACHE_META_PATH}.tmp',
+               cfg.RESPONSE_CACHE_META_PATH)
+
+
+async def get_response_body(cache_meta: dict) -> tuple:
+    """Запрос к API с перепроверкой по ETag/Last-Modified из cache_meta.
+
+    Тело ответа пишется на диск по частям, не целиком в память.
+    Возвращает (путь к телу ответа, метаданные). Путь равен None, если
+    сервер ответил 304. Если API недоступно, отдаётся последний
+    сохранённый ответ.
+    """
+    calls_log.info("Запрос к API Codeforces")
+    headers: dict = {}
+    if cache_meta.get('etag'):
+        headers['If-None-Match'] = cache_meta['etag']
+    if cache_meta.get('last_modified'):
+        headers['If-Modified-Since'] = cache_meta['last_modified']
+
+    body_path: str = f'{cfg.RESPONSE_CACHE_BODY_PATH}.part'
+    os.makedirs(os.path.dirname(body_path), exist_ok=True)
+    try:
+        status, response_headers, body_hash = await fetcher.download(
+            'problemset.problems', body_path, {'lang': 'ru'}, headers)
     except Exception as _error:
+        cached_meta: dict = load_response_cache()
+        if not cached_meta:
+            raise custom_exceptions.ResponseFromApiWasntRecieved(_error)
+        log.warning(
+            f'API недоступно ({_error}), используется сохранённый ответ')
+        return cfg.RESPONSE_CACHE_BODY_PATH, cached_meta
+
+    if status == 304:
+        calls_log.info('Ответ API не изменился (304)')
+        return None, cache_meta
+    return body_path, {
+        'sha256': body_hash,
+        'etag': response_headers.get('ETag'),
+        'last_modified': response_headers.get('Last-Modified'),
+    }
+
+
+async def sync_codeforces_contests() -> None:
+    calls_log.info('Запрос списка контестов Codeforces на двух языках')
+    contests: dict = await fetcher.fetch_all({
+        'ru': ('contest.list', {'lang': 'ru'}),
+        'en': ('contest.list', {'lang': 'en'}),
+    })
+    names_en: dict = {
+        contest['id']: contest['name'] for contest in contests['en']}
+    rows: dict = {}
+    for contest in contests['ru']:
+        start_time = contest.get('startTimeSeconds')
+        rows[contest['id']] = (
+            contest['id'], contest['name'], names_en.get(contest['id']),
+            contest['phase'],
+            datetime.fromtimestamp(start_time, timezone.utc)
+            if start_time is not None else None,
+            contest.get('durationSeconds'),
+        )
+    if rows:
+        await send_request_to_db(
+            cfg.FILLING_CODEFORCES_CONTESTS_TABLE_BULK_SQL_QUERY, 'BULK',
+            list(rows.values())
+        )
+
+
+async def sync_problem_names_en() -> None:
+    calls_log.info('Запрос английских названий задач')
+    headers: dict = {}
+    if api_etags.get(cfg.EN_PROBLEMSET_PATH):
+        headers['If-None-Match'] = api_etags[cfg.EN_PROBLEMSET_PATH]
+    os.makedirs(os.path.dirname(cfg.EN_PROBLEMSET_PATH), exist_ok=True)
+    status, response_headers, _ = await fetcher.download(
+        'problemset.problems', cfg.EN_PROBLEMSET_PATH, {'lang': 'en'},
+        headers)
+    if status == 304:
+        calls_log.info('Английские названия задач не изменились (304)')
+        return
+
+    check_response_status(cfg.EN_PROBLEMSET_PATH)
+    rows: dict = {
+        f"{problem['contestId']}/{problem['index']}": problem['name']
+        for problem, _ in get_problems_from_response(cfg.EN_PROBLEMSET_PATH)
+    }
+    if rows:
+        await send_request_to_db(
+            cfg.FILLING_PROBLEM_NAMES_TABLE_BULK_SQL_QUERY, 'BULK',
+            list(rows.items())
+        )
+    api_etags[cfg.EN_PROBLEMSET_PATH] = response_headers.get('ETag')
+
+
+async def sync_codeforces_data() -> None:
+    """Список контестов и английские названия задач.
+
+    Это дополнительные данные, поэтому ошибки только пишутся в лог и не
+    прерывают цикл.
+    """
+    results: list = await asyncio.gather(
+        sync_codeforces_contests(), sync_problem_names_en(),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            log.warning(f'Данные Codeforces не обновлены: {result}')
+
+
+def check_response_status(body_path: str) -> None:
+    calls_log.info("Проверка статуса ответа API")
+    try:
+        with open(body_path, 'rb') as file:
+            status: str = next(ijson.items(file, 'status'), None)
+    except ijson.JSONError as _error:
         raise custom_exceptions.ResponseFromApiWasntRecieved(_error)
 
-    if json_response.get('status') != 'OK':
+    if status != 'OK':
         message: str = 'Сервер с задачами не доступен'
         log.info(message)
         raise custom_exceptions.BadCodeStatus(message)
 
-    return json_response
-
-
-async def get_parse_response(response: dict) -> list:
-    log.info('Парсинг полученного ответа')
-    problems: dict = response.get('problems')
-    problems_statistic: dict = response.get('problemStatistics')
-    parsed_data: list = []
-
-    for i in tqdm(range(len(problems))):
-        tags: list = problems[i].get('tags')
-        if not tags:
-            rus_tags: list = [cfg.rus_tags['task without tags']]
-        else:
-            rus_tags: list = [cfg.rus_tags.get(tag, 'Unknown') for tag in tags]
-        parsed_data.append(
-            [
-                rus_tags,
-                problems_statistic[i].get('solvedCount'),
-                [
-                    problems[i].get('name'),
-                    str(problems[i].get('contestId')) + '/'
-                    + problems[i].get('index'),
-                ],
-                problems[i].get('rating', 0),
-            ]
+
+def get_problems_from_response(body_path: str) -> Iterator[tuple]:
+    """Пары (задача, статистика) из ответа API потоковым разбором.
+
+    Списки problems и problemStatistics читаются двумя независимыми
+    проходами по файлу, поэтому в памяти одновременно только одна пара.
+    """
+    with open(body_path, 'rb') as problems_file, \
+            open(body_path, 'rb') as statistics_file:
+        yield from zip(
+            ijson.items(
+                problems_file, 'result.problems.item', use_float=True),
+            ijson.items(
+                statistics_file, 'result.problemStatistics.item',
+                use_float=True),
+        )
+
+
+def get_parse_response(problems: Iterable[tuple]) -> Iterator[TaskRecord]:
+    calls_log.info('Парсинг полученного ответа')
+    without_tags: tuple = intern_tags([cfg.rus_tags['task without tags']])
+    for problem, statistic in tqdm(problems, disable=not cfg.VERBOSE):
+        try:
+            key: int = make_task_key(
+                problem.get('contestId'), problem.get('index'))
+        except ValueError as _error:
+            log.warning(f'Задача пропущена: {_error}')
+            continue
+        tags: list = problem.get('tags')
+        yield TaskRecord(
+            intern_tags([
+                cfg.rus_tags.get(tag, 'Unknown') for tag in tags
+            ]) if tags else without_tags,
+            statistic.get('solvedCount'),
+            problem.get('name'),
+            key,
+            problem.get('rating', 0),
         )
-    return parsed_data
 
 
-async def adding_tasks_in_table(
-        last_table_record_name: str, parsed_tasks: list) -> None:
-    log.info('Создание и заполнение массива новыми задачами')
+async def load_task_fingerprints() -> None:
+    log.info('Загрузка отпечатков задач из базы')
+    task_fingerprints.clear()
+    task_fingerprints.update(get_task_fingerprints(
+        await send_request_to_db(cfg.TASK_FINGERPRINTS_SQL_QUERY, 'GET')))
+
+
+def get_task_fingerprints(rows: Iterable[tuple]) -> dict:
+    """Отпечатки TaskRecord.fingerprint по строкам таблицы tasks (tags,
+    count_solved, name_and_number, rating).
+    """
+    return {
+        parse_task_key(problem_key): get_fingerprint(
+            tuple(tags), count_solved, name, rating)
+        for tags, count_solved, (name, problem_key), rating in rows
+    }
+
+
+def unique_tasks(
+        parsed_tasks: Iterable[TaskRecord]) -> Iterator[TaskRecord]:
+    """Задачи без повторов ключа (contestId, index), первая из повторов.
+
+    Повтор ключа в одной пачке INSERT ... ON CONFLICT DO UPDATE
+    PostgreSQL отвергает.
+    """
+    seen: set = set()
+    for task in parsed_tasks:
+        if task.key not in seen:
+            seen.add(task.key)
+            yield task
+
+
+def diff_tasks(
+        parsed_tasks: Iterable[TaskRecord], fingerprints: dict) -> tuple:
+    """Новые и изменённые задачи по сравнению с отпечатками в памяти.
+
+    Задачи сопоставляются по ключу (contestId, index), повторы ключа в
+    ответе API пропускаются. Возвращает (новые задачи, изменённые
+    задачи, изменилась ли статистика тем, изменилось ли у задач что-то
+    кроме числа решивших).
+    """
     new_tasks: list = []
+    changed_tasks: list = []
+    stats_changed: bool = False
+    content_changed: bool = False
 
-    for task in tqdm(parsed_tasks):
-        if task[2] != last_table_record_name:
+    for task in tqdm(unique_tasks(parsed_tasks), disable=not cfg.VERBOSE):
+        known: tuple = fingerprints.get(task.key)
+        if known is None:
             new_tasks.append(task)
-        else:
-            break
+            continue
+        fingerprint: tuple = task.fingerprint()
+        if fingerprint != known:
+            changed_tasks.append(task)
+            stats_changed = stats_changed or fingerprint[1] != known[1]
+            content_changed = content_changed or fingerprint[0] != known[0]
+
+    return new_tasks, changed_tasks, stats_changed, content_changed
+
 
+async def sync_tasks(parsed_tasks: Iterable[TaskRecord]) -> bool:
+    """Запись только новых и изменившихся задач.
+
+    Изменённые задачи обновляются через ON CONFLICT (problem_key), при
+    изменении тем или сложности статистика тем пересчитывается. Новые
+    задачи дополняют контесты, уже выданные контесты не меняются.
+    Если у задач изменилось только число решивших, оно записывается без
+    уведомления бота. Возвращает True, если появились новые задачи или
+    изменилось что-то кроме числа решивших.
+    """
+    calls_log.info('Сравнение задач с сохранёнными отпечатками')
+    with metrics.timer('parser_stage_seconds', stage='parse'):
+        new_tasks, changed_tasks, stats_changed, content_changed = \
+            diff_tasks(parsed_tasks, task_fingerprints)
+    metrics.inc('parser_tasks_total', len(new_tasks), kind='new')
+    metrics.inc('parser_tasks_total', len(changed_tasks), kind='changed')
     log.info(
-        f'Добавление {len(new_tasks)} задач в таблицу'
+        f'Новых задач - {len(new_tasks)}, '
+        f'изменённых задач - {len(changed_tasks)}'
     )
-    await filling_table('tasks', new_tasks)
-    await send_request_to_db('DROP TABLE contests', 'POST')
-    await check_or_create_table(('contests', cfg.CONTEST_TABLE_MAKE_SQL_QUERY))
+    if not new_tasks and not changed_tasks:
+        return False
+
+    last_task_id: int = await get_last_task_id()
+    with metrics.timer('parser_stage_seconds', stage='db_write'):
+        async with transaction():
+            if changed_tasks:
+                inserted: dict = await upsert_tasks(changed_tasks)
+                if stats_changed or inserted:
+                    log.info('Пересчёт статистики тем и сложностей')
+                    await send_request_to_db(
+                        cfg.TAG_STATS_RECOUNT_SQL_QUERY, 'POST')
+            await filling_table('tasks', new_tasks)
+            if new_tasks and cfg.CONTESTS_INCREMENTAL:
+                await extend_contests(last_task_id)
+            if new_tasks or content_changed:
+                await publish_event(
+                    cfg.TASKS_CHANNEL, new_tasks=len(new_tasks),
+                    changed_tasks=len(changed_tasks)
+                )
+    if new_tasks and not cfg.CONTESTS_INCREMENTAL:
+        await rebuild_contests()
+
+    for task in new_tasks + changed_tasks:
+        task_fingerprints[task.key] = task.fingerprint()
+    return bool(new_tasks) or content_changed
+
+
+async def write_snapshot() -> None:
+    """Снимок представлений бота в cfg.SNAPSHOT_PATH.
+
+    Данные читаются одной транзакцией, файл заменяется атомарно, после
+    записи бот получает уведомление в cfg.SNAPSHOT_CHANNEL.
+    """
+    if not cfg.SNAPSHOT_PATH:
+        return
+
+    calls_log.info('Запись снимка представлений бота')
+    started: float = time.perf_counter()
+    async with transaction():
+        (version,), = await send_request_to_db(
+            cfg.DATA_VERSION_SQL_QUERY, 'GET')
+        tag_stats: list = await send_request_to_db(
+            cfg.SNAPSHOT_TAG_STATS_SQL_QUERY, 'GET')
+        contests: list = await send_request_to_db(
+            cfg.SNAPSHOT_CONTESTS_SQL_QUERY, 'GET')
+        contest_tasks: list = await send_request_to_db(
+            cfg.SNAPSHOT_CONTEST_TASKS_SQL_QUERY, 'GET')
+
+    os.makedirs(os.path.dirname(cfg.SNAPSHOT_PATH) or '.', exist_ok=True)
+    with open(f'{cfg.SNAPSHOT_PATH}.tmp', 'w', encoding='UTF-8') as file:
+        json.dump(
+            {
+                'version': version, 'tag_stats': tag_stats,
+                'contests': contests, 'contest_tasks': contest_tasks,
+            },
+            file, ensure_ascii=False, separators=(',', ':')
+        )
+    os.replace(f'{cfg.SNAPSHOT_PATH}.tmp', cfg.SNAPSHOT_PATH)
+    await send_request_to_db(
+        cfg.SNAPSHOT_NOTIFY_SQL_QUERY, 'GET',
+        (cfg.SNAPSHOT_CHANNEL, json.dumps({'version': version}))
+    )
+    metrics.observe(
+        'parser_stage_seconds', time.perf_counter() - started,
+        stage='snapshot'
+    )
+    log.info(
+        f'Снимок версии {version} записан: контестов - {len(contests)}, '
+        f'задач в контестах - {len(contest_tasks)}'
+    )
+
+
+async def publish_event(channel: str, **payload) -> None:
+    """Уведомление бота о событии с новым номером версии данных.
+
+    Внутри transaction() уведомление уйдёт только после коммита.
+    """
+    (version, _), = await send_request_to_db(
+        cfg.PUBLISH_EVENT_SQL_QUERY, 'GET', (channel, json.dumps(payload)))
+    metrics.set('parser_data_version', version)
+    log.info(f'Событие {channel}, версия данных - {version}')
+
+
+def get_row_batches(tasks: list) -> Iterator[list]:
+    """Строки to_row() пачками по cfg.BULK_BATCH_SIZE задач.
+
+    Пачки идут с конца списка, и BULK, переворачивая каждую, вставляет
+    задачи в том же обратном порядке, что и весь список сразу. Строки
+    существуют только для текущей пачки.
+    """
+    for end in range(len(tasks), 0, -cfg.BULK_BATCH_SIZE):
+        yield [task.to_row() for task in
+               tasks[max(0, end - cfg.BULK_BATCH_SIZE):end]]
+
+
+async def upsert_tasks(tasks: list) -> dict:
+    """Запись TaskRecord пачками через ON CONFLICT (problem_key).
+
+    Возвращает статистику тем только вставленных, а не обновлённых задач.
+    """
+    tag_stats: dict = {}
+    for rows in get_row_batches(tasks):
+        inserted: list = await send_request_to_db(
+            cfg.FILLING_TASKS_TABLE_BULK_SQL_QUERY, 'BULK', rows)
+        for pair, count in get_tag_stats(inserted).items():
+            tag_stats[pair] = tag_stats.get(pair, 0) + count
+    return tag_stats
 
 
 async def filling_table(table_name: str, content: list) -> None:
-    log.info('Внесение данных в таблицу')
+    """Пакетная запись строк таблицы, для tasks - списка TaskRecord."""
+    calls_log.info('Внесение данных в таблицу')
 
     if table_name == 'tasks':
-        sql_query = cfg.FILLING_TASKS_TABLE_SQL_QUERY
+        sql_query = cfg.FILLING_TASKS_TABLE_BULK_SQL_QUERY
     elif table_name == 'contests':
-        sql_query = cfg.FILLING_CONTESTS_TABLE_SQL_QUERY
+        sql_query = cfg.FILLING_CONTESTS_TABLE_BULK_SQL_QUERY
+    elif table_name == 'contests_shadow':
+        sql_query = cfg.FILLING_CONTESTS_SHADOW_TABLE_BULK_SQL_QUERY
+    elif table_name == 'contest_tasks':
+        sql_query = cfg.FILLING_CONTEST_TASKS_TABLE_BULK_SQL_QUERY
+    elif table_name == 'contest_tasks_shadow':
+        sql_query = cfg.FILLING_CONTEST_TASKS_SHADOW_TABLE_BULK_SQL_QUERY
+    elif table_name == 'tag_stats':
+        sql_query = cfg.FILLING_TAG_STATS_TABLE_BULK_SQL_QUERY
     else:
         raise custom_exceptions.UnknownTableName('Неизвестная таблица')
-    await send_request_to_db(sql_query, 'POST', content)
-    connection.commit()
+    if not content:
+        return
 
+    async with transaction():
+        if table_name != 'tasks':
+            await send_request_to_db(sql_query, 'BULK', content)
+            return
+        # Статистика растёт только на вставленные задачи: уже записанные
+        # повторно присланные задачи лишь обновляются
+        tag_stats: dict = await upsert_tasks(content)
+        if tag_stats:
+            calls_log.info('Обновление статистики тем и сложностей')
+            await send_request_to_db(
+                cfg.FILLING_TAG_STATS_TABLE_BULK_SQL_QUERY, 'BULK',
+                [(*pair, count) for pair, count in tag_stats.items()]
+            )
 
-async def get_last_record_from_table() -> str:
-    log.info('Получение последней записи из таблицы')
-    data: list = await send_request_to_db(
-        """
-        SELECT name_and_number FROM tasks
-        ORDER BY id DESC LIMIT 1;
-        """, 'GET'
+
+def split_contests(contests: list, contest_ids: list) -> tuple:
+    """Строки таблиц contests и contest_tasks для построенных контестов.
+
+    contest_ids - выданные id по возрастанию. Как и при прежней записи
+    в обратном порядке, последний построенный контест получает
+    наименьший id. Позиции задач в контесте начинаются с 1.
+    """
+    contest_rows: list = []
+    contest_task_rows: list = []
+    for contest_id, (contest_num, utag, urating, data) in zip(
+            contest_ids[::-1], contests):
+        contest_rows.append((contest_id, contest_num, utag, urating))
+        contest_task_rows.extend(
+            (contest_id, task[0], position)
+            for position, task in enumerate(data, 1)
+        )
+    return contest_rows, contest_task_rows
+
+
+async def save_contests(contests: list, shadow: bool = False) -> None:
+    if not contests:
+        return
+
+    contest_ids: list = sorted(
+        row[0] for row in await send_request_to_db(
+            cfg.RESERVE_CONTEST_IDS_SQL_QUERY, 'GET', (len(contests),))
     )
-    return data[0]
+    contest_rows, contest_task_rows = split_contests(contests, contest_ids)
+    suffix: str = '_shadow' if shadow else ''
+    async with transaction():
+        await filling_table(f'contests{suffix}', contest_rows)
+        await filling_table(f'contest_tasks{suffix}', contest_task_rows)
+
+
+async def get_last_task_id() -> int:
+    calls_log.info('Получение последнего идентификатора задачи')
+    data: list = await send_request_to_db(cfg.LAST_TASK_ID_SQL_QUERY, 'GET')
+    return int(*data[0])
 
 
 async def get_count_of_records_in_table(table_name: str) -> int:
-    log.info(f'Получение количества записей в таблице {table_name}')
+    calls_log.info(f'Получение количества записей в таблице {table_name}')
+    if table_name not in cfg.COUNTED_TABLES:
+        raise custom_exceptions.UnknownTableName('Неизвестная таблица')
     data: list = await send_request_to_db(
         f'SELECT count(*) FROM {table_name}', 'GET')
     return int(*data[0])
@@ -160,66 +625,76 @@ async def check_tokens() -> bool:
     )
 
 
-async def get_unique_tags_and_rating() -> tuple:
-    log.info('Запрос тем и рейтингов из базы')
-    tags_ratings: list = await send_request_to_db(
-        'SELECT tags, rating FROM tasks;', 'GET')
+def get_tag_stats(tags_ratings: Iterable[tuple]) -> dict:
+    """Число задач по парам тема/сложность за один проход.
 
-    unique_tags: list = []
-    unique_rating: list = []
+    Повторы темы внутри задачи (разные английские темы с одним переводом)
+    считаются один раз.
+    """
+    tag_stats: dict = {}
+    for tags, rating in tags_ratings:
+        for tag in set(tags):
+            tag_stats[(tag, rating)] = tag_stats.get((tag, rating), 0) + 1
+    return tag_stats
 
-    log.info('Подготовка данных, поиск уникальных тем и сложностей задач')
-    for tags_tuple in tqdm(tags_ratings):
-        for tag in tags_tuple[0]:
-            if tag not in unique_tags:
-                unique_tags.append(tag)
-        if tags_tuple[1] not in unique_rating:
-            unique_rating.append(tags_tuple[1])
 
-    return sorted(unique_tags), sorted(unique_rating)
-
-
-async def get_contests(unique_tags: list, unique_rating: list) -> list:
-    log.info('Запрос всех задач из базы')
-    tasks: list = await send_request_to_db(
-        """
-        SELECT tags, count_solved, name_and_number, rating FROM tasks;
-        """, 'GET'
-    )
+def build_contests(tasks: list, tag_stats: dict) -> list:
+    """Жадное построение контестов в памяти.
 
+    tasks - строки таблицы tasks (id, tags, count_solved, name_and_number,
+    rating), отсортированные по id, tag_stats - число задач по парам
+    тема/сложность. Порядок выдачи совпадает с прежним вариантом на
+    SQL-запросах: темы от редких к частым, сложности по возрастанию,
+    в каждой паре тема/сложность задачи по возрастанию id.
+    """
     log.info(
         'Подсчёт, как часто встречается тема и сортировка по неубыванию'
     )
     tag_meet_frequency: dict = {}
-    for utag in tqdm(unique_tags):
-        for task in tasks:
-            if utag in task[0]:
-                tag_meet_frequency[utag] = tag_meet_frequency.get(utag, 0) + 1
-    asc_sorted_tags: dict = {k: v for k, v in sorted(
-        tag_meet_frequency.items(), key=lambda item: item[1]
-    )}
+    tag_ratings: dict = {}
+    for (utag, urating), count in tag_stats.items():
+        tag_meet_frequency[utag] = tag_meet_frequency.get(utag, 0) + count
+        tag_ratings.setdefault(utag, []).append(urating)
+    for ratings in tag_ratings.values():
+        ratings.sort()
+    asc_sorted_tags: list = sorted(
+        sorted(tag_meet_frequency), key=tag_meet_frequency.get)
+
+    calls_log.info('Построение индекса тема/сложность -> задачи')
+    tasks_index: dict = {}
+    for task in tqdm(tasks, disable=not cfg.VERBOSE):
+        for tag in dict.fromkeys(task[1]):
+            tasks_index.setdefault((tag, task[4]), []).append(task)
+    missing: list = [pair for pair in tag_stats if pair not in tasks_index]
+    if missing:
+        log.warning(
+            f'Пар тема/сложность из tag_stats нет среди задач: {missing}')
 
     contests: list = []
-    given_tasks_ids: list[str] = ['0']
+    taken: bytearray = bytearray(
+        max((task[0] for task in tasks), default=0) + 1)
+    bucket_positions: dict = {}
     contest_num: int = 0
-    sorted_unique_tags_copy: list = list(asc_sorted_tags.keys())
+    sorted_unique_tags_copy: list = asc_sorted_tags
 
-    log.info('Создание контестов')
+    calls_log.info('Создание контестов')
     while sorted_unique_tags_copy:
-        for utag in tqdm(sorted_unique_tags_copy):
+        for utag in tqdm(sorted_unique_tags_copy, disable=not cfg.VERBOSE):
             empty: bool = True
-            for urating in unique_rating:
-                data: list = await send_request_to_db(
-                    f"""
-                    SELECT * FROM tasks WHERE '{utag}'=ANY(tags)
-                    AND rating={urating}
-                    AND id not in ({', '.join(given_tasks_ids)}) LIMIT 10;
-                    """, 'GET'
-                )
+            for urating in tag_ratings[utag]:
+                bucket: list = tasks_index.get((utag, urating), [])
+                position: int = bucket_positions.get((utag, urating), 0)
+                data: list = []
+                while (position < len(bucket)
+                       and len(data) < cfg.CONTEST_SIZE):
+                    if not taken[bucket[position][0]]:
+                        data.append(bucket[position])
+                    position += 1
+                bucket_positions[(utag, urating)] = position
                 if data:
                     empty = False
                     for task in data:
-                        given_tasks_ids.append(str(task[0]))
+                        taken[task[0]] = 1
                     contests.append((contest_num, utag, urating, data))
             if empty:
                 sorted_unique_tags_copy.remove(utag)
@@ -228,30 +703,279 @@ async def get_contests(unique_tags: list, unique_rating: list) -> list:
     return contests
 
 
+async def get_contests() -> list:
+    calls_log.info('Запрос всех задач и статистики тем из базы')
+    tasks, tag_stats = await asyncio.gather(
+        send_request_to_db(cfg.TASKS_SQL_QUERY, 'GET'),
+        send_request_to_db(cfg.TAG_STATS_SQL_QUERY, 'GET'),
+    )
+    with metrics.timer('parser_stage_seconds', stage='contest_build'):
+        return build_contests(
+            tasks, {(tag, rating): count for tag, rating, count in tag_stats})
+
+
+def plan_contests_extension(
+        new_tasks: list, tag_meet_frequency: dict, last_contests: dict
+) -> tuple:
+    """Распределение новых задач по контестам без перестроения.
+
+    new_tasks - новые строки таблицы tasks по возрастанию id,
+    last_contests - {(тема, сложность): (id, номер, последняя позиция)}
+    последних контестов каждой пары. Пары обходятся в том же порядке, что
+    и при полном построении: темы от редких к частым, сложности по
+    возрастанию. Сначала дополняется последний неполный контест пары,
+    остаток уходит в новые контесты со следующими номерами. Возвращает
+    строки contest_tasks для дополнения и список новых контестов.
+    """
+    tasks_index: dict = {}
+    for task in new_tasks:
+        for tag in dict.fromkeys(task[1]):
+            tasks_index.setdefault((tag, task[4]), []).append(task)
+
+    extended_contests: list = []
+    new_contests: list = []
+    taken: set = set()
+    for utag, urating in sorted(
+            tasks_index,
+            key=lambda key: (tag_meet_frequency.get(key[0], 0), *key)):
+        data: list = [
+            task for task in tasks_index[(utag, urating)]
+            if task[0] not in taken
+        ]
+        taken.update(task[0] for task in data)
+        contest_id, contest_num, size = last_contests.get(
+            (utag, urating), (None, -1, cfg.CONTEST_SIZE))
+
+        free_places: int = cfg.CONTEST_SIZE - size
+        if data and free_places > 0:
+            extended_contests.extend(
+                (contest_id, task[0], position)
+                for position, task in enumerate(data[:free_places], size + 1)
+            )
+            data = data[free_places:]
+        for i in range(0, len(data), cfg.CONTEST_SIZE):
+            contest_num += 1
+            new_contests.append(
+                (contest_num, utag, urating, data[i:i + cfg.CONTEST_SIZE]))
+
+    return extended_contests, new_contests
+
+
+async def extend_contests(last_task_id: int) -> None:
+    log.info('Дополнение контестов новыми задачами')
+    new_tasks: list = await send_request_to_db(
+        cfg.NEW_TASKS_SQL_QUERY, 'GET', (last_task_id,))
+    if not new_tasks:
+        return
+
+    tag_meet_frequency: dict = dict(
+        await send_request_to_db(cfg.TAG_FREQUENCY_SQL_QUERY, 'GET'))
+    last_contests: dict = {
+        (tag, rating): (contest_id, contest_num, size)
+        for contest_id, contest_num, tag, rating, size in
+        await send_request_to_db(cfg.LAST_CONTESTS_SQL_QUERY, 'GET')
+    }
+    with metrics.timer('parser_stage_seconds', stage='contest_build'):
+        extended_contests, new_contests = plan_contests_extension(
+            new_tasks, tag_meet_frequency, last_contests)
+
+    log.info(
+        'Дополнено контестов - '
+        f'{len({row[0] for row in extended_contests})}, '
+        f'новых контестов - {len(new_contests)}'
+    )
+    async with transaction():
+        await filling_table('contest_tasks', extended_contests)
+        await save_contests(new_contests)
+        await publish_event(
+            cfg.CONTESTS_CHANNEL, mode='extended',
+            contests=len(new_contests)
+        )
+
+
+async def rebuild_contests() -> None:
+    """Полное перестроение контестов.
+
+    Чтение задач идёт параллельно через пул, а заполнение теневой таблицы
+    и замена содержимого contests - одной транзакцией на одном соединении,
+    так как теневая таблица временная.
+    """
+    contests: list = await get_contests()
+
+    log.info('Построение контестов в теневой таблице')
+    async with transaction():
+        await send_request_to_db(
+            cfg.CONTEST_SHADOW_TABLE_MAKE_SQL_QUERY, 'POST')
+        await save_contests(contests, shadow=True)
+        log.info('Замена содержимого таблицы контестов')
+        await send_request_to_db(cfg.CONTEST_SHADOW_SWAP_SQL_QUERY, 'POST')
+        await publish_event(
+            cfg.CONTESTS_CHANNEL, mode='rebuilt', contests=len(contests))
+
+
+def get_poll_delay(
+        contest_hours: bool, next_contest_in: float,
+        unchanged_cycles: int) -> float:
+    """Пауза до следующего опроса API.
+
+    Во время контестов и cfg.CONTEST_POLL_WINDOW после них опрос идёт
+    каждые cfg.POLL_INTERVAL_CONTEST секунд. Иначе пауза удваивается с
+    каждым циклом без изменений от cfg.POLL_INTERVAL_MIN до
+    cfg.POLL_INTERVAL_MAX, но не дольше, чем до начала ближайшего
+    контеста.
+    """
+    if contest_hours:
+        return cfg.POLL_INTERVAL_CONTEST
+    delay: float = min(
+        cfg.POLL_INTERVAL_MIN * 2 ** min(unchanged_cycles, 16),
+        cfg.POLL_INTERVAL_MAX
+    )
+    if next_contest_in is not None:
+        delay = min(delay, max(next_contest_in, cfg.POLL_INTERVAL_CONTEST))
+    return delay
+
+
+async def get_next_poll_delay(unchanged_cycles: int) -> float:
+    try:
+        (contest_hours, next_contest_in), = await send_request_to_db(
+            cfg.CONTEST_HOURS_SQL_QUERY, 'GET', (cfg.CONTEST_POLL_WINDOW,))
+    except (custom_exceptions.SendRequestToDbFailed,
+            custom_exceptions.DbUnavailable) as _error:
+        log.warning(f'Расписание контестов недоступно: {_error}')
+        contest_hours, next_contest_in = False, None
+    return get_poll_delay(contest_hours, next_contest_in, unchanged_cycles)
+
+
+async def table_exists(table_name: str) -> bool:
+    calls_log.info(f'Проверка БД на наличие таблицы {table_name}')
+    response: list = await send_request_to_db(
+        cfg.TABLE_EXISTS_SQL_QUERY, 'GET', (table_name,))
+    return bool(response)
+
+
 async def check_or_create_table(table_name_and_sql_query: tuple) -> None:
     for table_name, sql_query in table_name_and_sql_query:
-        log.info(f'Проверка БД на наличие таблицы {table_name}')
-        response: list = await send_request_to_db(
-            f"""
-            SELECT table_name FROM information_schema.tables
-            WHERE table_name = '{table_name}';
-            """, 'GET'
-        )
-        if not response:
+        if not await table_exists(table_name):
             log.info(
                 f'Таблица {table_name} не найдена, создание новой таблицы')
-            await send_request_to_db(sql_query, 'POST')
-            connection.commit()
-            log.info(f'Таблица {table_name} создана, первичное заполнение')
             if table_name == 'contests':
-                utag_urating: tuple = await get_unique_tags_and_rating()
-                content: list = await get_contests(*utag_urating)
+                await send_request_to_db(sql_query, 'POST')
+                log.info(f'Таблица {table_name} создана, первичное заполнение')
+                await rebuild_contests()
+            elif table_name == 'tag_stats':
+                tags_ratings: list = []
+                if await table_exists('tasks'):
+                    tags_ratings = await send_request_to_db(
+                        cfg.TASK_TAGS_AND_RATINGS_SQL_QUERY, 'GET')
+                async with transaction():
+                    await send_request_to_db(sql_query, 'POST')
+                    log.info(
+                        f'Таблица {table_name} создана, первичное заполнение')
+                    await filling_table(table_name, [
+                        (*pair, count) for pair, count in
+                        get_tag_stats(tags_ratings).items()
+                    ])
             elif table_name == 'tasks':
-                data = await get_json_response()
-                content: list = await get_parse_response(data.get('result'))
+                body_path, cache_meta = await get_response_body({})
+                check_response_status(body_path)
+                # Задачи вставляются в обратном порядке, поэтому в памяти
+                # весь список TaskRecord, а строки - по одной пачке
+                content: list = list(unique_tasks(get_parse_response(
+                    get_problems_from_response(body_path))))
+                async with transaction():
+                    await send_request_to_db(sql_query, 'POST')
+                    log.info(
+                        f'Таблица {table_name} создана, первичное заполнение')
+                    await filling_table(table_name, content)
+                save_response_cache(body_path, cache_meta)
             else:
                 raise custom_exceptions.UnknownTableName('Неизвестная таблица')
-            await filling_table(table_name, content)
+
+
+async def apply_migrations() -> None:
+    log.info('Проверка миграций схемы')
+    await send_request_to_db(
+        cfg.SCHEMA_MIGRATIONS_TABLE_MAKE_SQL_QUERY, 'POST')
+    applied: set = {
+        name for name, in await send_request_to_db(
+            cfg.APPLIED_MIGRATIONS_SQL_QUERY, 'GET')
+    }
+    for name, sql_query in cfg.MIGRATIONS:
+        if name in applied:
+            continue
+        log.info(f'Применение миграции {name}')
+        async with transaction():
+            await send_request_to_db(sql_query, 'POST')
+            await send_request_to_db(
+                cfg.SAVE_MIGRATION_SQL_QUERY, 'POST', [(name,)])
+
+
+async def prepare_database() -> None:
+    """Таблицы с первым заполнением, миграции и отпечатки задач."""
+    await check_or_create_table(cfg.TABLES_MAKE_SQL_QUERIES)
+    await apply_migrations()
+    await load_task_fingerprints()
+    tasks_in_db_count: int = await get_count_of_records_in_table('tasks')
+    log.info(f'Задач в таблице - {tasks_in_db_count}')
+    log.info(
+        f"""Контестов в таблице - {await get_count_of_records_in_table(
+                                                            "contests")}"""
+    )
+
+
+async def retry_while_db_unavailable(make_request):
+    """Результат make_request(), повторяемого, пока недоступен PostgreSQL.
+
+    Повторяется только работа с БД: загруженный ответ API остаётся на
+    диске и разбирается заново, без новых запросов к Codeforces.
+    """
+    while True:
+        try:
+            return await make_request()
+        except custom_exceptions.DbUnavailable as _error:
+            metrics.inc('parser_db_retries_total')
+            log.warning(
+                f'PostgreSQL недоступен ({_error}), повтор записи через '
+                f'{cfg.DB_RECONNECT_DELAY} с'
+            )
+            await asyncio.sleep(cfg.DB_RECONNECT_DELAY)
+
+
+async def run_cycle(cache_meta: dict) -> tuple:
+    """Один цикл опроса: запрос к API, разбор и запись изменений.
+
+    Возвращает метаданные применённого ответа и признак изменений.
+    """
+    log.info('------------Вход в цикл-------------------------')
+    cycle_started: float = time.perf_counter()
+    with metrics.timer('parser_stage_seconds', stage='fetch'):
+        (body_path, response_meta), _ = await asyncio.gather(
+            get_response_body(cache_meta), sync_codeforces_data())
+    log.info('Сравнение хэша ответа с последним применённым')
+
+    changed: bool = False
+    if body_path is None or (
+            response_meta['sha256'] == cache_meta.get('sha256')):
+        log.info('Ответ не изменился, парсинг пропущен')
+    else:
+        log.info('Ответ изменился, начинаем парсить ответ')
+        check_response_status(body_path)
+        changed = await retry_while_db_unavailable(
+            lambda: sync_tasks(get_parse_response(
+                get_problems_from_response(body_path)))
+        )
+        save_response_cache(body_path, response_meta)
+        cache_meta = response_meta
+        if changed:
+            await retry_while_db_unavailable(write_snapshot)
+    metrics.observe(
+        'parser_stage_seconds', time.perf_counter() - cycle_started,
+        stage='cycle'
+    )
+    metrics.inc(
+        'parser_cycles_total', result='changed' if changed else 'unchanged')
+    log.info(f'Время запросов к БД: {queries.format_timings()}')
+    return cache_meta, changed
 
 
 async def main() -> None:
@@ -266,54 +990,30 @@ async def main() -> None:
         log.info(message)
         await send_message_to_tg(message)
 
-        global connection
-        connection = connect_to_db()
-        await check_or_create_table(
-            (
-                ('tasks', cfg.TASK_TABLE_MAKE_SQL_QUERY),
-                ('contests', cfg.CONTEST_TABLE_MAKE_SQL_QUERY),
-            ),
-
-        )
-        tasks_in_db_count: int = await get_count_of_records_in_table('tasks')
-        log.info(f'Задач в таблице - {tasks_in_db_count}')
-        log.info(
-            f"""Контестов в таблице - {await get_count_of_records_in_table(
-                                                                "contests")}"""
-        )
+        global pool, fetcher, metrics_runner
+        if cfg.METRICS_PORT:
+            metrics_runner = await start_metrics_server(
+                cfg.METRICS_HOST, cfg.METRICS_PORT)
+        pool = await create_db_pool()
+        fetcher = CodeforcesFetcher()
+        await prepare_database()
+        await write_snapshot()
 
+        cache_meta: dict = load_response_cache()
+        unchanged_cycles: int = 0
         while True:
             try:
-                log.info('------------Вход в цикл-------------------------')
-                data = await get_json_response()
-                json_response: dict = data.get('result')
-                tasks_response_count: int = len(json_response.get('problems'))
-                log.info('Сравнение количества записей в БД и в ответе')
-
-                if tasks_response_count != tasks_in_db_count:
-                    log.info(
-                        f"""Количество записей в БД и в ответе не равно
-                        ({tasks_in_db_count}!={tasks_response_count}),
-                        начинаем парсить ответ"""
-                        )
-                    await adding_tasks_in_table(
-                       await get_last_record_from_table(),
-                       await get_parse_response(json_response)
-                    )
-                    tasks_in_db_count = tasks_response_count
-                else:
-                    log.info(
-                        'Количество записей в бд и ответе равно {}=={}'.format(
-                            tasks_in_db_count, tasks_response_count
-                        )
-                    )
+                cache_meta, changed = await run_cycle(cache_meta)
+                unchanged_cycles = 0 if changed else unchanged_cycles + 1
 
             except Exception as _error:
                 raise custom_exceptions.ErrorInCycle(_error)
 
             else:
-                log.info('Ожидание - 1 час')
-                await asyncio.sleep(cfg.RETRY_TIME)
+                delay: float = await get_next_poll_delay(unchanged_cycles)
+                metrics.set('parser_poll_delay_seconds', delay)
+                log.info(f'Ожидание - {delay / 60:.0f} мин')
+                await asyncio.sleep(delay)
 
     except custom_exceptions.NotForSend as _error:
         message = f'Бот упал с ошибкой:\n {_error}\n'
@@ -325,9 +1025,14 @@ async def main() -> None:
         await send_message_to_tg(message)
 
     finally:
-        if connection:
-            connection.close()
-            log.info('Завершение работы. Соединение с PostgreSQL закрыто')
+        if fetcher:
+            await fetcher.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if pool:
+            pool.close()
+            await pool.wait_closed()
+            log.info('Завершение работы. Соединения с PostgreSQL закрыты')
 
 
 if __name__ == '__main__':
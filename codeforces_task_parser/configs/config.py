@@ -9,33 +9,361 @@ from dotenv import load_dotenv
 # Activate for Windows
 # asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-ENDPOINT: str = 'https://codeforces.com/api/problemset.problems?lang=ru'
-RETRY_TIME: int = 3600
+# Интервал опроса API: чаще во время контестов и несколько часов после
+# них, когда в архив добавляются задачи; вдвое реже после каждого цикла
+# без изменений, но не позже начала ближайшего контеста
+POLL_INTERVAL_CONTEST: int = 300
+POLL_INTERVAL_MIN: int = 900
+POLL_INTERVAL_MAX: int = 4 * 3600
+CONTEST_POLL_WINDOW: int = 6 * 3600   # секунд после окончания контеста
+CONTEST_SIZE: int = 10
+BULK_BATCH_SIZE: int = 1000   # строк в одном INSERT ... VALUES
+# Новые задачи дополняют контесты, иначе контесты перестраиваются целиком
+CONTESTS_INCREMENTAL: bool = True
 
 load_dotenv()
+API_URL: str = os.getenv('CODEFORCES_API_URL', 'https://codeforces.com/api')
+# Codeforces разрешает не больше одного запроса к API в 2 секунды
+API_MIN_INTERVAL: float = float(os.getenv('CODEFORCES_API_MIN_INTERVAL', 2.0))
+API_MAX_CONCURRENCY: int = 2
+API_TIMEOUT: float = 60.0
+API_RETRY_ATTEMPTS: int = 5
+API_RETRY_DELAY: float = 2.0   # базовая задержка, удваивается с попыткой
+API_CONNECTIONS_LIMIT: int = 4
+# Последний применённый ответ API и его метаданные (хэш, ETag)
+RESPONSE_CACHE_BODY_PATH: str = ''.join(
+    (os.path.dirname(os.getcwd()), '/cache/problemset.json'))
+RESPONSE_CACHE_META_PATH: str = ''.join(
+    (os.path.dirname(os.getcwd()), '/cache/problemset.meta.json'))
+# Английские названия задач, разбираются потоково как и основной ответ
+EN_PROBLEMSET_PATH: str = ''.join(
+    (os.path.dirname(os.getcwd()), '/cache/problemset.en.json'))
+RESPONSE_CHUNK_SIZE: int = 64 * 1024
+# Снимок представлений бота (темы, сложности, контесты и их задачи).
+# Пустой путь - снимок не пишется, бот читает данные из PostgreSQL
+SNAPSHOT_PATH: str = os.getenv('SNAPSHOT_PATH', '')
 TELEGRAM_CHAT_ID: str = os.getenv('TELEGRAM_CHAT_ID')
 TELEGRAM_TOKEN: str = os.getenv('TELEGRAM_TOKEN')
-USER = DB_NAME = PASSWORD = 'postgres'
-HOST: str = 'db'   # localhost для локального запуска # db для докера
-PORT: int = 5432
+# VERBOSE=0 для рабочего запуска: без полос tqdm и сообщений о каждом
+# вызове. Метрики отдаются на http://METRICS_HOST:METRICS_PORT/metrics,
+# METRICS_PORT=0 - сервер метрик не запускается
+VERBOSE: bool = os.getenv('VERBOSE', '1') != '0'
+METRICS_HOST: str = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT: int = int(os.getenv('METRICS_PORT', 9101))
+USER = PASSWORD = 'postgres'
+DB_NAME: str = os.getenv('DB_NAME', 'postgres')
+# localhost для локального запуска db для докера
+HOST: str = os.getenv('DB_HOST', 'db')
+PORT: int = int(os.getenv('DB_PORT', 5432))
+DB_POOL_MIN_SIZE: int = 1
+DB_POOL_MAX_SIZE: int = 5
+DB_TIMEOUT: float = 60.0   # секунд на запрос и получение соединения
+DB_RECONNECT_ATTEMPTS: int = 5
+DB_RECONNECT_DELAY: int = 5
 
 CONTEST_TABLE_MAKE_SQL_QUERY: str = """
 CREATE TABLE contests(id SERIAL PRIMARY KEY, number int NOT NULL,
-tag varchar(255) NOT NULL, rating int NOT NULL, tasks varchar(255)[] NOT NULL);
+tag varchar(255) NOT NULL, rating int NOT NULL);
+CREATE TABLE IF NOT EXISTS contest_tasks(
+contest_id int NOT NULL REFERENCES contests(id) ON DELETE CASCADE,
+task_id int NOT NULL REFERENCES tasks(id), position int NOT NULL,
+PRIMARY KEY (contest_id, position));
+CREATE SEQUENCE IF NOT EXISTS data_version;
 """
 TASK_TABLE_MAKE_SQL_QUERY: str = """
 CREATE TABLE tasks(id SERIAL PRIMARY KEY,
 tags varchar(255)[] NOT NULL, count_solved int NOT NULL,
-name_and_number varchar(255)[2] NOT NULL,rating int);
+name_and_number varchar(255)[2] NOT NULL,rating int,
+problem_key varchar(255) GENERATED ALWAYS AS (name_and_number[2]) STORED,
+CONSTRAINT tasks_problem_key_idx UNIQUE (problem_key));
 """
+TAG_STATS_TABLE_MAKE_SQL_QUERY: str = """
+CREATE TABLE tag_stats(tag varchar(255) NOT NULL, rating int NOT NULL,
+tasks_count int NOT NULL, PRIMARY KEY (tag, rating));
+"""
+# Таблицы в порядке создания: tag_stats заполняется вместе с tasks,
+# contests строятся по уже записанным задачам
+TABLES_MAKE_SQL_QUERIES: tuple = (
+    ('tag_stats', TAG_STATS_TABLE_MAKE_SQL_QUERY),
+    ('tasks', TASK_TABLE_MAKE_SQL_QUERY),
+    ('contests', CONTEST_TABLE_MAKE_SQL_QUERY),
+)
 FILLING_TASKS_TABLE_SQL_QUERY: str = """
 INSERT INTO tasks (tags, count_solved, name_and_number, rating)
 VALUES (%s, %s, %s, %s);
 """
 FILLING_CONTESTS_TABLE_SQL_QUERY: str = """
-INSERT INTO contests (number, tag, rating, tasks)
-VALUES (%s, %s, %s, %s);
+INSERT INTO contests (id, number, tag, rating) VALUES (%s, %s, %s, %s);
+"""
+FILLING_CONTEST_TASKS_TABLE_SQL_QUERY: str = """
+INSERT INTO contest_tasks (contest_id, task_id, position) VALUES (%s, %s, %s);
+"""
+# Возвращает темы и сложность только вставленных, а не обновлённых задач
+FILLING_TASKS_TABLE_BULK_SQL_QUERY: str = """
+WITH upserted AS (
+INSERT INTO tasks (tags, count_solved, name_and_number, rating) VALUES %s
+ON CONFLICT (problem_key) DO UPDATE SET tags = EXCLUDED.tags,
+count_solved = EXCLUDED.count_solved,
+name_and_number = EXCLUDED.name_and_number, rating = EXCLUDED.rating
+RETURNING tags, rating, xmax = 0 AS inserted
+)
+SELECT tags, rating FROM upserted WHERE inserted;
+"""
+TASK_FINGERPRINTS_SQL_QUERY: str = """
+SELECT tags, count_solved, name_and_number, rating FROM tasks;
+"""
+FILLING_CONTESTS_TABLE_BULK_SQL_QUERY: str = """
+INSERT INTO contests (id, number, tag, rating) VALUES %s;
+"""
+FILLING_CONTEST_TASKS_TABLE_BULK_SQL_QUERY: str = """
+INSERT INTO contest_tasks (contest_id, task_id, position) VALUES %s;
+"""
+FILLING_TAG_STATS_TABLE_BULK_SQL_QUERY: str = """
+INSERT INTO tag_stats (tag, rating, tasks_count) VALUES %s
+ON CONFLICT (tag, rating)
+DO UPDATE SET tasks_count = tag_stats.tasks_count + EXCLUDED.tasks_count;
+"""
+FILLING_CONTESTS_SHADOW_TABLE_BULK_SQL_QUERY: str = """
+INSERT INTO contests_shadow (id, number, tag, rating) VALUES %s;
+"""
+FILLING_CONTEST_TASKS_SHADOW_TABLE_BULK_SQL_QUERY: str = """
+INSERT INTO contest_tasks_shadow (contest_id, task_id, position) VALUES %s;
+"""
+# id контестов выдаются заранее, чтобы сразу записать их задачи
+RESERVE_CONTEST_IDS_SQL_QUERY: str = """
+SELECT nextval('contests_id_seq') FROM generate_series(1, %s::int);
+"""
+CONTEST_SHADOW_TABLE_MAKE_SQL_QUERY: str = """
+DROP TABLE IF EXISTS contests_shadow;
+DROP TABLE IF EXISTS contest_tasks_shadow;
+CREATE TEMP TABLE contests_shadow (LIKE contests INCLUDING DEFAULTS);
+CREATE TEMP TABLE contest_tasks_shadow (LIKE contest_tasks);
+"""
+# DELETE и INSERT в одной транзакции: читатели видят старые контесты
+# до коммита и не блокируются, в отличие от DROP/RENAME таблицы
+CONTEST_SHADOW_SWAP_SQL_QUERY: str = """
+DELETE FROM contest_tasks;
+DELETE FROM contests;
+INSERT INTO contests SELECT * FROM contests_shadow;
+INSERT INTO contest_tasks SELECT * FROM contest_tasks_shadow;
+DROP TABLE contests_shadow;
+DROP TABLE contest_tasks_shadow;
+"""
+# События для бота: канал - имя события, данные - JSON с номером версии
+# из data_version. Уведомление доставляется после коммита транзакции
+TASKS_CHANNEL: str = 'tasks_updated'
+CONTESTS_CHANNEL: str = 'contests_rebuilt'
+# Снимок записан; версия в данных - версия данных, по которой он собран
+SNAPSHOT_CHANNEL: str = 'snapshot_written'
+SNAPSHOT_NOTIFY_SQL_QUERY: str = 'SELECT pg_notify(%s, %s);'
+PUBLISH_EVENT_SQL_QUERY: str = """
+WITH event AS (SELECT nextval('data_version') AS version)
+SELECT version, pg_notify(
+%s, (jsonb_build_object('version', version) || %s::jsonb)::text
+) FROM event;
+"""
+FILLING_CODEFORCES_CONTESTS_TABLE_BULK_SQL_QUERY: str = """
+INSERT INTO codeforces_contests
+(id, name, name_en, phase, start_time, duration)
+VALUES %s ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name,
+name_en = EXCLUDED.name_en, phase = EXCLUDED.phase,
+start_time = EXCLUDED.start_time, duration = EXCLUDED.duration
+WHERE (codeforces_contests.name, codeforces_contests.name_en,
+codeforces_contests.phase, codeforces_contests.start_time,
+codeforces_contests.duration)
+IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.name_en, EXCLUDED.phase,
+EXCLUDED.start_time, EXCLUDED.duration);
+"""
+FILLING_PROBLEM_NAMES_TABLE_BULK_SQL_QUERY: str = """
+INSERT INTO problem_names (problem_key, name_en) VALUES %s
+ON CONFLICT (problem_key) DO UPDATE SET name_en = EXCLUDED.name_en
+WHERE problem_names.name_en IS DISTINCT FROM EXCLUDED.name_en;
 """
+TAG_STATS_RECOUNT_SQL_QUERY: str = """
+DELETE FROM tag_stats;
+INSERT INTO tag_stats (tag, rating, tasks_count)
+SELECT tag, rating, count(*) FROM tasks,
+LATERAL (SELECT DISTINCT unnest(tags) AS tag) AS task_tags
+GROUP BY tag, rating;
+"""
+LAST_TASK_ID_SQL_QUERY: str = 'SELECT COALESCE(max(id), 0) FROM tasks;'
+TASKS_SQL_QUERY: str = """
+SELECT id, tags, count_solved, name_and_number, rating FROM tasks ORDER BY id;
+"""
+NEW_TASKS_SQL_QUERY: str = """
+SELECT id, tags, count_solved, name_and_number, rating FROM tasks
+WHERE id > %s ORDER BY id;
+"""
+TASK_TAGS_AND_RATINGS_SQL_QUERY: str = 'SELECT tags, rating FROM tasks;'
+TAG_STATS_SQL_QUERY: str = 'SELECT tag, rating, tasks_count FROM tag_stats;'
+TABLE_EXISTS_SQL_QUERY: str = """
+SELECT table_name FROM information_schema.tables WHERE table_name = %s;
+"""
+# Таблицы, число записей в которых выводится в лог при запуске
+COUNTED_TABLES: tuple = ('tasks', 'contests')
+TAG_FREQUENCY_SQL_QUERY: str = """
+SELECT tag, sum(tasks_count)::int FROM tag_stats GROUP BY tag;
+"""
+LAST_CONTESTS_SQL_QUERY: str = """
+SELECT DISTINCT ON (tag, rating) id, number, tag, rating, (
+    SELECT COALESCE(max(position), 0) FROM contest_tasks
+    WHERE contest_id = contests.id
+) FROM contests ORDER BY tag, rating, number DESC;
+"""
+# Идёт ли контест (с окном после окончания) и через сколько секунд
+# начнётся ближайший
+CONTEST_HOURS_SQL_QUERY: str = """
+SELECT EXISTS (
+    SELECT 1 FROM codeforces_contests WHERE start_time <= now()
+    AND start_time + make_interval(secs => COALESCE(duration, 0) + %s)
+    > now()
+), (
+    SELECT extract(epoch FROM min(start_time) - now())::float
+    FROM codeforces_contests WHERE start_time > now()
+);
+"""
+DATA_VERSION_SQL_QUERY: str = """
+SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM data_version;
+"""
+# Порядок строк снимка совпадает с запросами бота: темы - по правилам
+# сортировки базы, контесты - по id, задачи контеста - по позиции.
+# Пары тема/сложность берутся из contests, как в /tags и /ratings бота
+SNAPSHOT_TAG_STATS_SQL_QUERY: str = """
+SELECT DISTINCT tag, rating FROM contests ORDER BY tag, rating;
+"""
+SNAPSHOT_CONTESTS_SQL_QUERY: str = """
+SELECT id, number, tag, rating FROM contests ORDER BY id;
+"""
+SNAPSHOT_CONTEST_TASKS_SQL_QUERY: str = """
+SELECT contest_tasks.contest_id, tasks.id, array_to_string(tasks.tags, ', '),
+tasks.count_solved, tasks.name_and_number[1], tasks.name_and_number[2],
+tasks.rating, contest_tasks.position
+FROM contest_tasks JOIN tasks ON tasks.id = contest_tasks.task_id
+ORDER BY contest_tasks.contest_id, contest_tasks.position;
+"""
+
+# Миграции применяются по порядку, каждая один раз в своей транзакции,
+# имена применённых хранятся в schema_migrations
+SCHEMA_MIGRATIONS_TABLE_MAKE_SQL_QUERY: str = """
+CREATE TABLE IF NOT EXISTS schema_migrations(name varchar(255) PRIMARY KEY,
+applied_at timestamp NOT NULL DEFAULT now());
+"""
+APPLIED_MIGRATIONS_SQL_QUERY: str = 'SELECT name FROM schema_migrations;'
+SAVE_MIGRATION_SQL_QUERY: str = """
+INSERT INTO schema_migrations (name) VALUES (%s);
+"""
+MIGRATIONS: tuple = (
+    # Ключ задачи contestId/index. Дубликаты, если они есть, удаляются
+    # с сохранением первой записи. Ссылки на них из contest_tasks и из
+    # строк contests.tasks прежней схемы перед удалением переводятся на
+    # сохранённую запись. Статистика тем пересчитывается
+    ('0001_tasks_problem_key', """
+CREATE TEMP TABLE duplicate_tasks ON COMMIT DROP AS
+SELECT a.id, min(b.id) AS kept_id FROM tasks a JOIN tasks b
+ON a.name_and_number[2] = b.name_and_number[2] AND b.id < a.id
+GROUP BY a.id;
+DO $$
+BEGIN
+    IF to_regclass('contest_tasks') IS NOT NULL THEN
+        UPDATE contest_tasks SET task_id = duplicate_tasks.kept_id
+        FROM duplicate_tasks WHERE contest_tasks.task_id = duplicate_tasks.id;
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'contests' AND column_name = 'tasks'
+    ) THEN
+        UPDATE contests SET tasks = ARRAY(
+            SELECT coalesce(
+                '(' || duplicate_tasks.kept_id
+                || substring(task.value FROM '^[(][0-9]+(,.*)$'),
+                task.value
+            )
+            FROM unnest(contests.tasks) WITH ORDINALITY
+                AS task(value, position)
+            LEFT JOIN duplicate_tasks ON duplicate_tasks.id =
+                substring(task.value FROM '^[(]([0-9]+),')::int
+            ORDER BY task.position
+        );
+    END IF;
+END $$;
+DELETE FROM tasks USING duplicate_tasks WHERE tasks.id = duplicate_tasks.id;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS problem_key varchar(255)
+GENERATED ALWAYS AS (name_and_number[2]) STORED;
+CREATE UNIQUE INDEX IF NOT EXISTS tasks_problem_key_idx
+ON tasks (problem_key);
+DELETE FROM tag_stats;
+INSERT INTO tag_stats (tag, rating, tasks_count)
+SELECT tag, rating, count(*) FROM tasks,
+LATERAL (SELECT DISTINCT unnest(tags) AS tag) AS task_tags
+GROUP BY tag, rating;
+"""),
+    # Поиск задач по теме: tags @> ARRAY[...]
+    ('0002_tasks_tags_gin', """
+CREATE INDEX IF NOT EXISTS tasks_tags_idx ON tasks USING GIN (tags);
+"""),
+    # Контесты пары тема/сложность сразу в порядке id
+    ('0003_contests_tag_rating', """
+CREATE INDEX IF NOT EXISTS contests_tag_rating_idx
+ON contests (tag, rating, id);
+"""),
+    # Задачи контеста из массива строк contests.tasks переносятся в
+    # contest_tasks. id задачи - первое поле каждой строки, строки без
+    # задачи в tasks пропускаются
+    ('0004_contest_tasks', """
+CREATE TABLE IF NOT EXISTS contest_tasks(
+contest_id int NOT NULL REFERENCES contests(id) ON DELETE CASCADE,
+task_id int NOT NULL REFERENCES tasks(id), position int NOT NULL,
+PRIMARY KEY (contest_id, position));
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'contests' AND column_name = 'tasks'
+    ) THEN
+        INSERT INTO contest_tasks (contest_id, task_id, position)
+        SELECT contests.id, tasks.id, task.position
+        FROM contests,
+        unnest(contests.tasks) WITH ORDINALITY AS task(value, position)
+        JOIN tasks
+        ON tasks.id = substring(task.value FROM '^[(]([0-9]+),')::int;
+        ALTER TABLE contests DROP COLUMN tasks;
+    END IF;
+END $$;
+"""),
+    # Данные contest.list на двух языках и английские названия задач
+    ('0005_codeforces_contests', """
+CREATE TABLE IF NOT EXISTS codeforces_contests(id int PRIMARY KEY,
+name varchar(255) NOT NULL, name_en varchar(255), phase varchar(32) NOT NULL,
+start_time timestamptz);
+CREATE TABLE IF NOT EXISTS problem_names(
+problem_key varchar(255) PRIMARY KEY, name_en varchar(255) NOT NULL);
+"""),
+    # Номер версии данных для событий бота и длительность контестов для
+    # расписания опроса
+    ('0006_data_version', """
+CREATE SEQUENCE IF NOT EXISTS data_version;
+ALTER TABLE codeforces_contests ADD COLUMN IF NOT EXISTS duration int;
+"""),
+)
+
+# Запросы, которые выполняются как подготовленные (PREPARE/EXECUTE).
+# Только одиночные запросы без переменного числа строк VALUES
+PREPARED_QUERIES: dict = {
+    'last_task_id': LAST_TASK_ID_SQL_QUERY,
+    'tasks': TASKS_SQL_QUERY,
+    'new_tasks': NEW_TASKS_SQL_QUERY,
+    'task_fingerprints': TASK_FINGERPRINTS_SQL_QUERY,
+    'task_tags_and_ratings': TASK_TAGS_AND_RATINGS_SQL_QUERY,
+    'tag_stats': TAG_STATS_SQL_QUERY,
+    'tag_frequency': TAG_FREQUENCY_SQL_QUERY,
+    'last_contests': LAST_CONTESTS_SQL_QUERY,
+    'publish_event': PUBLISH_EVENT_SQL_QUERY,
+    'contest_hours': CONTEST_HOURS_SQL_QUERY,
+    'reserve_contest_ids': RESERVE_CONTEST_IDS_SQL_QUERY,
+    'table_exists': TABLE_EXISTS_SQL_QUERY,
+    'applied_migrations': APPLIED_MIGRATIONS_SQL_QUERY,
+    'save_migration': SAVE_MIGRATION_SQL_QUERY,
+}
 
 
 def get_logger(logger_name: str, logfile_name: str) -> Logger:
@@ -43,6 +371,10 @@ def get_logger(logger_name: str, logfile_name: str) -> Logger:
     logger: Logger = logging.getLogger(logger_name)
 
     logger.setLevel(logging.INFO)
+    # Сообщения о каждом вызове на частых путях идут в дочерний логгер
+    # {logger_name}.calls и при VERBOSE=0 отключаются
+    logging.getLogger(f'{logger_name}.calls').setLevel(
+        logging.INFO if VERBOSE else logging.WARNING)
 
     stream_handler = logging.StreamHandler(sys.stdout)
     stream_formatter = logging.Formatter(
@@ -23,11 +23,21 @@ class ResponseFromApiWasntRecieved(Exception):
     pass
 
 
+class RetryableApiError(ResponseFromApiWasntRecieved):
+    """Ответ API, после которого запрос стоит повторить."""
+    pass
+
+
 class SendRequestToDbFailed(Exception):
     """Не удалось отправить запрос к базе."""
     pass
 
 
+class DbUnavailable(SendRequestToDbFailed):
+    """Соединение с базой потеряно, запрос можно повторить."""
+    pass
+
+
 class ErrorInCycle(Exception):
     """Ошибка внутри цикла."""
     pass
@@ -0,0 +1,171 @@
+"""Планирование контестов по столбцам задач для прогонов «что если».
+
+Запуск из папки codeforces_task_parser, задачи читаются из PostgreSQL:
+    python -m contest_planner [--size N] [--order id|solved]
+        [--rating-band N]
+
+Выводятся число контестов и выданных задач и распределение контестов
+по размеру. Таблицы не меняются.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+import codeforces_task_parser as parser
+import configs.config as cfg
+
+# Порядок задач внутри пары тема/сложность
+ORDERS: tuple = ('id', 'solved')
+
+
+class ContestPlanner:
+    """Жадное построение контестов на массивах NumPy.
+
+    Задачи хранятся столбцами: id, сложность и число решивших - массивы
+    int64, темы - булева матрица задача x тема над словарём переводов
+    cfg.rus_tags. Задачи темы выбираются маской по её столбцу, за один
+    проход по теме набираются задачи всех её сложностей сразу: пары
+    тема/сложность одной темы не пересекаются. При настройках по
+    умолчанию результат совпадает с build_contests.
+    """
+
+    def __init__(self, tasks: list) -> None:
+        """tasks - строки таблицы tasks (id, tags, count_solved,
+        name_and_number, rating).
+        """
+        self.tasks: list = tasks
+        self.vocabulary: list = sorted(set(cfg.rus_tags.values()))
+        tag_columns: dict = {
+            tag: column for column, tag in enumerate(self.vocabulary)}
+        rows: list = []
+        columns: list = []
+        for row, task in enumerate(tasks):
+            for tag in task[1]:
+                if tag not in tag_columns:
+                    tag_columns[tag] = len(self.vocabulary)
+                    self.vocabulary.append(tag)
+                rows.append(row)
+                columns.append(tag_columns[tag])
+
+        self.ids: np.ndarray = np.fromiter(
+            (task[0] for task in tasks), np.int64, len(tasks))
+        self.count_solved: np.ndarray = np.fromiter(
+            (task[2] for task in tasks), np.int64, len(tasks))
+        self.ratings: np.ndarray = np.fromiter(
+            (task[4] for task in tasks), np.int64, len(tasks))
+        self.tag_matrix: np.ndarray = np.zeros(
+            (len(tasks), len(self.vocabulary)), bool)
+        self.tag_matrix[rows, columns] = True
+
+    def get_task_order(self, order: str) -> np.ndarray:
+        """Номера строк задач в порядке выдачи внутри пары тема/сложность:
+        по возрастанию id или от самых решаемых, при равенстве по id.
+        """
+        if order == 'id':
+            return np.argsort(self.ids, kind='stable')
+        if order == 'solved':
+            return np.lexsort((self.ids, -self.count_solved))
+        raise ValueError(f'Неизвестный порядок задач: {order}')
+
+    def plan(
+            self, size: int = cfg.CONTEST_SIZE, order: str = 'id',
+            rating_band: int = 0) -> list:
+        """Контесты в формате build_contests: (номер круга, тема,
+        сложность, строки задач).
+
+        size - задач в контесте, order - один из ORDERS, rating_band -
+        ширина диапазона сложностей, 0 - каждая сложность отдельно. Для
+        диапазона сложностью контеста считается его нижняя граница.
+        """
+        ratings: np.ndarray = self.ratings
+        if rating_band:
+            ratings = ratings // rating_band * rating_band
+
+        # Задачи темы по возрастанию сложности, внутри сложности - в
+        # порядке выдачи
+        task_order: np.ndarray = self.get_task_order(order)
+        members: dict = {}
+        for column in np.flatnonzero(self.tag_matrix.any(axis=0)):
+            tag_tasks: np.ndarray = task_order[
+                self.tag_matrix[task_order, column]]
+            members[self.vocabulary[column]] = tag_tasks[
+                np.argsort(ratings[tag_tasks], kind='stable')]
+        frequency: dict = {tag: len(rows) for tag, rows in members.items()}
+
+        contests: list = []
+        taken: np.ndarray = np.zeros(len(self.tasks), bool)
+        contest_num: int = 0
+        sorted_unique_tags_copy: list = sorted(
+            sorted(frequency), key=frequency.get)
+
+        # Тема удаляется из списка во время обхода, как в build_contests,
+        # поэтому следующая за ней тема в этом круге пропускается
+        while sorted_unique_tags_copy:
+            for utag in sorted_unique_tags_copy:
+                free: np.ndarray = members[utag][~taken[members[utag]]]
+                members[utag] = free
+                if not len(free):
+                    sorted_unique_tags_copy.remove(utag)
+                    continue
+
+                free_ratings: np.ndarray = ratings[free]
+                starts: np.ndarray = np.flatnonzero(np.concatenate(
+                    ([True], free_ratings[1:] != free_ratings[:-1])))
+                ranks: np.ndarray = np.arange(len(free)) - np.repeat(
+                    starts, np.diff(np.append(starts, len(free))))
+                chosen: np.ndarray = free[ranks < size]
+                taken[chosen] = True
+
+                chosen_ratings: np.ndarray = ratings[chosen]
+                bounds: list = np.flatnonzero(
+                    chosen_ratings[1:] != chosen_ratings[:-1]).tolist()
+                for start, end in zip([0] + [b + 1 for b in bounds],
+                                      [b + 1 for b in bounds] + [None]):
+                    contests.append((
+                        contest_num, utag, int(chosen_ratings[start]),
+                        [self.tasks[row] for row in chosen[start:end]]
+                    ))
+            contest_num += 1
+
+        return contests
+
+
+async def load_tasks() -> list:
+    parser.log = logging.getLogger('contest_planner')
+    parser.pool = await parser.create_db_pool()
+    try:
+        return await parser.send_request_to_db(cfg.TASKS_SQL_QUERY, 'GET')
+    finally:
+        parser.pool.close()
+        await parser.pool.wait_closed()
+
+
+def main() -> None:
+    arg_parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description='Контесты по задачам из базы при других настройках')
+    arg_parser.add_argument('--size', type=int, default=cfg.CONTEST_SIZE)
+    arg_parser.add_argument('--order', choices=ORDERS, default='id')
+    arg_parser.add_argument('--rating-band', type=int, default=0)
+    args: argparse.Namespace = arg_parser.parse_args()
+
+    tasks: list = asyncio.run(load_tasks())
+    started: float = time.perf_counter()
+    planner: ContestPlanner = ContestPlanner(tasks)
+    contests: list = planner.plan(args.size, args.order, args.rating_band)
+    elapsed: float = time.perf_counter() - started
+
+    sizes: dict = {}
+    for contest in contests:
+        sizes[len(contest[3])] = sizes.get(len(contest[3]), 0) + 1
+    print(f'Задач: {len(tasks)}, контестов: {len(contests)}, '
+          f'выдано задач: {sum(len(contest[3]) for contest in contests)}')
+    print('Контестов по числу задач: ' + ', '.join(
+        f'{size} - {count}' for size, count in sorted(sizes.items())))
+    print(f'Построение: {elapsed:.3f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+
+import aiohttp
+from aiohttp import ClientResponse
+
+import configs.config as cfg
+import configs.custom_exceptions as custom_exceptions
+from metrics import metrics
+
+log = logging.getLogger('task_parser')
+
+
+class RateLimiter:
+    """Не больше max_concurrency запросов одновременно и не чаще одного
+    начала запроса в min_interval секунд.
+    """
+
+    def __init__(self, min_interval: float, max_concurrency: int) -> None:
+        self.min_interval: float = min_interval
+        self.semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+        self.lock: asyncio.Lock = asyncio.Lock()
+        self.next_start: float = 0.0
+
+    async def __aenter__(self) -> None:
+        await self.semaphore.acquire()
+        try:
+            async with self.lock:
+                delay: float = self.next_start - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.next_start = time.monotonic() + self.min_interval
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.semaphore.release()
+
+
+class CodeforcesFetcher:
+    """Клиент API Codeforces с общей сессией для всех методов.
+
+    Соединения переиспользуются между запросами, частота запросов
+    ограничивается RateLimiter. Сетевые ошибки, ответы 429/5xx и
+    превышение лимита вызовов повторяются с экспоненциальной задержкой
+    и случайной добавкой, остальные ошибки API - BadCodeStatus.
+    """
+
+    def __init__(
+            self, api_url: str = cfg.API_URL,
+            min_interval: float = cfg.API_MIN_INTERVAL,
+            max_concurrency: int = cfg.API_MAX_CONCURRENCY,
+            attempts: int = cfg.API_RETRY_ATTEMPTS,
+            retry_delay: float = cfg.API_RETRY_DELAY) -> None:
+        self.api_url: str = api_url.rstrip('/')
+        self.limiter: RateLimiter = RateLimiter(min_interval, max_concurrency)
+        self.attempts: int = attempts
+        self.retry_delay: float = retry_delay
+        self.session: aiohttp.ClientSession = None
+        self.requests_count: int = 0
+        self.retries_count: int = 0
+
+    async def __aenter__(self) -> 'CodeforcesFetcher':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=cfg.API_CONNECTIONS_LIMIT),
+                timeout=aiohttp.ClientTimeout(total=cfg.API_TIMEOUT),
+            )
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(
+            self, method: str, params: dict,
+            handler: Callable[[ClientResponse], Awaitable],
+            headers: dict = None):
+        """Запрос к методу API, ответ передаётся в handler.
+
+        handler возбуждает RetryableApiError, если ответ нужно повторить.
+        """
+        await self.start()
+        url: str = f'{self.api_url}/{method}'
+        for attempt in range(1, self.attempts + 1):
+            try:
+                async with self.limiter:
+                    self.requests_count += 1
+                    with metrics.timer(
+                            'parser_api_request_seconds', method=method):
+                        async with self.session.get(
+                                url, params=params,
+                                headers=headers) as response:
+                            if (response.status == 429
+                                    or response.status >= 500):
+                                raise custom_exceptions.RetryableApiError(
+                                    f'{method}: код ответа {response.status}')
+                            return await handler(response)
+            except (aiohttp.ClientError, asyncio.TimeoutError,
+                    custom_exceptions.RetryableApiError) as _error:
+                if attempt == self.attempts:
+                    raise custom_exceptions.ResponseFromApiWasntRecieved(
+                        _error)
+                delay: float = self.retry_delay * 2 ** (attempt - 1)
+                delay += random.uniform(0, delay)
+                self.retries_count += 1
+                metrics.inc('parser_api_retries_total', method=method)
+                log.warning(
+                    f'Запрос {method} не удался ({_error}), '
+                    f'повтор через {delay:.1f} с'
+                )
+                await asyncio.sleep(delay)
+
+    async def get_json(self, method: str, params: dict = None):
+        """Поле result ответа метода API."""
+        async def handler(response: ClientResponse):
+            try:
+                data: dict = await response.json(content_type=None)
+            except ValueError:
+                raise custom_exceptions.BadCodeStatus(
+                    f'{method}: код ответа {response.status}')
+            if data.get('status') != 'OK':
+                message: str = f"{method}: {data.get('comment', '')}"
+                if 'limit exceeded' in message.lower():
+                    raise custom_exceptions.RetryableApiError(message)
+                raise custom_exceptions.BadCodeStatus(message)
+            return data['result']
+
+        return await self.request(method, params or {}, handler)
+
+    async def download(
+            self, method: str, path: str, params: dict = None,
+            headers: dict = None) -> tuple:
+        """Ответ метода API на диск по частям.
+
+        Возвращает (код ответа, заголовки, sha256 тела). При ответе 304
+        файл не создаётся и хэш равен None.
+        """
+        async def handler(response: ClientResponse) -> tuple:
+            if response.status == 304:
+                return 304, response.headers, None
+            if response.status != 200:
+                raise custom_exceptions.BadCodeStatus(
+                    f'{method}: код ответа {response.status}')
+            body_hash = hashlib.sha256()
+            with open(path, 'wb') as file:
+                async for chunk in response.content.iter_chunked(
+                        cfg.RESPONSE_CHUNK_SIZE):
+                    body_hash.update(chunk)
+                    file.write(chunk)
+            return response.status, response.headers, body_hash.hexdigest()
+
+        return await self.request(method, params or {}, handler, headers)
+
+    async def fetch_all(self, calls: dict) -> dict:
+        """Параллельный вызов нескольких методов.
+
+        calls - {имя: (метод, параметры)}, результат - {имя: result}.
+        """
+        results: list = await asyncio.gather(*(
+            self.get_json(method, params)
+            for method, params in calls.values()
+        ))
+        return dict(zip(calls, results))
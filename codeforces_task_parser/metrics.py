@@ -0,0 +1,118 @@
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+# Границы корзин гистограмм в секундах: от запроса к БД до долгих циклов
+BUCKETS: tuple = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0, 30.0, 60.0, 300.0,
+)
+
+
+class Metrics:
+    """Счётчики, значения и гистограммы задержек в текстовом формате
+    Prometheus.
+
+    Метрика с метками хранится под ключом (имя, ((метка, значение), ...)).
+    Обновление - несколько операций со словарём, без блокировок: всё
+    выполняется в одном цикле событий.
+    """
+
+    def __init__(self, buckets: tuple = BUCKETS) -> None:
+        self.buckets: tuple = buckets
+        self.counters: dict = {}
+        self.gauges: dict = {}
+        # {ключ: [счётчики корзин, сумма, количество]}
+        self.histograms: dict = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key: tuple = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key: tuple = (name, tuple(sorted(labels.items())))
+        histogram: list = self.histograms.get(key)
+        if histogram is None:
+            histogram = [[0] * len(self.buckets), 0.0, 0]
+            self.histograms[key] = histogram
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                histogram[0][i] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Время выполнения блока в гистограмму name, в том числе при
+        исключении.
+        """
+        started: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def __labels(labels: tuple) -> str:
+        if not labels:
+            return ''
+        return '{' + ','.join(
+            '{}="{}"'.format(
+                name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+            for name, value in labels
+        ) + '}'
+
+    def render(self) -> str:
+        lines: list = []
+        types: set = set()
+
+        def add_type(name: str, kind: str) -> None:
+            if name not in types:
+                types.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(self.counters.items()):
+            add_type(name, 'counter')
+            lines.append(f'{name}{self.__labels(labels)} {value}')
+        for (name, labels), value in sorted(self.gauges.items()):
+            add_type(name, 'gauge')
+            lines.append(f'{name}{self.__labels(labels)} {value}')
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            add_type(name, 'histogram')
+            counts, total, count = histogram
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(
+                    f'{name}_bucket'
+                    f'{self.__labels(labels + (("le", bound),))} '
+                    f'{bucket_count}'
+                )
+            lines.append(
+                f'{name}_bucket{self.__labels(labels + (("le", "+Inf"),))} '
+                f'{count}'
+            )
+            lines.append(f'{name}_sum{self.__labels(labels)} {total}')
+            lines.append(f'{name}_count{self.__labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics: Metrics = Metrics()
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """HTTP-сервер с единственным адресом /metrics."""
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            text=metrics.render(),
+            headers={'Content-Type': 'text/plain; version=0.0.4'},
+        )
+
+    app: web.Application = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner: web.AppRunner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,116 @@
+import time
+import weakref
+
+import aiopg
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+# Подготовленного запроса нет на соединении
+MISSING_PGCODE: str = '26000'
+# Запрос устарел после изменения схемы (cached plan must not change
+# result type) и должен быть подготовлен заново
+STALE_PGCODE: str = '0A000'
+# Точка сохранения для повтора запроса внутри транзакции
+RETRY_SAVEPOINT: str = 'prepared_query_retry'
+
+
+class PreparedQueries:
+    """Именованные серверные подготовленные запросы (PREPARE/EXECUTE).
+
+    queries - {имя: SQL с %s}. Запрос готовится на соединении при первом
+    вызове и дальше выполняется без разбора и, после нескольких вызовов,
+    без повторного планирования. Время выполнения копится по именам.
+    """
+
+    def __init__(self, queries: dict) -> None:
+        self.queries: dict = {}
+        self.names: dict = {}
+        for name, sql_query in queries.items():
+            self.register(name, sql_query)
+        self.prepared: weakref.WeakKeyDictionary = \
+            weakref.WeakKeyDictionary()
+        self.timings: dict = {}
+
+    def register(self, name: str, sql_query: str) -> None:
+        parts: list = sql_query.strip().rstrip(';').split('%s')
+        text: str = parts[0] + ''.join(
+            f'${number}{part}' for number, part in enumerate(parts[1:], 1))
+        self.queries[name] = (text, len(parts) - 1)
+        self.names[sql_query] = name
+
+    def find(self, sql_query: str) -> str:
+        """Имя запроса по его тексту из конфига или None."""
+        return self.names.get(sql_query)
+
+    async def execute(
+            self, cursor: aiopg.Cursor, name: str, params: tuple = None,
+            fetch: bool = True) -> list:
+        """Выполнение запроса name, подготовленного на соединении курсора.
+
+        Если запрос пропал с соединения или устарел после изменения
+        схемы, он готовится заново и выполняется ещё раз; ошибка
+        поднимается, только если не удался и повтор. Внутри транзакции
+        первая попытка идёт в точке сохранения, чтобы её ошибка не
+        прерывала транзакцию.
+        """
+        # {имя: True - готов, False - устарел и ещё не удалён}
+        prepared: dict = self.prepared.setdefault(cursor.connection, {})
+        in_transaction: bool = cursor.connection.raw \
+            .get_transaction_status() != TRANSACTION_STATUS_IDLE
+        started: float = time.perf_counter()
+        try:
+            if in_transaction:
+                await cursor.execute(f'SAVEPOINT {RETRY_SAVEPOINT}')
+            try:
+                data: list = await self.execute_prepared(
+                    cursor, name, params, fetch, prepared)
+            except psycopg2.Error as _error:
+                if _error.pgcode not in (MISSING_PGCODE, STALE_PGCODE):
+                    raise
+                if in_transaction:
+                    await cursor.execute(
+                        f'ROLLBACK TO SAVEPOINT {RETRY_SAVEPOINT}')
+                data = await self.execute_prepared(
+                    cursor, name, params, fetch, prepared)
+            if in_transaction:
+                await cursor.execute(f'RELEASE SAVEPOINT {RETRY_SAVEPOINT}')
+        finally:
+            self.add_timing(name, time.perf_counter() - started)
+        return data
+
+    async def execute_prepared(
+            self, cursor: aiopg.Cursor, name: str, params: tuple,
+            fetch: bool, prepared: dict) -> list:
+        text, params_count = self.queries[name]
+        try:
+            if not prepared.get(name):
+                if name in prepared:
+                    await cursor.execute(f'DEALLOCATE {name}')
+                await cursor.execute(f'PREPARE {name} AS {text}')
+                prepared[name] = True
+            if params_count:
+                await cursor.execute(
+                    f"EXECUTE {name} ({', '.join(['%s'] * params_count)})",
+                    params
+                )
+            else:
+                await cursor.execute(f'EXECUTE {name}')
+            return await cursor.fetchall() if fetch else None
+        except psycopg2.Error as _error:
+            if _error.pgcode == MISSING_PGCODE:
+                prepared.pop(name, None)
+            elif _error.pgcode == STALE_PGCODE and prepared.get(name):
+                prepared[name] = False
+            raise
+
+    def add_timing(self, name: str, elapsed: float) -> None:
+        count, total, longest = self.timings.get(name, (0, 0.0, 0.0))
+        self.timings[name] = (
+            count + 1, total + elapsed, max(longest, elapsed))
+
+    def format_timings(self) -> str:
+        return '; '.join(
+            f'{name}: {count} раз, среднее {total / count * 1000:.2f} мс, '
+            f'максимум {longest * 1000:.2f} мс'
+            for name, (count, total, longest) in sorted(self.timings.items())
+        )
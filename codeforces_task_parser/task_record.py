@@ -0,0 +1,91 @@
+import sys
+from typing import NamedTuple
+
+# Байт index в ключе задачи: у задач Codeforces он из 1-2 символов
+INDEX_BYTES: int = 4
+# Бит ключа задачи без номера контеста, выше него - номер контеста
+NO_CONTEST: int = 1 << INDEX_BYTES * 8
+# Коды index для ключа: разных index у задач несколько десятков
+index_codes: dict = {}
+# Один кортеж на каждый набор тем: у большинства задач наборы повторяются
+tag_sets: dict = {}
+
+
+def intern_tags(tags) -> tuple:
+    """Кортеж тем с интернированными строками, общий для равных наборов."""
+    key: tuple = tuple(tags)
+    shared: tuple = tag_sets.get(key)
+    if shared is None:
+        shared = tag_sets[key] = tuple(sys.intern(tag) for tag in key)
+    return shared
+
+
+def make_task_key(contest_id: int, index: str) -> int:
+    """Целый ключ задачи: номер контеста и байты index в младших битах."""
+    code: int = index_codes.get(index)
+    if code is None:
+        encoded: bytes = index.encode()
+        if len(encoded) > INDEX_BYTES:
+            raise ValueError(f'Слишком длинный index задачи: {index}')
+        code = index_codes[index] = int.from_bytes(
+            encoded.ljust(INDEX_BYTES, b'\0'), 'big')
+    if contest_id is None:
+        return NO_CONTEST | code
+    return contest_id * 2 * NO_CONTEST | code
+
+
+def parse_task_key(problem_key: str) -> int:
+    """Ключ make_task_key по строке contestId/index из таблицы tasks."""
+    contest_id, index = problem_key.split('/')
+    return make_task_key(
+        None if contest_id == 'None' else int(contest_id), index)
+
+
+def split_task_key(key: int) -> tuple:
+    """(contestId, index) по ключу make_task_key."""
+    index: bytes = (key % NO_CONTEST).to_bytes(INDEX_BYTES, 'big')
+    contest_id: int = None if key & NO_CONTEST else key // (2 * NO_CONTEST)
+    return contest_id, index.rstrip(b'\0').decode()
+
+
+def get_fingerprint(
+        tags: tuple, count_solved: int, name: str, rating: int) -> tuple:
+    """Хэш задачи без числа решивших, хэш её тем и сложности и число
+    решивших.
+
+    Второй хэш отличается, только если изменилась статистика тем, а по
+    третьему элементу видно изменение одного числа решивших.
+    """
+    return (
+        hash((tags, name, rating)),
+        hash((frozenset(tags), rating)),
+        count_solved,
+    )
+
+
+class TaskRecord(NamedTuple):
+    """Задача из ответа API.
+
+    Вместо строки contestId/index хранится целый ключ make_task_key,
+    строка собирается только для записи в таблицу.
+    """
+    tags: tuple
+    count_solved: int
+    name: str
+    key: int
+    rating: int
+
+    @property
+    def problem_key(self) -> str:
+        return '{}/{}'.format(*split_task_key(self.key))
+
+    def to_row(self) -> tuple:
+        """Параметры FILLING_TASKS_TABLE_BULK_SQL_QUERY."""
+        return (
+            list(self.tags), self.count_solved,
+            [self.name, self.problem_key], self.rating
+        )
+
+    def fingerprint(self) -> tuple:
+        return get_fingerprint(
+            self.tags, self.count_solved, self.name, self.rating)